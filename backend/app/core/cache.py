@@ -0,0 +1,314 @@
+"""Cache for read endpoints whose data changes rarely.
+
+Results are kept in two tiers:
+
+* an in-process LRU of ``CACHE_MAX_ENTRIES`` entries, always on;
+* a shared tier, when ``CACHE_URL`` is set, so a result computed by one
+  worker serves the others (``redis://...`` or any kvstore URL).
+
+Each endpoint has a name ("leaves.dashboard") and a TTL, overridable through
+``CACHE_TTLS``. The key also carries the caller's ``vary`` values, e.g. the
+user's role when the response depends on it.
+
+Data with a version row (``app.crud.version``) is best keyed by passing
+its versions in ``vary``: they commit with the data, so a replica never
+pairs a new version with old rows. Other entries belong to namespaces
+("faces"), and write paths call ``invalidate(namespace)`` once their
+transaction has committed. That bumps the namespace's generation in the
+shared state store (``SHARED_STATE_URL``), and the generation is part of
+every key, so all workers stop using the old entries at once; these then
+age out of the LRU and expire in the shared tier. The generations are read
+before computing, so a result computed from pre-write data is stored under
+the old generation and never served afterwards.
+
+Misses for the same key are collapsed: the first request computes, requests
+arriving meanwhile in the same process wait for its result. With a shared
+tier, a short lock there does the same across workers; a worker that cannot
+get the lock polls for the entry for up to ``CACHE_LOCK_SECONDS``, then
+computes anyway.
+
+Values are stored as plain JSON types (``serialization.to_jsonable``) and
+shared between requests: treat them as read-only. The cache is an optimisation; if the
+stores fail, requests compute their result as if it were disabled.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Iterable
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.kvstore import create_store, get_store
+from app.core.metrics import record_cache
+from app.core.serialization import to_jsonable
+
+logger = logging.getLogger(__name__)
+
+GENERATION_PREFIX = 'cache-gen:'
+LOCK_PREFIX = 'cache-lock:'
+POLL_SECONDS = 0.05
+
+_MISSING = object()
+
+
+class LRUCache:
+    """``key -> value`` with a wall-clock expiry per entry; the least recently used go past ``max_entries``."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[0] <= time.time():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, expires_at: float):
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+local = LRUCache(settings.CACHE_MAX_ENTRIES)
+
+_shared = _MISSING
+_ttls = None
+_setup_lock = threading.Lock()
+
+
+def _shared_store():
+    global _shared
+    if _shared is _MISSING:
+        with _setup_lock:
+            if _shared is _MISSING:
+                _shared = create_store(settings.CACHE_URL) if settings.CACHE_URL else None
+    return _shared
+
+
+def ttl_for(endpoint: str, default: float) -> float:
+    global _ttls
+    if _ttls is None:
+        _ttls = json.loads(settings.CACHE_TTLS or '{}')
+    return float(_ttls.get(endpoint, default))
+
+
+def _key(endpoint: str, vary: Iterable, namespaces: Iterable[str]) -> str:
+    store = get_store()
+    generations = '.'.join(str(store.get(GENERATION_PREFIX + ns, 0)) for ns in namespaces)
+    return f"cache:{endpoint}:{generations}:{':'.join(str(v) for v in vary)}"
+
+
+def _lookup(key: str):
+    value = local.get(key)
+    if value is not _MISSING:
+        return value
+    shared = _shared_store()
+    if shared is not None:
+        entry = shared.get(key)
+        if entry is not None:
+            local.set(key, entry['v'], entry['exp'])
+            return entry['v']
+    return _MISSING
+
+
+def _begin(endpoint, vary, namespaces):
+    """``(key, cached value or _MISSING)``; the key is None when the cache cannot be used."""
+    if not settings.CACHE_ENABLED:
+        return None, _MISSING
+    try:
+        key = _key(endpoint, vary, namespaces)
+        return key, _lookup(key)
+    except Exception:
+        logger.exception("response cache unavailable")
+        return None, _MISSING
+
+
+def _save(key: str, value: Any, ttl: float):
+    expires_at = time.time() + ttl
+    local.set(key, value, expires_at)
+    shared = _shared_store()
+    if shared is not None:
+        try:
+            shared.set(key, {'v': value, 'exp': expires_at}, ttl=ttl)
+        except Exception:
+            logger.exception("shared cache unavailable")
+
+
+def _claim(key: str) -> bool:
+    """Take the cross-worker compute lock for ``key``; True without a shared tier (or when it fails)."""
+    shared = _shared_store()
+    if shared is None:
+        return True
+    try:
+        return shared.add(LOCK_PREFIX + key, 1, ttl=settings.CACHE_LOCK_SECONDS) is None
+    except Exception:
+        logger.exception("shared cache unavailable")
+        return True
+
+
+def _release(key: str):
+    try:
+        _shared_store().delete(LOCK_PREFIX + key)
+    except Exception:
+        logger.exception("shared cache unavailable")
+
+
+# -- sync callers ----------------------------------------------------------------
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _compute(key, compute, ttl):
+    claimed = _claim(key)
+    if not claimed:
+        deadline = time.monotonic() + settings.CACHE_LOCK_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(POLL_SECONDS)
+            value = _lookup(key)
+            if value is not _MISSING:
+                return value
+    try:
+        value = to_jsonable(compute())
+        _save(key, value, ttl)
+        return value
+    finally:
+        if claimed and _shared_store() is not None:
+            _release(key)
+
+
+def get_or_compute(endpoint: str, compute: Callable[[], Any], *, ttl: float,
+                   vary: Iterable = (), namespaces: Iterable[str] = ()):
+    """Cached ``compute()`` for ``endpoint``; ``ttl`` is the default for ``CACHE_TTLS``."""
+    key, value = _begin(endpoint, vary, namespaces)
+    if key is None:
+        return compute()
+    if value is not _MISSING:
+        record_cache(endpoint, True)
+        return value
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    record_cache(endpoint, not leader)
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+    try:
+        flight.value = _compute(key, compute, ttl_for(endpoint, ttl))
+        return flight.value
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+# -- async callers ---------------------------------------------------------------
+# Same flow with futures on the running loop. The store calls (generations,
+# shared tier, locks) are blocking IO on the kvstore, so they run in the
+# threadpool.
+
+_async_flights = weakref.WeakKeyDictionary()  # event loop -> {key: Future}
+
+
+async def _compute_async(key, compute, ttl):
+    claimed = await run_in_threadpool(_claim, key)
+    if not claimed:
+        deadline = time.monotonic() + settings.CACHE_LOCK_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(POLL_SECONDS)
+            value = await run_in_threadpool(_lookup, key)
+            if value is not _MISSING:
+                return value
+    try:
+        value = to_jsonable(await compute())
+        await run_in_threadpool(_save, key, value, ttl)
+        return value
+    finally:
+        if claimed and _shared_store() is not None:
+            await run_in_threadpool(_release, key)
+
+
+async def get_or_compute_async(endpoint: str, compute: Callable[[], Awaitable[Any]], *, ttl: float,
+                               vary: Iterable = (), namespaces: Iterable[str] = ()):
+    """``get_or_compute`` for a coroutine: ``compute`` is called (and awaited) only on a miss."""
+    key, value = await run_in_threadpool(_begin, endpoint, vary, namespaces)
+    if key is None:
+        return await compute()
+    if value is not _MISSING:
+        record_cache(endpoint, True)
+        return value
+    loop = asyncio.get_running_loop()
+    flights = _async_flights.setdefault(loop, {})
+    flight = flights.get(key)
+    record_cache(endpoint, flight is not None)
+    if flight is not None:
+        try:
+            return await asyncio.shield(flight)
+        except asyncio.CancelledError:
+            if not flight.cancelled():
+                raise
+            return to_jsonable(await compute())  # the computing request went away
+    flight = flights[key] = loop.create_future()
+    try:
+        value = await _compute_async(key, compute, ttl_for(endpoint, ttl))
+        flight.set_result(value)
+        return value
+    except asyncio.CancelledError:
+        flight.cancel()
+        raise
+    except BaseException as e:
+        flight.set_exception(e)
+        flight.exception()  # retrieved: no "never retrieved" warning when nobody was waiting
+        raise
+    finally:
+        del flights[key]
+
+
+# -- invalidation ----------------------------------------------------------------
+
+def invalidate(*namespaces: str):
+    """Retire every cached entry that depends on ``namespaces``, in all workers.
+
+    Call after the write has committed.
+    """
+    store = get_store()
+    for namespace in namespaces:
+        try:
+            store.incr(GENERATION_PREFIX + namespace)
+        except Exception:
+            logger.exception("could not invalidate cache namespace %s", namespace)
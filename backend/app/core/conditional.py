@@ -0,0 +1,51 @@
+"""Conditional GET for large read endpoints.
+
+A route builds its ETag from the versions of the data it returns (change
+counters, largest ids, see ``app.crud.version``), plus the path, the query
+string and anything else the body depends on (the date, a model file's
+mtime). Nothing is hashed from the body, so when ``If-None-Match`` still
+names the current tag the route answers 304 before running its query.
+
+Anything the body depends on has to be among the inputs; an unneeded input
+only costs a 200 that could have been a 304.
+"""
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+# the compression middleware marks encoded variants as "<tag>-gzip" / "<tag>-br"
+ENCODING_SUFFIXES = ("-gzip", "-br")
+
+
+def etag_for(request: Request, *versions) -> str:
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    digest = hashlib.sha1(repr((request.url.path, query, versions)).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def _client_tags(request: Request) -> set:
+    tags = set()
+    for tag in request.headers.get("if-none-match", "").split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):  # If-None-Match uses the weak comparison
+            tag = tag[2:]
+        for suffix in ENCODING_SUFFIXES:
+            if tag.endswith(suffix + '"'):
+                tag = tag[:-len(suffix) - 1] + '"'
+        if tag:
+            tags.add(tag)
+    return tags
+
+
+def headers(etag: str) -> dict:
+    # private: bodies depend on who asks; no-cache: revalidate every time, which is the cheap 304
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """A 304 to send instead of the body when the client already has ``etag``; None otherwise."""
+    tags = _client_tags(request)
+    if etag in tags or "*" in tags:
+        return Response(status_code=304, headers=headers(etag))
+    return None
@@ -8,7 +8,130 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # How long workers trust a user's cached token_version (revocations
+    # through the API take effect at once; direct DB edits after this long)
+    AUTH_USER_CACHE_SECONDS: int = 60
+    # Password hashing runs on its own small pool so a burst of logins cannot
+    # take the request threads; past PASSWORD_HASH_QUEUE waiting hashes,
+    # logins get a 503. Changing PASSWORD_HASH_ROUNDS rehashes each password
+    # at its owner's next login.
+    PASSWORD_HASH_ROUNDS: int = 29000
+    PASSWORD_HASH_WORKERS: int = 0  # 0: half the CPUs
+    PASSWORD_HASH_QUEUE: int = 64
+    # Failed logins allowed per account / per client IP within the window (429 after)
+    LOGIN_MAX_FAILURES_PER_ACCOUNT: int = 5
+    LOGIN_MAX_FAILURES_PER_IP: int = 50
+    LOGIN_FAILURE_WINDOW_SECONDS: int = 900
     DATABASE_URL: str = "sqlite:///./attendance.db"
+    # Async routes; derived from DATABASE_URL (sqlite+aiosqlite / postgresql+asyncpg) when empty
+    ASYNC_DATABASE_URL: str = ""
+    # Server databases (PostgreSQL): connection pool per worker process and
+    # per-statement time limits; SQLite keeps SQLAlchemy's pool defaults
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: int = 10
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 15000
+    # Read replica for heavy reads (logs, leave admin lists, analytics); empty
+    # uses the primary. A second SQLite file works as a local stand-in.
+    DATABASE_REPLICA_URL: str = ""
+    DB_REPLICA_STATEMENT_TIMEOUT_MS: int = 60000
+    # Warn when one request runs the same SQL statement more than this many times
+    SQL_N_PLUS_ONE_THRESHOLD: int = 10
+    # Sampling profiler: admins send X-Profile: 1 to profile one request;
+    # PROFILE_GLOBAL_HZ > 0 also samples all requests at that rate
+    PROFILE_DIR: str = "./profiles"
+    PROFILE_INTERVAL_MS: int = 5
+    PROFILE_KEEP: int = 50
+    PROFILE_GLOBAL_HZ: float = 0.0
+    PROFILE_MAX_STACKS: int = 2000  # distinct stacks kept per route in the global report
+    # Prometheus /metrics; with several workers point this at a directory they
+    # share (emptied before start) so the scrape sees all of them
+    METRICS_MULTIPROC_DIR: str = ""
+    # Response compression (brotli when installed and accepted, else gzip) for
+    # text/JSON bodies of at least COMPRESSION_MIN_BYTES; 0 turns it off
+    COMPRESSION_MIN_BYTES: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 5
+    # numpy/pandas/OpenCV and the models load on first use; warmup loads them
+    # in a background thread after startup (DeepFace's model only if asked)
+    WARMUP_ON_STARTUP: bool = True
+    WARMUP_DEEPFACE: bool = False
+    # SQLite: "production" applies WAL and the pragmas below and serializes
+    # attendance writes through one writer thread; "default" is plain pysqlite
+    SQLITE_PROFILE: str = "production"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 268435456
+    SQLITE_CACHE_SIZE_KB: int = 65536
+    # State shared by all workers on this host (memory:// for a single worker)
+    SHARED_STATE_URL: str = "sqlite:///./shared_state.db"
+    # Response cache: in-process LRU, plus a tier shared by all workers when
+    # CACHE_URL is set (redis://host:6379/0 or any SHARED_STATE_URL form).
+    # CACHE_TTLS overrides per-endpoint TTLs as JSON: {"leaves.dashboard": 10}
+    CACHE_ENABLED: bool = True
+    CACHE_URL: str = ""
+    CACHE_MAX_ENTRIES: int = 1024
+    CACHE_TTLS: str = "{}"
+    CACHE_LOCK_SECONDS: float = 10.0  # longest wait on another worker computing the same entry
+    # Bulk user import (POST /api/v1/users/import, scripts/import_users.py);
+    # passwords are hashed in USER_IMPORT_HASH_PROCESSES processes (0: one per CPU)
+    USER_IMPORT_MAX_ROWS: int = 20000
+    USER_IMPORT_CHUNK_SIZE: int = 500
+    USER_IMPORT_HASH_PROCESSES: int = 0
+    # Rate limiting: a token bucket per caller (kiosk header, else user from
+    # the access token, else client IP) for each rule, plus a per-IP ceiling
+    # across all requests. RATE_LIMITS sets per-endpoint rates as JSON keyed by
+    # "METHOD /route/template"; other requests get RATE_LIMIT_DEFAULT. Buckets
+    # live in each worker unless RATE_LIMIT_URL names a shared store
+    # (sqlite:///./shared_state.db on one host, redis://... across hosts).
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_DEFAULT: str = "600/minute"
+    RATE_LIMIT_PER_IP: str = "3000/minute"
+    RATE_LIMITS: str = '{"POST /api/v1/auth/login": "60/minute", "POST /api/v1/biometrics/face/verify": "60/minute"}'
+    RATE_LIMIT_KIOSK_HEADER: str = "X-Kiosk-Id"
+    RATE_LIMIT_URL: str = ""
+    RATE_LIMIT_MAX_KEYS: int = 100000  # per worker, in-process buckets only
+    # Offline kiosk sync (POST /api/v1/attendance/bulk)
+    ATTENDANCE_BULK_MAX_RECORDS: int = 50000
+    ATTENDANCE_BULK_CHUNK_SIZE: int = 500
+    # Buffered punches must be scanned within this many days of the sync, and
+    # not after it (beyond the allowed kiosk clock skew)
+    ATTENDANCE_SYNC_HORIZON_DAYS: int = 30
+    ATTENDANCE_SYNC_CLOCK_SKEW_SECONDS: int = 300
+    # Daily attendance rollup: scheduled start (HH:MM, UTC like punch times)
+    SHIFT_START_TIME: str = "09:00"
+    LATE_GRACE_MINUTES: int = 0
+    # Scheduled working weekdays (0 = Monday); a missed one counts as absent
+    WORK_WEEKDAYS: str = "0,1,2,3,4"
+    # Punch pairing: longest plausible shift, and repeat scans treated as one
+    MAX_SHIFT_HOURS: int = 16
+    DUPLICATE_SCAN_SECONDS: int = 120
+    # Repeat check-in/out scans inside this window return the first punch (0 disables)
+    PUNCH_SUPPRESSION_WINDOW_SECONDS: int = 60
+    # Cold tier: months older than ATTENDANCE_HOT_MONTHS move to Parquet files
+    ATTENDANCE_ARCHIVE_DIR: str = "./archive/attendance"
+    ATTENDANCE_HOT_MONTHS: int = 3
+    ATTENDANCE_ARCHIVE_ROW_GROUP_SIZE: int = 128000
+    # Attendance exports are spooled to disk while streaming so downloads can resume
+    EXPORT_SPOOL_DIR: str = "./exports"
+    EXPORT_SPOOL_TTL_SECONDS: int = 3600
+    EXPORT_BATCH_SIZE: int = 5000
+    # Buddy-punching detector: {"Site name": [lat, lon], ...} as JSON
+    SITE_COORDINATES: str = "{}"
+    ANOMALY_WINDOW_MINUTES: int = 120
+    ANOMALY_MAX_SPEED_KMH: float = 80.0
+    ANOMALY_MIN_TRAVEL_MINUTES: int = 10  # between sites without coordinates
+    FACE_MATCH_THRESHOLD: float = 0.40
+    ANOMALY_FACE_MARGIN: float = 0.05
+    ANOMALY_MAX_EMPLOYEES: int = 50000
+    ANOMALY_MAX_ALERTS: int = 1000
+    # Live check-in feed (GET /api/v1/attendance/stream)
+    EVENT_HISTORY_SIZE: int = 1000
+    EVENT_QUEUE_SIZE: int = 256
+    EVENT_HEARTBEAT_SECONDS: int = 15
+    # A reconnect missing more punches than this gets a "reset" event (reload /logs) instead of a replay
+    EVENT_BACKFILL_MAX: int = 1000
 
     class Config:
         env_file = ".env"
@@ -1,18 +1,198 @@
-from sqlalchemy import create_engine
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from .config import settings
 
-# Create SQLite database engine
-engine = create_engine(
-    settings.DATABASE_URL, 
-    connect_args={"check_same_thread": False}
-)
+
+def _sqlite_pragmas():
+    return (
+        "PRAGMA journal_mode=WAL",  # readers no longer block the writer (or vice versa)
+        "PRAGMA synchronous=NORMAL",  # fsync at checkpoints, not on every commit; safe with WAL
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}",  # negative: KiB rather than pages
+        "PRAGMA temp_store=MEMORY",
+    )
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in _sqlite_pragmas():
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def _sqlite_query_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+def _server_options(url: str, read_only: bool) -> dict:
+    """Pool sizing and per-connection session settings for server databases.
+
+    ``pool_pre_ping`` tests a connection before it is handed out, so one
+    dropped by a failover or an idle timeout is replaced instead of failing
+    the request; ``pool_recycle`` retires connections before server-side idle
+    limits do. Statement timeouts stop a runaway query from holding a pooled
+    connection indefinitely.
+    """
+    options = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if url.startswith("postgresql"):
+        timeout = settings.DB_REPLICA_STATEMENT_TIMEOUT_MS if read_only else settings.DB_STATEMENT_TIMEOUT_MS
+        server_settings = {"statement_timeout": str(timeout)}
+        if read_only:
+            server_settings["default_transaction_read_only"] = "on"
+        if "+asyncpg" in url.split("://", 1)[0]:
+            options["connect_args"] = {"server_settings": server_settings}
+        else:
+            options["connect_args"] = {"options": " ".join(f"-c {k}={v}" for k, v in server_settings.items())}
+    return options
+
+
+def _engine_options(url: str, profile: str = None, read_only: bool = False, **kwargs):
+    if not url.startswith("sqlite"):
+        return {**_server_options(url, read_only), **kwargs}, ()
+    listeners = []
+    if (profile or settings.SQLITE_PROFILE) == "production":
+        listeners.append(_apply_sqlite_pragmas)
+    if read_only:
+        listeners.append(_sqlite_query_only)
+    return {"connect_args": {"check_same_thread": False}, **kwargs}, listeners
+
+
+def create_db_engine(url: str, profile: str = None, read_only: bool = False, **kwargs):
+    """Engine for ``url``.
+
+    SQLite gets the pragmas of ``SQLITE_PROFILE`` on every new connection;
+    other databases get the pool and timeout settings. ``read_only`` engines
+    refuse writes at the connection level.
+    """
+    options, listeners = _engine_options(url, profile, read_only, **kwargs)
+    db_engine = create_engine(url, **options)
+    for listener in listeners:
+        event.listen(db_engine, "connect", listener)
+    return db_engine
+
+
+engine = create_db_engine(settings.DATABASE_URL)
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+replica_engine = (
+    create_db_engine(settings.DATABASE_REPLICA_URL, read_only=True)
+    if settings.DATABASE_REPLICA_URL
+    else engine
+)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
+_engine_hooks = []
+
+
+def on_engine(hook):
+    """Call ``hook(name, sync_engine)`` for every engine: the existing ones now, async ones when created."""
+    _engine_hooks.append(hook)
+    hook("primary", engine)
+    if replica_engine is not engine:
+        hook("replica", replica_engine)
+    for key, async_engine in list(_async_engines.items()):
+        hook(f"async_{key}", async_engine.sync_engine)
+
+
+class WriteQueue:
+    """Runs write transactions one at a time on a dedicated thread.
+
+    SQLite allows a single writer. Request threads that all try to write
+    just take turns through the busy handler, and under load some of them
+    still give up with ``database is locked``. Funnelling writes through one
+    thread turns that into an orderly queue. Each job gets its own session.
+    Objects stay loaded after commit, so callers can read the results once
+    the job's session is closed.
+
+    Sync callers use ``run_write`` and async callers ``run_write_async``;
+    both end up here, so there is exactly one writer per process.
+    """
+
+    def __init__(self, bind):
+        self._sessions = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=bind)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._local = threading.local()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+
+    def _run(self, fn, args, kwargs):
+        self._local.active = True
+        db = self._sessions()
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+            self._local.active = False
+
+    def _done(self, future):
+        with self._pending_lock:
+            self._pending -= 1
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Queue ``fn(session, *args, **kwargs)`` on the writer thread; returns its future."""
+        if getattr(self._local, "active", False):
+            raise RuntimeError("write job tried to queue another write job")
+        # the job runs in the caller's context, so per-request state (SQL stats) follows it
+        context = contextvars.copy_context()
+        with self._pending_lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(context.run, self._run, fn, args, kwargs)
+        except BaseException:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def run(self, fn, *args, **kwargs):
+        """Call ``fn(session, *args, **kwargs)`` on the writer thread and wait for its result."""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def pending(self) -> int:
+        """Write jobs queued or running."""
+        return self._pending
+
+
+write_queue = (
+    WriteQueue(engine)
+    if engine.dialect.name == "sqlite" and settings.SQLITE_PROFILE == "production"
+    else None
+)
+
+
+# sessions for async writers when there is no write queue; results stay readable after commit
+WriteSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+
+def run_write(db, fn, *args, **kwargs):
+    """Run the write ``fn(session, ...)`` through the write queue when enabled, else inline on ``db``."""
+    if write_queue is None:
+        return fn(db, *args, **kwargs)
+    return write_queue.run(fn, *args, **kwargs)
+
+
 # Create Base class
 Base = declarative_base()
 
@@ -22,4 +202,132 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db():
+    """Session on the read replica (the primary when none is configured).
+
+    For reads that tolerate replication lag; the replica rejects writes.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# -- async engine ------------------------------------------------------------
+# Async routes use an AsyncSession, so a request waiting on the database holds
+# a pooled connection but no threadpool thread. The engine is created on first
+# use: the driver (aiosqlite / asyncpg) is only needed once an async route runs.
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+_async_engines = {}
+_async_sessions = {}
+_async_lock = threading.Lock()
+
+
+def async_database_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    base = scheme.split("+", 1)[0]
+    return ASYNC_DRIVERS.get(base, scheme) + sep + rest
+
+
+def _async_key(replica: bool) -> str:
+    return "replica" if replica and settings.DATABASE_REPLICA_URL else "primary"
+
+
+def get_async_engine(replica: bool = False):
+    """The async engine for the primary, or for the read replica when one is configured."""
+    key = _async_key(replica)
+    if key not in _async_engines:
+        with _async_lock:
+            if key not in _async_engines:
+                from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+                if key == "replica":
+                    url = async_database_url(settings.DATABASE_REPLICA_URL)
+                else:
+                    url = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+                options, listeners = _engine_options(url, read_only=key == "replica")
+                if url.startswith("sqlite"):
+                    options.pop("connect_args")  # aiosqlite keeps each connection on its own thread
+                async_engine = create_async_engine(url, **options)
+                for listener in listeners:
+                    event.listen(async_engine.sync_engine, "connect", listener)
+                _async_sessions[key] = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+                _async_engines[key] = async_engine
+                for hook in _engine_hooks:
+                    hook(f"async_{key}", async_engine.sync_engine)
+    return _async_engines[key]
+
+
+def AsyncSessionLocal():
+    get_async_engine()
+    return _async_sessions["primary"]()
+
+
+def AsyncReadSessionLocal():
+    get_async_engine(replica=True)
+    return _async_sessions[_async_key(True)]()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+def _run_in_session(fn, args, kwargs):
+    db = WriteSessionLocal()
+    try:
+        return fn(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+async def run_write_async(db, fn, *args, **kwargs):
+    """Async counterpart of run_write: ``fn(sync_session, ...)`` off the event loop.
+
+    With the write queue the job joins the same queue as sync writers;
+    without it the job runs on a worker thread with a session of its own.
+    ``db``, the request's AsyncSession, first ends its read transaction: a
+    SQLite reader holding its lock would stall the writer it is waiting on,
+    and later reads should see the write.
+    """
+    if db.in_transaction():
+        await db.commit()  # nothing pending; expire_on_commit is off, so loaded objects stay usable
+    if write_queue is not None:
+        return await asyncio.wrap_future(write_queue.submit(fn, *args, **kwargs))
+    return await asyncio.to_thread(_run_in_session, fn, args, kwargs)
+
+
+def sync_schema(bind=None):
+    """Create missing tables, then add columns and indexes introduced after a
+    table was first created.
+
+    There is no migration history for the existing SQLite files, so only
+    additive changes are applied here; anything else needs a manual migration.
+    """
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=bind.dialect)}"
+                default = getattr(column.server_default, "arg", None)
+                if isinstance(default, str):
+                    ddl += f" DEFAULT '{default}'"
+                conn.execute(text(ddl))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
@@ -0,0 +1,105 @@
+"""Password hashing on a dedicated, bounded thread pool.
+
+A pbkdf2 hash takes tens of milliseconds of CPU. Run on the request
+threadpool, a burst of logins at shift start would hold every thread and
+stall unrelated endpoints, so hashes and verifications go through their own
+``PASSWORD_HASH_WORKERS`` threads instead (hashlib releases the GIL while
+hashing). At most ``PASSWORD_HASH_QUEUE`` more may wait; beyond that
+``HashingBusy`` is raised and the caller answers 503 rather than queueing
+work it cannot finish in time.
+
+Queue depth, wait and hash times are exported as ``password_hash_*`` metrics.
+
+Bulk imports hash thousands of passwords at once; ``hash_passwords`` spreads
+them over worker processes instead, leaving the pool to logins.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List
+
+from app.core.config import settings
+from app.core.metrics import (
+    PASSWORD_HASH_QUEUED, PASSWORD_HASH_REJECTED, PASSWORD_HASH_SECONDS, PASSWORD_HASH_WAIT,
+)
+from app.core.security import get_password_hash, verify_and_update
+
+
+class HashingBusy(Exception):
+    """The hashing queue is full."""
+
+
+class HashingExecutor:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+
+    def submit(self, fn: Callable, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            PASSWORD_HASH_REJECTED.inc()
+            raise HashingBusy()
+        PASSWORD_HASH_QUEUED.inc()
+        queued = time.perf_counter()
+
+        def run():
+            started = time.perf_counter()
+            PASSWORD_HASH_QUEUED.dec()
+            PASSWORD_HASH_WAIT.observe(started - queued)
+            try:
+                return fn(*args)
+            finally:
+                PASSWORD_HASH_SECONDS.observe(time.perf_counter() - started)
+                self._slots.release()
+
+        try:
+            return self._pool.submit(run)
+        except BaseException:
+            PASSWORD_HASH_QUEUED.dec()
+            self._slots.release()
+            raise
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> HashingExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = settings.PASSWORD_HASH_WORKERS or max(1, (os.cpu_count() or 2) // 2)
+                _executor = HashingExecutor(workers, settings.PASSWORD_HASH_QUEUE)
+    return _executor
+
+
+def hash_password(password: str) -> str:
+    return get_executor().submit(get_password_hash, password).result()
+
+
+def check_password(password: str, hashed_password: str):
+    """``(valid, new_hash)`` as ``security.verify_and_update``, computed on the hashing pool."""
+    return get_executor().submit(verify_and_update, password, hashed_password).result()
+
+
+def hash_passwords(passwords: List[str], processes: int = 0) -> List[str]:
+    """Hashes of ``passwords``, in order, computed by a short-lived process pool."""
+    processes = min(processes or os.cpu_count() or 1, len(passwords))
+    if processes <= 1 or len(passwords) < 4 * processes:
+        return [get_password_hash(p) for p in passwords]  # starting processes would cost more
+    # spawn, not fork: the server process has threads (and locks) a fork would copy mid-use
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+        return list(pool.map(get_password_hash, passwords, chunksize=max(1, len(passwords) // (processes * 4))))
+
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.wrap_future(get_executor().submit(get_password_hash, password))
+
+
+async def check_password_async(password: str, hashed_password: str):
+    return await asyncio.wrap_future(get_executor().submit(verify_and_update, password, hashed_password))
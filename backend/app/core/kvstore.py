@@ -0,0 +1,252 @@
+"""Small key/value store with TTLs for state shared between API workers.
+
+``SHARED_STATE_URL`` selects the backend:
+
+* ``memory://``: a dict in this process; fine for a single worker.
+* ``sqlite:///path.db``: a local SQLite file (WAL mode). This is the stand-in
+  for a networked cache: every uvicorn worker on the host sees the same
+  entries, and ``update`` is atomic across processes.
+* ``redis://host:6379/0`` (``rediss://``, ``unix://``): a Redis-compatible
+  server (Redis, Valkey, KeyDB...), shared across hosts. Needs the ``redis``
+  package, which is imported only when such a URL is configured.
+
+Values must be JSON-serializable. All operations are best-effort fast paths;
+callers should treat a missing key as "no shared state", never as an error.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+
+_MISSING = object()
+
+
+class BaseStore:
+    def get(self, key: str, default=None):
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def update(self, key: str, fn: Callable[[Any], Any], ttl: Optional[float] = None):
+        """Atomically replace the value with ``fn(current)`` (``current`` is None when absent).
+
+        Returns the new value. If ``fn`` returns the ``current`` object itself
+        the entry (and its expiry) is left untouched.
+        """
+        raise NotImplementedError
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store ``value`` only if the key is absent; returns the existing value, or None if stored."""
+        existing = []
+
+        def _add(current):
+            if current is not None:
+                existing.append(current)
+                return current
+            return value
+
+        self.update(key, _add, ttl)
+        return existing[0] if existing else None
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return self.update(key, lambda current: (current or 0) + amount, ttl)
+
+
+class MemoryStore(BaseStore):
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= now:
+            del self._data[key]
+            return _MISSING
+        return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._live(key, time.time())
+        return default if value is _MISSING else value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def update(self, key, fn, ttl=None):
+        with self._lock:
+            now = time.time()
+            current = self._live(key, now)
+            current = None if current is _MISSING else current
+            new = fn(current)
+            if new is not current:
+                self._data[key] = (new, now + ttl if ttl else None)
+            return new
+
+    def purge(self):
+        with self._lock:
+            now = time.time()
+            for key in [k for k, (_, exp) in self._data.items() if exp is not None and exp <= now]:
+                del self._data[key]
+
+
+class SQLiteStore(BaseStore):
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        self._ops = 0
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, default=None):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        ).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        self._conn().execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, json.dumps(value), time.time() + ttl if ttl else None),
+        )
+        self._maybe_purge()
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def update(self, key, fn, ttl=None):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, now)
+            ).fetchone()
+            current = None if row is None else json.loads(row[0])
+            new = fn(current)
+            if new is not current:
+                conn.execute(
+                    "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                    (key, json.dumps(new), now + ttl if ttl else None),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._maybe_purge()
+        return new
+
+    def _maybe_purge(self):
+        self._ops += 1
+        if self._ops % 1000 == 0:
+            self.purge()
+
+    def purge(self):
+        self._conn().execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+
+class RedisStore(BaseStore):
+    def __init__(self, url: str):
+        import redis
+
+        self._redis = redis
+        self._client = redis.Redis.from_url(url)
+
+    @staticmethod
+    def _px(ttl):
+        return max(int(ttl * 1000), 1) if ttl else None
+
+    def get(self, key, default=None):
+        raw = self._client.get(key)
+        return default if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self._client.set(key, json.dumps(value), px=self._px(ttl))
+
+    def delete(self, key):
+        self._client.delete(key)
+
+    def update(self, key, fn, ttl=None):
+        # optimistic transaction: WATCH the key, retry if another client changed it first
+        with self._client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    current = None if raw is None else json.loads(raw)
+                    new = fn(current)
+                    if new is current:
+                        pipe.unwatch()
+                        return new
+                    pipe.multi()
+                    pipe.set(key, json.dumps(new), px=self._px(ttl))
+                    pipe.execute()
+                    return new
+                except self._redis.WatchError:
+                    continue
+
+    def add(self, key, value, ttl=None):
+        while True:
+            if self._client.set(key, json.dumps(value), px=self._px(ttl), nx=True):
+                return None
+            raw = self._client.get(key)
+            if raw is not None:  # else it expired in between; try again
+                return json.loads(raw)
+
+    def incr(self, key, amount=1, ttl=None):
+        with self._client.pipeline() as pipe:
+            pipe.incrby(key, amount)
+            if ttl:
+                pipe.pexpire(key, self._px(ttl))
+            return pipe.execute()[0]
+
+
+def create_store(url: str) -> BaseStore:
+    if url.startswith('memory://'):
+        return MemoryStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteStore(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStore(url)
+    raise ValueError(f"Unsupported store URL: {url}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> BaseStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_store(settings.SHARED_STATE_URL)
+    return _store
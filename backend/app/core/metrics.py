@@ -0,0 +1,126 @@
+"""Prometheus metrics.
+
+Definitions live here so every module records into the same series.
+Counters and histograms are updated with a single per-value lock held for
+an add, so they are cheap from any thread.
+
+With several worker processes, set ``METRICS_MULTIPROC_DIR`` to a directory
+shared by the workers and empty it before the server starts. Each worker
+then keeps its values in its own mmap-ed files there, and ``/metrics``
+merges all of them, whichever worker answers the scrape. The variable has to
+be set before ``prometheus_client`` is first imported, which is why this
+module is the only place that imports it.
+"""
+import os
+import threading
+import weakref
+
+from sqlalchemy import event
+
+from app.core.config import settings
+
+if settings.METRICS_MULTIPROC_DIR:
+    os.makedirs(settings.METRICS_MULTIPROC_DIR, exist_ok=True)
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.METRICS_MULTIPROC_DIR)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route template and status",
+    ["method", "route", "status"], buckets=_LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests being handled (streams included)",
+    ["method", "route"], multiprocess_mode="livesum",
+)
+
+DB_QUERIES = Histogram(
+    "db_queries_per_request", "SQL statements run by one request",
+    ["route"], buckets=(1, 2, 5, 10, 20, 50, 100, 250, 1000),
+)
+DB_TIME = Histogram(
+    "db_time_per_request_seconds", "Time one request spent in SQL statements",
+    ["route"], buckets=_LATENCY_BUCKETS,
+)
+DB_N_PLUS_ONE = Counter("db_n_plus_one_total", "Requests that repeated a statement past the N+1 threshold", ["route"])
+
+POOL_CAPACITY = Gauge("db_pool_capacity", "Pool size plus overflow", ["pool"], multiprocess_mode="livesum")
+POOL_OPEN = Gauge("db_pool_connections_open", "Open pooled connections", ["pool"], multiprocess_mode="livesum")
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections lent to sessions", ["pool"], multiprocess_mode="livesum")
+POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "Connections handed out by the pool", ["pool"])
+
+INFERENCE = Histogram(
+    "model_inference_seconds", "Model inference time", ["model"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+PASSWORD_HASH_QUEUED = Gauge(
+    "password_hash_queued", "Password hashes waiting for a hashing thread", multiprocess_mode="livesum",
+)
+PASSWORD_HASH_WAIT = Histogram(
+    "password_hash_wait_seconds", "Time a password hash waited for a hashing thread", buckets=_LATENCY_BUCKETS,
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_seconds", "Time spent hashing or verifying one password",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+PASSWORD_HASH_REJECTED = Counter("password_hash_rejected_total", "Hashes refused because the queue was full")
+LOGIN_THROTTLED = Counter("login_throttled_total", "Logins refused for too many failures", ["scope"])
+RATE_LIMITED = Counter("rate_limited_total", "Requests refused by the rate limiter", ["rule", "scope"])
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by result (hit / miss)", ["cache", "result"])
+
+
+def time_inference(model: str):
+    """``with time_inference("absence"): model.predict(X)``"""
+    return INFERENCE.labels(model).time()
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+# -- connection pools ----------------------------------------------------------
+
+_instrumented = weakref.WeakSet()
+_pool_lock = threading.Lock()
+
+
+def instrument_pool(name: str, engine):
+    """Track the pool of a sync ``engine`` (or an async engine's ``sync_engine``) under ``name``."""
+    with _pool_lock:
+        if engine in _instrumented:
+            return
+        _instrumented.add(engine)
+    pool = engine.pool
+    if hasattr(pool, "size") and hasattr(pool, "_max_overflow"):
+        POOL_CAPACITY.labels(name).set(pool.size() + max(pool._max_overflow, 0))
+    open_, checked_out, checkouts = POOL_OPEN.labels(name), POOL_CHECKED_OUT.labels(name), POOL_CHECKOUTS.labels(name)
+
+    def on_checkout(dbapi_connection, record, proxy):
+        checked_out.inc()
+        checkouts.inc()
+
+    event.listen(engine, "connect", lambda *a: open_.inc())
+    event.listen(engine, "close", lambda *a: open_.dec())
+    event.listen(engine, "checkout", on_checkout)
+    event.listen(engine, "checkin", lambda *a: checked_out.dec())
+
+
+# -- exposition ------------------------------------------------------------------
+
+def render() -> bytes:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_process_dead():
+    """Drop this worker's live gauges from the shared directory (on shutdown)."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
+
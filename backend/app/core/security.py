@@ -1,14 +1,32 @@
+import logging
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
+from typing import Optional
 from app.core.config import settings
+from app.core.kvstore import get_store
 
-# Use pbkdf2_sha256 to avoid bcrypt backend issues in some environments
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+TOKEN_VERSION_PREFIX = "auth-ver:"
+
+# Use pbkdf2_sha256 to avoid bcrypt backend issues in some environments.
+# Hashes below the configured rounds verify as before but need_update, so
+# they are replaced on the next successful login.
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=settings.PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__min_rounds=settings.PASSWORD_HASH_ROUNDS,
+)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update(plain_password, hashed_password):
+    """``(valid, new_hash)``; ``new_hash`` is set when the stored hash uses outdated parameters."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password):
     return pwd_context.hash(password)
 
@@ -20,4 +38,31 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
\ No newline at end of file
+    return encoded_jwt
+
+
+# Current token_version per user, shared by all workers for
+# AUTH_USER_CACHE_SECONDS so authenticated requests skip the users table.
+
+def cached_token_version(user_id: int) -> Optional[int]:
+    try:
+        return get_store().get(f"{TOKEN_VERSION_PREFIX}{user_id}")
+    except Exception:
+        logger.exception("shared state store unavailable; checking the token version in the database")
+        return None
+
+def remember_token_version(user_id: int, version: Optional[int]):
+    if version is None or settings.AUTH_USER_CACHE_SECONDS <= 0:
+        return
+    try:
+        # add, not set: a fill racing a revocation must not put the old version back
+        get_store().add(f"{TOKEN_VERSION_PREFIX}{user_id}", version, ttl=settings.AUTH_USER_CACHE_SECONDS)
+    except Exception:
+        logger.exception("shared state store unavailable")
+
+def publish_token_version(user_id: int, version: int):
+    """Replace the cached version right after a revocation commits, for every worker at once."""
+    try:
+        get_store().set(f"{TOKEN_VERSION_PREFIX}{user_id}", version, ttl=max(settings.AUTH_USER_CACHE_SECONDS, 1))
+    except Exception:
+        logger.exception("could not publish the token version of user %s", user_id)
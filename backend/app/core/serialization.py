@@ -0,0 +1,39 @@
+"""JSON encoding with orjson.
+
+orjson writes dicts, lists, dataclasses, dates, datetimes and UUIDs in C,
+in one pass. Routes that return large lists build them from the row
+dataclasses in ``app.crud`` and send an ``ORJSONResponse`` themselves, which
+skips FastAPI's ``jsonable_encoder`` walk over every row. Objects orjson
+does not know (pydantic models, Decimal, sets) fall back to
+``jsonable_encoder`` one at a time.
+
+Dates come out as ISO 8601 like before: ``2026-01-31`` and
+``2026-01-31T08:00:00`` (offset-aware datetimes keep their ``+00:00``).
+"""
+from typing import Any
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse as _ORJSONResponse
+
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj):
+    return jsonable_encoder(obj)
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=OPTIONS)
+
+
+def to_jsonable(content: Any):
+    """``content`` reduced to plain JSON types (dates as strings), as ``jsonable_encoder`` would."""
+    return orjson.loads(dumps(content))
+
+
+class ORJSONResponse(_ORJSONResponse):
+    """The app's default response class; also returned directly by list routes."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
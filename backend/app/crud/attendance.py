@@ -1,20 +1,306 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import String, insert, select, tuple_, type_coerce
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.models.attendance import Attendance
+from app.core.database import run_write, run_write_async
+from app.models.attendance import ArchivedPunchKey, Attendance
+from app.core.pagination import encode_cursor
+from app.crud.daily_attendance import affected_days, refresh_daily_attendance, _naive_utc
+from app.services import events, punch_anomalies
+from app.services.cold_storage import cold_horizon, cold_horizon_async, cold_logs_page, cold_punch
 
+logger = logging.getLogger(__name__)
 
-def create_attendance(db: Session, *, attendance_in: dict) -> Attendance:
+ATTENDANCE_FIELDS = ('employee_id', 'method', 'confidence_score', 'location', 'shift', 'direction')
+
+
+def _punch_row(att: Attendance) -> dict:
+    row = {f: getattr(att, f) for f in ATTENDANCE_FIELDS}
+    row['id'] = att.id
+    row['created_at'] = att.created_at
+    return row
+
+
+def punch_event(punch: dict) -> dict:
+    """JSON payload of a punch on the live feed."""
+    event = {f: punch.get(f) for f in ATTENDANCE_FIELDS}
+    event['id'] = punch['id']
+    event['created_at'] = _naive_utc(punch['created_at']).isoformat()
+    return event
+
+
+def _after_punches(db: Session, punches: List[dict]):
+    """Bring derived tables and live subscribers up to date with newly committed punches.
+
+    ``punches`` are row dicts carrying ``id`` and ``created_at``. The punch
+    itself is already durable; a failure here is logged and left for the
+    rebuild job instead of failing the check-in.
+    """
+    try:
+        refresh_daily_attendance(db, {(p['employee_id'], day) for p in punches for day in affected_days(p['created_at'])})
+    except Exception:
+        db.rollback()
+        logger.exception("Failed to update daily attendance rollup")
+    try:
+        events.publish_attendance([punch_event(p) for p in punches])
+    except Exception:
+        logger.exception("Failed to publish attendance events")
+    try:
+        punch_anomalies.observe_punches([dict(p, created_at=_naive_utc(p['created_at'])) for p in punches])
+    except Exception:
+        logger.exception("Failed to run punch anomaly detection")
+
+
+def get_attendance_by_idempotency_key(db: Session, key: str):
+    att = db.query(Attendance).filter(Attendance.idempotency_key == key).first()
+    if att is None:
+        # a replay of a punch that has since been archived
+        att = _archived_punch(db.get(ArchivedPunchKey, key))
+    return att
+
+
+def _archived_punch(archived: Optional[ArchivedPunchKey]):
+    return cold_punch(archived.month, archived.attendance_id) if archived is not None else None
+
+
+async def get_attendance_by_idempotency_key_async(db: AsyncSession, key: str):
+    att = await db.scalar(select(Attendance).where(Attendance.idempotency_key == key))
+    if att is None:
+        archived = await db.get(ArchivedPunchKey, key)
+        if archived is not None:
+            # Parquet reads are blocking file IO; keep them off the event loop
+            att = await asyncio.to_thread(_archived_punch, archived)
+    return att
+
+
+def _insert_attendance(db: Session, attendance_in: dict):
+    """Store one punch (a write job); returns ``(attendance, created)``."""
+    key = attendance_in.get('idempotency_key')
     att = Attendance(
         employee_id=attendance_in.get('employee_id'),
         method=attendance_in.get('method'),
         confidence_score=attendance_in.get('confidence_score'),
         location=attendance_in.get('location'),
-        shift=attendance_in.get('shift')
+        shift=attendance_in.get('shift'),
+        direction=attendance_in.get('direction'),
+        idempotency_key=key,
+        # set here rather than by the server default so every row stores the
+        # same timestamp format and keyset cursors compare exactly
+        created_at=datetime.utcnow(),
     )
     db.add(att)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # another request stored the same key between our lookup and commit
+        db.rollback()
+        existing = get_attendance_by_idempotency_key(db, key) if key else None
+        if existing is None:
+            raise
+        return existing, False
     db.refresh(att)
+    return att, True
+
+
+def create_attendance(db: Session, *, attendance_in: dict) -> Attendance:
+    key = attendance_in.get('idempotency_key')
+    if key:
+        existing = get_attendance_by_idempotency_key(db, key)
+        if existing:
+            return existing
+    att, created = run_write(db, _insert_attendance, attendance_in)
+    if created:
+        run_write(db, _after_punches, [_punch_row(att)])
+    return att
+
+
+def _existing_keys(db: Session, keys) -> dict:
+    rows = db.query(Attendance.idempotency_key, Attendance.id).filter(Attendance.idempotency_key.in_(keys)).all()
+    existing = {k: i for k, i in rows}
+    missing = [k for k in keys if k not in existing]
+    if missing:
+        existing.update(db.query(ArchivedPunchKey.idempotency_key, ArchivedPunchKey.attendance_id)
+                        .filter(ArchivedPunchKey.idempotency_key.in_(missing)).all())
+    return existing
+
+
+def _insert_chunk(db: Session, rows: List[dict]) -> dict:
+    stmt = insert(Attendance).returning(Attendance.idempotency_key, Attendance.id)
+    inserted = {k: i for k, i in db.execute(stmt, rows).all()}
+    db.commit()
+    _after_punches(db, [dict(row, id=inserted[row['idempotency_key']]) for row in rows])
+    return inserted
+
+
+def bulk_create_attendance(db: Session, *, records: List[dict], chunk_size: int = 500) -> List[dict]:
+    """Insert buffered punches keyed by ``idempotency_key``.
+
+    Records are processed in chunks: one ``IN`` query finds keys that are
+    already stored, the rest go in as a single executemany insert and commit.
+    Returns one ``{idempotency_key, status, id}`` dict per input record, in
+    input order; ``status`` is ``created`` or ``duplicate``.
+    """
+    results = []
+    now = datetime.utcnow()
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        keys = [r['idempotency_key'] for r in chunk]
+        existing = _existing_keys(db, set(keys))
+
+        rows = []
+        pending = set()
+        for r in chunk:
+            key = r['idempotency_key']
+            if key in existing or key in pending:
+                continue
+            pending.add(key)
+            row = {f: r.get(f) for f in ATTENDANCE_FIELDS}
+            row['idempotency_key'] = key
+            row['created_at'] = _naive_utc(r['created_at']) if r.get('created_at') else now
+            rows.append(row)
+
+        created = {}
+        if rows:
+            try:
+                created = run_write(db, _insert_chunk, rows)
+            except IntegrityError:
+                # a concurrent sync stored some of these keys; retry without them
+                db.rollback()
+                existing = _existing_keys(db, set(keys))
+                rows = [row for row in rows if row['idempotency_key'] not in existing]
+                created = run_write(db, _insert_chunk, rows) if rows else {}
+
+        seen = set()
+        for key in keys:
+            if key in created and key not in seen:
+                results.append({'idempotency_key': key, 'status': 'created', 'id': created[key]})
+            else:
+                results.append({'idempotency_key': key, 'status': 'duplicate', 'id': existing.get(key, created.get(key))})
+            seen.add(key)
+    return results
+
+
+def get_punch_events_since(db: Session, after_id: int, before_id: Optional[int] = None, limit: int = 1000):
+    """Live-feed payloads for punches with ``after_id < id < before_id``, in id order.
+
+    Backfills a resumed feed when the broker's history no longer reaches back
+    to the client's last event.
+    """
+    query = db.query(Attendance).filter(Attendance.id > after_id)
+    if before_id is not None:
+        query = query.filter(Attendance.id < before_id)
+    return [punch_event(_punch_row(att)) for att in query.order_by(Attendance.id).limit(limit)]
+
+
+def _logs_select(employee_id=None, location=None, method=None,
+                 start: Optional[datetime] = None, end: Optional[datetime] = None):
+    query = select(Attendance)
+    if employee_id is not None:
+        query = query.where(Attendance.employee_id == employee_id)
+    if location is not None:
+        query = query.where(Attendance.location == location)
+    if method is not None:
+        query = query.where(Attendance.method == method)
+    if start is not None:
+        query = query.where(Attendance.created_at >= start)
+    if end is not None:
+        query = query.where(Attendance.created_at < end)
+    return query.order_by(Attendance.created_at.desc(), Attendance.id.desc())
+
+
+def _stored_cursor_query(after):
+    """Select the cursor row if its ``created_at`` is stored to the second.
+
+    Rows written by the old server default hold ``YYYY-MM-DD HH:MM:SS``;
+    everything since holds microseconds. SQLite compares the column as text,
+    so a cursor on a whole second has to be bound in the form its row was
+    stored in, or rows of that second are repeated or skipped.
+    """
+    if after is None or after[0].microsecond:
+        return None
+    text = _naive_utc(after[0]).strftime('%Y-%m-%d %H:%M:%S')
+    return select(type_coerce(Attendance.created_at, String)).where(
+        Attendance.id == after[1], type_coerce(Attendance.created_at, String) == text)
+
+
+def _keyset(query, limit: int, after=None, stored: Optional[str] = None):
+    if stored is not None:
+        column = type_coerce(Attendance.created_at, String)
+        query = query.where(tuple_(column, Attendance.id) < tuple_(stored, after[1]))
+    elif after is not None:
+        query = query.where(tuple_(Attendance.created_at, Attendance.id) < tuple_(*after))
+    return query.limit(limit + 1)
+
+
+def _finish_page(rows, limit: int, horizon, cold_page):
+    """Merge the cold tier into a hot page when it reaches back to ``horizon``; returns (rows, next_cursor).
+
+    Every cold punch is at or before the horizon, so ``cold_page()`` is only
+    called when the page gets that far back.
+    """
+    if horizon is not None and (len(rows) <= limit or _naive_utc(rows[limit].created_at) <= horizon):
+        rows = sorted(rows + cold_page(), key=lambda r: (_naive_utc(r.created_at), r.id), reverse=True)[:limit + 1]
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+
+def get_attendance_logs(db: Session, skip: int = 0, limit: int = 100, **filters):
+    # Offset paging, kept for existing callers; deep pages scan every skipped row
+    return db.scalars(_logs_select(**filters).offset(skip).limit(limit)).all()
+
+
+def get_attendance_page(db: Session, limit: int = 100, after=None, **filters):
+    """Keyset page of logs, newest first, spanning the hot table and archived months.
+
+    ``after`` is the decoded ``(created_at, id)`` of the last row already
+    seen. Returns ``(rows, next_cursor)``; ``next_cursor`` is None on the
+    last page.
+    """
+    stored = _stored_cursor_query(after)
+    if stored is not None and db.get_bind().dialect.name == 'sqlite':
+        stored = db.scalar(stored)
+    else:
+        stored = None
+    rows = db.scalars(_keyset(_logs_select(**filters), limit, after, stored)).all()
+    return _finish_page(list(rows), limit, cold_horizon(db), lambda: cold_logs_page(limit + 1, after=after, **filters))
+
+
+# -- async -------------------------------------------------------------------
+
+async def create_attendance_async(db: AsyncSession, *, attendance_in: dict) -> Attendance:
+    key = attendance_in.get('idempotency_key')
+    if key:
+        existing = await get_attendance_by_idempotency_key_async(db, key)
+        if existing:
+            return existing
+    att, created = await run_write_async(db, _insert_attendance, attendance_in)
+    if created:
+        # the punch is committed; the rollup refresh is its own write job
+        await run_write_async(db, _after_punches, [_punch_row(att)])
     return att
 
 
-def get_attendance_logs(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Attendance).order_by(Attendance.created_at.desc()).offset(skip).limit(limit).all()
+async def get_attendance_logs_async(db: AsyncSession, skip: int = 0, limit: int = 100, **filters):
+    return (await db.scalars(_logs_select(**filters).offset(skip).limit(limit))).all()
+
+
+async def get_attendance_page_async(db: AsyncSession, limit: int = 100, after=None, **filters):
+    stored = _stored_cursor_query(after)
+    if stored is not None and db.get_bind().dialect.name == 'sqlite':
+        stored = await db.scalar(stored)
+    else:
+        stored = None
+    rows = list((await db.scalars(_keyset(_logs_select(**filters), limit, after, stored))).all())
+    horizon = await cold_horizon_async(db)
+    cold = []
+    if horizon is not None and (len(rows) <= limit or _naive_utc(rows[limit].created_at) <= horizon):
+        # Parquet reads are blocking file IO; keep them off the event loop
+        cold = await asyncio.to_thread(cold_logs_page, limit + 1, after=after, **filters)
+    return _finish_page(rows, limit, horizon, lambda: cold)
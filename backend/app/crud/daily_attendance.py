@@ -0,0 +1,258 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, List, Optional
+
+from sqlalchemy import func, insert, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.attendance import Attendance, DailyAttendance
+from app.crud.presence import apply_daily_summaries, rebuild_presence
+from app.crud.rollups import apply_daily_changes, department_map, rebuild_rollups
+from app.services.cold_storage import in_cold_range, iter_cold_punches, merge_punch_streams
+from app.services.pairing import COMPLETE, PunchPairer, WorkSession, pair_punches
+
+
+def _naive_utc(ts: datetime) -> datetime:
+    # SQLite hands back naive UTC datetimes, Postgres aware ones; compare as naive UTC
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _shift_start(day: date) -> datetime:
+    hours, minutes = settings.SHIFT_START_TIME.split(':')
+    return datetime.combine(day, time(int(hours), int(minutes)))
+
+
+def _pairer_options() -> dict:
+    return {
+        'max_session': timedelta(hours=settings.MAX_SHIFT_HOURS),
+        'duplicate_window': timedelta(seconds=settings.DUPLICATE_SCAN_SECONDS),
+    }
+
+
+def affected_days(ts: datetime) -> set:
+    """Days whose rollup a punch at ``ts`` can change (it may close or open an overnight session)."""
+    span = timedelta(hours=settings.MAX_SHIFT_HOURS)
+    ts = _naive_utc(ts)
+    return {(ts - span).date(), ts.date(), (ts + span).date()}
+
+
+def summarize_sessions(sessions: Iterable[WorkSession], departments: Optional[dict] = None) -> dict:
+    """Fold paired sessions into daily_attendance rows keyed by ``(employee_id, work_date)``."""
+    days = {}
+    for s in sessions:
+        key = (s.employee_id, s.work_date)
+        day = days.get(key)
+        if day is None:
+            day = days[key] = {
+                'employee_id': s.employee_id, 'work_date': key[1], 'first_in': None, 'last_out': None,
+                'punch_count': 0, 'missing_punches': 0, 'minutes_late': 0, 'worked_minutes': 0,
+                'first_location': s.location,
+            }
+        if s.check_in is not None and (day['first_in'] is None or s.check_in < day['first_in']):
+            day['first_in'] = s.check_in
+            day['first_location'] = s.location
+        if s.check_out is not None and (day['last_out'] is None or s.check_out > day['last_out']):
+            day['last_out'] = s.check_out
+        day['punch_count'] += s.punches
+        day['worked_minutes'] += s.minutes
+        if s.status != COMPLETE:
+            day['missing_punches'] += 1
+    for day in days.values():
+        day['department'] = (departments or {}).get(day['employee_id'])
+        if day['first_in'] is not None:
+            late = int((day['first_in'] - _shift_start(day['work_date'])).total_seconds() // 60)
+            day['minutes_late'] = late if late > settings.LATE_GRACE_MINUTES else 0
+    return days
+
+
+PUNCH_COLUMNS = (Attendance.employee_id, Attendance.created_at, Attendance.direction, Attendance.location)
+
+
+def _punch_stream(db: Session, hot, employee_ids=None, start: Optional[datetime] = None,
+                  end: Optional[datetime] = None):
+    """``(employee_id, created_at, direction, location)`` ordered by employee and time, hot plus archived."""
+    hot = ((emp, _naive_utc(ts), direction, location) for emp, ts, direction, location in hot)
+    if not in_cold_range(db, start):
+        return hot
+    cold = iter_cold_punches(employee_ids, start=start, end=end,
+                             columns=('employee_id', 'created_at', 'direction', 'location'))
+    return merge_punch_streams(hot, cold)
+
+
+ROLLUP_FIELDS = ('work_date', 'first_in', 'punch_count', 'minutes_late', 'worked_minutes',
+                 'first_location', 'department')
+
+
+def _store_summaries(db: Session, summaries: dict):
+    existing = {
+        (row.employee_id, row.work_date): row
+        for row in db.query(DailyAttendance).filter(
+            tuple_(DailyAttendance.employee_id, DailyAttendance.work_date).in_(list(summaries))
+        ).with_for_update()
+    }
+    apply_daily_changes(
+        db,
+        [{f: getattr(row, f) for f in ROLLUP_FIELDS} for row in existing.values()],
+        [summary for summary in summaries.values() if summary is not None],
+    )
+    for key, summary in summaries.items():
+        row = existing.get(key)
+        if summary is None:
+            if row is not None:
+                db.delete(row)
+        elif row is None:
+            db.add(DailyAttendance(**summary))
+        else:
+            for field, value in summary.items():
+                setattr(row, field, value)
+    apply_daily_summaries(db, summaries)
+    db.commit()
+
+
+def refresh_daily_attendance(db: Session, keys: Iterable):
+    """Recompute the rollup rows for the given ``(employee_id, work_date)`` keys.
+
+    Called after punches commit. All affected employees are read back in one
+    indexed range query (widened by the longest shift so overnight sessions
+    pair correctly), so this costs the same for one check-in as for a chunk
+    of synced punches, and a late or replayed punch just recomputes its days.
+    """
+    keys = set(keys)
+    if not keys:
+        return
+    span = timedelta(hours=settings.MAX_SHIFT_HOURS)
+    employees = {emp for emp, _ in keys}
+    lo = datetime.combine(min(day for _, day in keys), time.min) - span
+    hi = datetime.combine(max(day for _, day in keys), time.min) + timedelta(days=1) + span
+    rows = (
+        db.query(*PUNCH_COLUMNS)
+        .filter(
+            Attendance.employee_id.in_(employees),
+            Attendance.created_at >= lo,
+            Attendance.created_at < hi,
+        )
+        .order_by(Attendance.employee_id, Attendance.created_at, Attendance.id)
+        .all()
+    )
+    punches = _punch_stream(db, rows, employee_ids=employees, start=lo, end=hi)
+    days = summarize_sessions(pair_punches(punches, **_pairer_options()), department_map(db, employees))
+    summaries = {key: days.get(key) for key in keys}
+
+    try:
+        _store_summaries(db, summaries)
+    except IntegrityError:
+        # a concurrent refresh inserted one of these rows first; update it instead
+        db.rollback()
+        _store_summaries(db, summaries)
+
+
+def iter_work_sessions(db: Session, start: Optional[date] = None, end: Optional[date] = None,
+                       employee_ids: Optional[List[str]] = None, chunk_size: int = 5000):
+    """Stream paired sessions whose work date falls in ``[start, end)``.
+
+    One ordered scan over (employee_id, created_at), merged with archived
+    months when the range reaches them; nothing is loaded per employee and at
+    most one employee's open session is held at a time.
+    """
+    span = timedelta(hours=settings.MAX_SHIFT_HOURS)
+    lo = datetime.combine(start, time.min) - span if start is not None else None
+    hi = datetime.combine(end, time.min) + span if end is not None else None
+    query = db.query(*PUNCH_COLUMNS)
+    if employee_ids:
+        query = query.filter(Attendance.employee_id.in_(employee_ids))
+    if lo is not None:
+        query = query.filter(Attendance.created_at >= lo)
+    if hi is not None:
+        query = query.filter(Attendance.created_at < hi)
+    hot = query.order_by(Attendance.employee_id, Attendance.created_at, Attendance.id).yield_per(chunk_size)
+    stream = _punch_stream(db, hot, employee_ids=employee_ids, start=lo, end=hi)
+
+    def in_range(s):
+        return (start is None or s.work_date >= start) and (end is None or s.work_date < end)
+
+    pairer = PunchPairer(**_pairer_options())
+    current = None
+    for emp, ts, direction, location in stream:
+        if emp != current:
+            yield from filter(in_range, pairer.flush())
+            current = emp
+        yield from filter(in_range, pairer.feed(emp, ts, direction, location))
+    yield from filter(in_range, pairer.flush())
+
+
+def rebuild_daily_attendance(db: Session, start: Optional[date] = None, end: Optional[date] = None,
+                             chunk_size: int = 1000) -> int:
+    """Regenerate the rollup from raw punches for ``[start, end)`` (all history by default).
+
+    Sessions come from iter_work_sessions, which streams punches in
+    (employee_id, created_at) order, so memory use does not depend on the
+    size of the range. Returns the number of rows written.
+    """
+    existing = db.query(DailyAttendance)
+    if start is not None:
+        existing = existing.filter(DailyAttendance.work_date >= start)
+    if end is not None:
+        existing = existing.filter(DailyAttendance.work_date < end)
+    existing.delete(synchronize_session=False)
+
+    batch, written = [], 0
+    current, sessions = None, []
+    departments = department_map(db)
+
+    def _flush_employee():
+        nonlocal batch, written
+        batch.extend(summarize_sessions(sessions, departments).values())
+        if len(batch) >= chunk_size:
+            db.execute(insert(DailyAttendance), batch)
+            written += len(batch)
+            batch = []
+
+    for s in iter_work_sessions(db, start=start, end=end, chunk_size=chunk_size):
+        if s.employee_id != current:
+            _flush_employee()
+            current, sessions = s.employee_id, []
+        sessions.append(s)
+    _flush_employee()
+    if batch:
+        db.execute(insert(DailyAttendance), batch)
+        written += len(batch)
+    db.commit()
+    if start is not None or end is not None or written:
+        lo = start or db.query(func.min(DailyAttendance.work_date)).scalar() or end
+        hi = end or datetime.utcnow().date() + timedelta(days=1)
+        rebuild_presence(db, lo, hi)
+        rebuild_rollups(db, lo, hi)
+    return written
+
+
+def get_daily_attendance(db: Session, employee_ids: Optional[List[str]] = None,
+                         start: Optional[date] = None, end: Optional[date] = None,
+                         skip: int = 0, limit: int = 1000):
+    query = db.query(DailyAttendance)
+    if employee_ids:
+        query = query.filter(DailyAttendance.employee_id.in_(employee_ids))
+    if start is not None:
+        query = query.filter(DailyAttendance.work_date >= start)
+    if end is not None:
+        query = query.filter(DailyAttendance.work_date <= end)
+    return query.order_by(DailyAttendance.work_date.desc(), DailyAttendance.employee_id).offset(skip).limit(limit).all()
+
+
+def employee_attendance_ids(employee) -> List[str]:
+    # Punches identify employees by numeric id (what the web app sends) or by code
+    return [str(employee.id), employee.employee_id]
+
+
+def get_today_attendance(db: Session, employee) -> Optional[DailyAttendance]:
+    return (
+        db.query(DailyAttendance)
+        .filter(
+            DailyAttendance.employee_id.in_(employee_attendance_ids(employee)),
+            DailyAttendance.work_date == datetime.utcnow().date(),
+        )
+        .order_by(DailyAttendance.first_in)
+        .first()
+    )
@@ -1,11 +1,16 @@
+from dataclasses import dataclass
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, case, func, select
+from app.core.database import run_write, run_write_async
 from datetime import date
 from typing import List, Optional
 from app.models.leave import LeaveRequest, LeaveBalance, BlackoutPeriod, LeaveStatus
-from app.schemas.leave import LeaveRequestCreate, LeaveRequestUpdate
+from app.schemas.leave import LeaveRequestCreate, LeaveRequestUpdate, BlackoutPeriodCreate
 from app.models.user import Employee, User
-from datetime import datetime
+from app.crud.presence import refresh_leave_days
+from app.crud.version import bump_version
+from datetime import datetime, timedelta
 
 # Provide a static list of leave types for now (no DB table required)
 LEAVE_TYPES = [
@@ -15,6 +20,92 @@ LEAVE_TYPES = [
     {"id": 4, "name": "Emergency Leave", "code": "EL", "maxDays": 5, "description": "Emergency leave"},
 ]
 
+
+# Row projections: listings select these columns straight from SQL and
+# orjson writes the dataclasses without an intermediate dict per row.
+
+@dataclass(slots=True)
+class LeaveEmployee:
+    name: Optional[str]
+    department: Optional[str]
+    employee_id: Optional[str]
+
+
+@dataclass(slots=True)
+class LeaveRow:
+    id: int
+    employee_id: int
+    leave_type: str
+    start_date: date
+    end_date: date
+    reason: str
+    status: str
+    duration: int
+    submitted_at: datetime
+    approved_by: Optional[int]
+    approved_at: Optional[datetime]
+    remarks: Optional[str]
+    employee: Optional[LeaveEmployee] = None
+
+
+@dataclass(slots=True)
+class BlackoutRow:
+    id: int
+    name: str
+    start_date: date
+    end_date: date
+    reason: str
+    restriction_level: str
+    created_at: datetime
+
+
+LEAVE_COLUMNS = (
+    LeaveRequest.id, LeaveRequest.employee_id, LeaveRequest.leave_type, LeaveRequest.start_date,
+    LeaveRequest.end_date, LeaveRequest.reason, LeaveRequest.status, LeaveRequest.duration,
+    LeaveRequest.submitted_at, LeaveRequest.approved_by, LeaveRequest.approved_at, LeaveRequest.remarks,
+)
+BLACKOUT_COLUMNS = (
+    BlackoutPeriod.id, BlackoutPeriod.name, BlackoutPeriod.start_date, BlackoutPeriod.end_date,
+    BlackoutPeriod.reason, BlackoutPeriod.restriction_level, BlackoutPeriod.created_at,
+)
+
+# "First Last" when both are set, else the username; no name without a user account
+EMPLOYEE_NAME = case(
+    (User.id.is_(None), None),
+    (and_(func.coalesce(Employee.first_name, "") != "", func.coalesce(Employee.last_name, "") != ""),
+     Employee.first_name + " " + Employee.last_name),
+    else_=User.username,
+)
+
+
+def _enriched_stmt(*where, skip: int = 0, limit: Optional[int] = None):
+    # one outer-joined query instead of two lookups per leave
+    return (
+        select(*LEAVE_COLUMNS, EMPLOYEE_NAME, Employee.department, Employee.employee_id)
+        .outerjoin(Employee, Employee.id == LeaveRequest.employee_id)
+        .outerjoin(User, User.id == Employee.user_id)
+        .where(*where)
+        .order_by(LeaveRequest.submitted_at.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+
+
+def _enriched_rows(result) -> List[LeaveRow]:
+    return [LeaveRow(*row[:12], LeaveEmployee(*row[12:])) for row in result]
+
+
+def _enriched_leaves(db: Session, *where, skip: int = 0, limit: Optional[int] = None) -> List[LeaveRow]:
+    return _enriched_rows(db.execute(_enriched_stmt(*where, skip=skip, limit=limit)))
+
+
+def _leave_row(leave: LeaveRequest) -> LeaveRow:
+    return LeaveRow(*(getattr(leave, column.key) for column in LEAVE_COLUMNS))
+
+
+def _blackout_row(period: BlackoutPeriod) -> BlackoutRow:
+    return BlackoutRow(*(getattr(period, column.key) for column in BLACKOUT_COLUMNS))
+
 def create_leave_request(db: Session, leave_request: LeaveRequestCreate, employee_id: int):
     # Calculate duration
     duration = (leave_request.end_date - leave_request.start_date).days + 1
@@ -29,50 +120,22 @@ def create_leave_request(db: Session, leave_request: LeaveRequestCreate, employe
     )
     
     db.add(db_leave)
+    bump_version(db, "leaves")
     db.commit()
     db.refresh(db_leave)
-    
-    # Return a dictionary instead of the SQLAlchemy object
-    return {
-        "id": db_leave.id,
-        "employee_id": db_leave.employee_id,
-        "leave_type": db_leave.leave_type,
-        "start_date": db_leave.start_date,
-        "end_date": db_leave.end_date,
-        "reason": db_leave.reason,
-        "status": db_leave.status,
-        "duration": db_leave.duration,
-        "submitted_at": db_leave.submitted_at,
-        "approved_by": db_leave.approved_by,
-        "approved_at": db_leave.approved_at,
-        "remarks": db_leave.remarks,
-        "employee": None  # We'll handle this separately if needed
-    }
+    return _leave_row(db_leave)
+
+def _employee_leaves_stmt(employee_id: int, skip: int, limit: int):
+    return (
+        select(*LEAVE_COLUMNS)
+        .where(LeaveRequest.employee_id == employee_id)
+        .order_by(LeaveRequest.submitted_at.desc())
+        .offset(skip)
+        .limit(limit)
+    )
 
 def get_leave_requests_by_employee(db: Session, employee_id: int, skip: int = 0, limit: int = 100):
-    leaves = db.query(LeaveRequest).filter(
-        LeaveRequest.employee_id == employee_id
-    ).order_by(LeaveRequest.submitted_at.desc()).offset(skip).limit(limit).all()
-    
-    # Convert to list of dictionaries
-    return [
-        {
-            "id": leave.id,
-            "employee_id": leave.employee_id,
-            "leave_type": leave.leave_type,
-            "start_date": leave.start_date,
-            "end_date": leave.end_date,
-            "reason": leave.reason,
-            "status": leave.status,
-            "duration": leave.duration,
-            "submitted_at": leave.submitted_at,
-            "approved_by": leave.approved_by,
-            "approved_at": leave.approved_at,
-            "remarks": leave.remarks,
-            "employee": None
-        }
-        for leave in leaves
-    ]
+    return [LeaveRow(*row) for row in db.execute(_employee_leaves_stmt(employee_id, skip, limit))]
 
 def get_all_leave_requests(db: Session, skip: int = 0, limit: int = 100):
     # Use the enriched representation so admin views have employee info populated
@@ -81,7 +144,7 @@ def get_all_leave_requests(db: Session, skip: int = 0, limit: int = 100):
 def get_pending_leave_requests(db: Session, skip: int = 0, limit: int = 100):
     # Reuse the enriched listing and filter for pending status
     all_enriched = get_all_leave_requests_enriched(db, skip=skip, limit=limit)
-    pending = [r for r in all_enriched if r.get("status") == LeaveStatus.PENDING]
+    pending = [r for r in all_enriched if r.status == LeaveStatus.PENDING]
     return pending
 
 def get_leave_request_by_id(db: Session, leave_id: int):
@@ -95,49 +158,18 @@ def update_leave_request_status(db: Session, leave_id: int, leave_update: LeaveR
         if leave_update.status.value == LeaveStatus.APPROVED:
             db_leave.approved_by = approved_by
             db_leave.approved_at = date.today()
+        bump_version(db, "leaves")
         
         db.commit()
         db.refresh(db_leave)
-        
-        # Return dictionary
-        # Enrich employee info if available
-        emp = db.query(Employee).filter(Employee.id == db_leave.employee_id).first()
-        user = None
-        if emp:
-            user = db.query(User).filter(User.id == emp.user_id).first()
-
-        employee_name = None
-        department = None
-        employee_code = None
-        if emp:
-            employee_code = emp.employee_id
-            department = emp.department
-        if user:
-            employee_name = f"{user.username}" if not (getattr(emp, 'first_name', None) and getattr(emp, 'last_name', None)) else f"{emp.first_name} {emp.last_name}"
-
-        return {
-            "id": db_leave.id,
-            "employee_id": db_leave.employee_id,
-            "leave_type": db_leave.leave_type,
-            "start_date": db_leave.start_date,
-            "end_date": db_leave.end_date,
-            "reason": db_leave.reason,
-            "status": db_leave.status,
-            "duration": db_leave.duration,
-            "submitted_at": db_leave.submitted_at,
-            "approved_by": db_leave.approved_by,
-            "approved_at": db_leave.approved_at,
-            "remarks": db_leave.remarks,
-            "employee": {"name": employee_name, "department": department, "employee_id": employee_code},
-        }
+        refresh_leave_days(db, db_leave.employee_id, db_leave.start_date, db_leave.end_date)
+        return _enriched_leaves(db, LeaveRequest.id == leave_id)[0]
     return None
 
-# Keep the other functions (get_leave_balance, get_blackout_periods) the same as before
-def get_leave_balance(db: Session, employee_id: int):
+def ensure_leave_balance(db: Session, employee_id: int) -> LeaveBalance:
+    """The employee's balance row, created with the default allowances if missing (a write job)."""
     balance = db.query(LeaveBalance).filter(LeaveBalance.employee_id == employee_id).first()
-    
     if not balance:
-        # Create default balance if not exists
         balance = LeaveBalance(
             employee_id=employee_id,
             vacation_days=15,
@@ -148,131 +180,128 @@ def get_leave_balance(db: Session, employee_id: int):
         db.add(balance)
         db.commit()
         db.refresh(balance)
-    
-    # Calculate used leaves
-    used_leaves = db.query(LeaveRequest).filter(
-        and_(
-            LeaveRequest.employee_id == employee_id,
-            LeaveRequest.status == LeaveStatus.APPROVED
-        )
-    ).all()
-    
-    used_vacation = sum(l.duration for l in used_leaves if l.leave_type == "vacation")
-    used_sick = sum(l.duration for l in used_leaves if l.leave_type == "sick")
-    used_personal = sum(l.duration for l in used_leaves if l.leave_type == "personal")
-    used_emergency = sum(l.duration for l in used_leaves if l.leave_type == "emergency")
-    
+    return balance
+
+def _balance_stmt(employee_id: int):
+    return select(LeaveBalance).where(LeaveBalance.employee_id == employee_id)
+
+def _used_days_stmt(employee_id: int):
+    return (
+        select(LeaveRequest.leave_type, func.sum(LeaveRequest.duration))
+        .where(LeaveRequest.employee_id == employee_id, LeaveRequest.status == LeaveStatus.APPROVED)
+        .group_by(LeaveRequest.leave_type)
+    )
+
+def _balance_response(balance: LeaveBalance, used: dict) -> dict:
     return {
         "vacation_days": balance.vacation_days,
         "sick_days": balance.sick_days,
         "personal_days": balance.personal_days,
         "emergency_days": balance.emergency_days,
-        "used_vacation": used_vacation,
-        "used_sick": used_sick,
-        "used_personal": used_personal,
-        "used_emergency": used_emergency
+        "used_vacation": used.get("vacation") or 0,
+        "used_sick": used.get("sick") or 0,
+        "used_personal": used.get("personal") or 0,
+        "used_emergency": used.get("emergency") or 0,
     }
 
-def get_blackout_periods(db: Session):
-    periods = db.query(BlackoutPeriod).order_by(BlackoutPeriod.start_date).all()
-    
-    # Convert to list of dictionaries
-    return [
-        {
-            "id": period.id,
-            "name": period.name,
-            "start_date": period.start_date,
-            "end_date": period.end_date,
-            "reason": period.reason,
-            "restriction_level": period.restriction_level,
-            "created_at": period.created_at
-        }
-        for period in periods
-    ]
+def get_leave_balance(db: Session, employee_id: int):
+    balance = db.scalar(_balance_stmt(employee_id)) or run_write(db, ensure_leave_balance, employee_id)
+    return _balance_response(balance, dict(db.execute(_used_days_stmt(employee_id)).all()))
 
+BLACKOUTS_STMT = select(*BLACKOUT_COLUMNS).order_by(BlackoutPeriod.start_date)
 
-def get_all_leave_requests_enriched(db: Session, skip: int = 0, limit: int = 100):
-    # Join LeaveRequest -> Employee -> User to enrich response with employee info
-    leaves = (
-        db.query(LeaveRequest)
-        .order_by(LeaveRequest.submitted_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+def get_blackout_periods(db: Session):
+    return [BlackoutRow(*row) for row in db.execute(BLACKOUTS_STMT)]
+
+def create_blackout_period(db: Session, blackout: BlackoutPeriodCreate):
+    db_period = BlackoutPeriod(**blackout.dict())
+    db.add(db_period)
+    bump_version(db, "blackouts")
+    db.commit()
+    db.refresh(db_period)
+    return _blackout_row(db_period)
 
-    enriched = []
-    for leave in leaves:
-        emp = db.query(Employee).filter(Employee.id == leave.employee_id).first()
-        user = None
-        if emp:
-            user = db.query(User).filter(User.id == emp.user_id).first()
-
-        employee_name = None
-        department = None
-        employee_code = None
-        if emp:
-            employee_code = emp.employee_id
-            department = emp.department
-        if user:
-            employee_name = f"{user.username}" if not (getattr(emp, 'first_name', None) and getattr(emp, 'last_name', None)) else f"{emp.first_name} {emp.last_name}"
-
-        enriched.append({
-            "id": leave.id,
-            "employee_id": leave.employee_id,
-            "employee": {"name": employee_name, "department": department, "employee_id": employee_code},
-            "leave_type": leave.leave_type,
-            "start_date": leave.start_date,
-            "end_date": leave.end_date,
-            "reason": leave.reason,
-            "status": leave.status,
-            "duration": leave.duration,
-            "submitted_at": leave.submitted_at,
-            "approved_by": leave.approved_by,
-            "approved_at": leave.approved_at,
-            "remarks": leave.remarks,
-        })
-
-    return enriched
+def delete_blackout_period(db: Session, period_id: int) -> bool:
+    deleted = db.query(BlackoutPeriod).filter(BlackoutPeriod.id == period_id).delete()
+    if deleted:
+        bump_version(db, "blackouts")
+    db.commit()
+    return bool(deleted)
 
 
-def get_admin_dashboard(db: Session):
-    today = datetime.utcnow().date()
+def get_all_leave_requests_enriched(db: Session, skip: int = 0, limit: int = 100):
+    # Join LeaveRequest -> Employee -> User to enrich response with employee info
+    return _enriched_leaves(db, skip=skip, limit=limit)
 
-    total_pending = db.query(LeaveRequest).filter(LeaveRequest.status == LeaveStatus.PENDING).count()
 
-    # onLeaveToday: count approved leaves that include today
-    on_leave_today = (
-        db.query(LeaveRequest)
-        .filter(
+def _dashboard_count_stmts(today: date):
+    """Pending approvals, approved leaves covering today, and leaves ending within 30 days."""
+    count = select(func.count()).select_from(LeaveRequest)
+    return (
+        count.where(LeaveRequest.status == LeaveStatus.PENDING),
+        count.where(
             LeaveRequest.status == LeaveStatus.APPROVED,
             LeaveRequest.start_date <= today,
             LeaveRequest.end_date >= today,
-        )
-        .count()
-    )
-
-    # upcoming expirations - placeholder: count of leaves ending within next 30 days
-    from datetime import timedelta
-    upcoming_threshold = today + timedelta(days=30)
-    upcoming_expirations = (
-        db.query(LeaveRequest)
-        .filter(LeaveRequest.end_date >= today, LeaveRequest.end_date <= upcoming_threshold)
-        .count()
+        ),
+        # upcoming expirations - placeholder: count of leaves ending within next 30 days
+        count.where(LeaveRequest.end_date >= today, LeaveRequest.end_date <= today + timedelta(days=30)),
     )
 
-    # policy violations - placeholder 0 for now
-    policy_violations = 0
-
-    requests = get_all_leave_requests_enriched(db)
-    blackout_periods = get_blackout_periods(db)
 
+def _dashboard(counts, requests, blackout_periods) -> dict:
+    total_pending, on_leave_today, upcoming_expirations = counts
     return {
         "pendingApprovals": total_pending,
         "onLeaveToday": on_leave_today,
-        "policyViolations": policy_violations,
+        "policyViolations": 0,  # placeholder for now
         "upcomingExpirations": upcoming_expirations,
         "leaveTypes": LEAVE_TYPES,
         "requests": requests,
         "blackoutPeriods": blackout_periods,
-    }
\ No newline at end of file
+    }
+
+
+def get_admin_dashboard(db: Session):
+    counts = [db.scalar(stmt) for stmt in _dashboard_count_stmts(datetime.utcnow().date())]
+    return _dashboard(counts, get_all_leave_requests_enriched(db), get_blackout_periods(db))
+
+
+# -- async -------------------------------------------------------------------
+# Reads run the same statements natively on the AsyncSession; writes go
+# through run_write_async, so they queue with every other write and their
+# ORM work stays off the event loop.
+
+async def create_leave_request_async(db: AsyncSession, leave_request: LeaveRequestCreate, employee_id: int):
+    return await run_write_async(db, create_leave_request, leave_request, employee_id)
+
+async def get_leave_requests_by_employee_async(db: AsyncSession, employee_id: int, skip: int = 0, limit: int = 100):
+    return [LeaveRow(*row) for row in await db.execute(_employee_leaves_stmt(employee_id, skip, limit))]
+
+async def get_leave_request_by_id_async(db: AsyncSession, leave_id: int):
+    return await db.get(LeaveRequest, leave_id)
+
+async def update_leave_request_status_async(db: AsyncSession, leave_id: int, leave_update: LeaveRequestUpdate, approved_by: int):
+    return await run_write_async(db, update_leave_request_status, leave_id, leave_update, approved_by)
+
+async def get_leave_balance_async(db: AsyncSession, employee_id: int):
+    balance = await db.scalar(_balance_stmt(employee_id))
+    if balance is None:
+        balance = await run_write_async(db, ensure_leave_balance, employee_id)
+    return _balance_response(balance, dict((await db.execute(_used_days_stmt(employee_id))).all()))
+
+async def get_blackout_periods_async(db: AsyncSession):
+    return [BlackoutRow(*row) for row in await db.execute(BLACKOUTS_STMT)]
+
+async def create_blackout_period_async(db: AsyncSession, blackout: BlackoutPeriodCreate):
+    return await run_write_async(db, create_blackout_period, blackout)
+
+async def delete_blackout_period_async(db: AsyncSession, period_id: int):
+    return await run_write_async(db, delete_blackout_period, period_id)
+
+async def get_all_leave_requests_enriched_async(db: AsyncSession, skip: int = 0, limit: int = 100):
+    return _enriched_rows(await db.execute(_enriched_stmt(skip=skip, limit=limit)))
+
+async def get_admin_dashboard_async(db: AsyncSession):
+    counts = [await db.scalar(stmt) for stmt in _dashboard_count_stmts(datetime.utcnow().date())]
+    return _dashboard(counts, await get_all_leave_requests_enriched_async(db), await get_blackout_periods_async(db))
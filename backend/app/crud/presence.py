@@ -0,0 +1,217 @@
+"""Per-employee day bitmaps for presence, lateness and approved leave.
+
+Each ``presence_bitmaps`` row holds one year for one employee and kind, one
+bit per day. "Days present in the last 30" is then a mask and a popcount
+over at most two rows per employee instead of a range scan of punches.
+
+Absence is not stored: a day is absent when it is a scheduled workday that
+has already ended and has neither the present nor the leave bit set, so it
+is computed from the other bitmaps at query time and never goes stale when
+a late punch or a leave approval arrives.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.attendance import DailyAttendance, PresenceBitmap
+from app.models.leave import LeaveRequest, LeaveStatus
+
+PRESENT = 'present'
+LATE = 'late'
+LEAVE = 'leave'
+
+YEAR_BYTES = 46  # 366 bits
+
+
+def _bit(day: date) -> int:
+    return day.timetuple().tm_yday - 1
+
+
+def _range_mask(first: int, last: int) -> int:
+    """Bits ``first..last`` inclusive."""
+    return ((1 << (last + 1)) - 1) ^ ((1 << first) - 1)
+
+
+@lru_cache(maxsize=64)
+def _workday_mask(year: int, weekdays: str) -> int:
+    scheduled = {int(d) for d in weekdays.split(',') if d.strip()}
+    mask = 0
+    day = date(year, 1, 1)
+    while day.year == year:
+        if day.weekday() in scheduled:
+            mask |= 1 << _bit(day)
+        day += timedelta(days=1)
+    return mask
+
+
+def _year_spans(start: date, end: date):
+    """``(year, mask)`` for each calendar year touched by the inclusive range."""
+    for year in range(start.year, end.year + 1):
+        first = _bit(max(start, date(year, 1, 1)))
+        last = _bit(min(end, date(year, 12, 31)))
+        yield year, _range_mask(first, last)
+
+
+def _load(db: Session, keys) -> Dict[tuple, PresenceBitmap]:
+    keys = list(keys)
+    if not keys:
+        return {}
+    rows = db.query(PresenceBitmap).filter(
+        tuple_(PresenceBitmap.employee_id, PresenceBitmap.kind, PresenceBitmap.year).in_(keys)
+    )
+    return {(r.employee_id, r.kind, r.year): r for r in rows}
+
+
+def _write(db: Session, rows: Dict[tuple, PresenceBitmap], key: tuple, value: int):
+    row = rows.get(key)
+    bits = value.to_bytes(YEAR_BYTES, 'little')
+    if row is None:
+        if value:
+            rows[key] = row = PresenceBitmap(employee_id=key[0], kind=key[1], year=key[2], bits=bits)
+            db.add(row)
+    elif row.bits != bits:
+        row.bits = bits
+
+
+def set_days(db: Session, changes: Dict[tuple, bool]):
+    """Apply ``{(employee_id, kind, day): on}`` bit changes. Does not commit."""
+    by_row = defaultdict(list)
+    for (emp, kind, day), on in changes.items():
+        by_row[(emp, kind, day.year)].append((_bit(day), on))
+    rows = _load(db, by_row)
+    for key, bits in by_row.items():
+        row = rows.get(key)
+        value = int.from_bytes(row.bits, 'little') if row is not None else 0
+        for bit, on in bits:
+            value = value | (1 << bit) if on else value & ~(1 << bit)
+        _write(db, rows, key, value)
+
+
+def apply_daily_summaries(db: Session, summaries: dict):
+    """Mirror daily_attendance changes (``{(employee_id, day): summary or None}``) into the bitmaps."""
+    changes = {}
+    for (emp, day), summary in summaries.items():
+        changes[(emp, PRESENT, day)] = bool(summary and summary['punch_count'])
+        changes[(emp, LATE, day)] = bool(summary and summary['minutes_late'])
+    set_days(db, changes)
+
+
+def _leave_days(leaves, start: date, end: date) -> set:
+    days = set()
+    for leave in leaves:
+        day = max(leave.start_date, start)
+        while day <= min(leave.end_date, end):
+            days.add(day)
+            day += timedelta(days=1)
+    return days
+
+
+def refresh_leave_days(db: Session, employee_id: int, start: date, end: date):
+    """Recompute leave bits for one employee over ``[start, end]`` after a leave changes status.
+
+    Overlapping approved leaves are re-read, so declining one request does
+    not clear days still covered by another. Commits.
+    """
+    leaves = db.query(LeaveRequest).filter(
+        LeaveRequest.employee_id == employee_id,
+        LeaveRequest.status == LeaveStatus.APPROVED,
+        LeaveRequest.start_date <= end,
+        LeaveRequest.end_date >= start,
+    ).all()
+    covered = _leave_days(leaves, start, end)
+    changes = {}
+    day = start
+    while day <= end:
+        changes[(str(employee_id), LEAVE, day)] = day in covered
+        day += timedelta(days=1)
+    set_days(db, changes)
+    db.commit()
+
+
+def rebuild_presence(db: Session, start: date, end: date) -> int:
+    """Regenerate every bitmap for days in ``[start, end)`` from daily_attendance and approved leaves.
+
+    Bits outside the range are kept. Returns the number of bitmap rows written.
+    """
+    if end <= start:
+        return 0
+    last = end - timedelta(days=1)
+    fresh = defaultdict(int)  # (emp, kind, year) -> bits inside the range
+    daily = db.query(DailyAttendance.employee_id, DailyAttendance.work_date,
+                     DailyAttendance.punch_count, DailyAttendance.minutes_late).filter(
+        DailyAttendance.work_date >= start, DailyAttendance.work_date < end)
+    for emp, day, punches, late in daily.yield_per(5000):
+        if punches:
+            fresh[(emp, PRESENT, day.year)] |= 1 << _bit(day)
+        if late:
+            fresh[(emp, LATE, day.year)] |= 1 << _bit(day)
+    leaves = db.query(LeaveRequest).filter(
+        LeaveRequest.status == LeaveStatus.APPROVED,
+        LeaveRequest.start_date <= last,
+        LeaveRequest.end_date >= start,
+    )
+    for leave in leaves:
+        for day in _leave_days([leave], start, last):
+            fresh[(str(leave.employee_id), LEAVE, day.year)] |= 1 << _bit(day)
+
+    spans = dict(_year_spans(start, last))
+    stale = db.query(PresenceBitmap).filter(PresenceBitmap.year.in_(list(spans)))
+    rows = {(r.employee_id, r.kind, r.year): r for r in stale}
+    written = 0
+    for key in set(rows) | set(fresh):
+        row = rows.get(key)
+        kept = int.from_bytes(row.bits, 'little') & ~spans[key[2]] if row is not None else 0
+        _write(db, rows, key, kept | fresh.get(key, 0))
+        written += 1
+    db.commit()
+    return written
+
+
+def _counts(bitmaps: dict, start: date, end: date, today: date) -> dict:
+    """Popcounts over ``[start, end]`` from ``{(kind, year): int}``; absence only counts finished days."""
+    past = dict(_year_spans(start, min(end, today - timedelta(days=1)))) if start < today else {}
+    present = late = absent = 0
+    for year, mask in _year_spans(start, end):
+        p = bitmaps.get((PRESENT, year), 0) & mask
+        present += p.bit_count()
+        late += (bitmaps.get((LATE, year), 0) & mask).bit_count()
+        if year in past:
+            missed = _workday_mask(year, settings.WORK_WEEKDAYS) & past[year] & ~p & ~bitmaps.get((LEAVE, year), 0)
+            absent += missed.bit_count()
+    return {'present': present, 'late': late, 'absent': absent}
+
+
+def presence_counts(db: Session, start: date, end: date, employee_ids: Optional[Iterable[str]] = None,
+                    today: Optional[date] = None) -> Dict[str, dict]:
+    """``{employee_id: {present, late, absent}}`` for the inclusive range, for employees with any bitmap.
+
+    ``employee_ids`` are attendance ids (as punched). Each is counted on its own;
+    use employee_presence to combine the ids of one Employee.
+    """
+    today = today or datetime.utcnow().date()
+    query = db.query(PresenceBitmap).filter(PresenceBitmap.year.between(start.year, end.year))
+    if employee_ids is not None:
+        query = query.filter(PresenceBitmap.employee_id.in_(list(employee_ids)))
+    bitmaps = defaultdict(dict)
+    for row in query:
+        bitmaps[row.employee_id][(row.kind, row.year)] = int.from_bytes(row.bits, 'little')
+    return {emp: _counts(maps, start, end, today) for emp, maps in bitmaps.items()}
+
+
+def employee_presence(db: Session, attendance_ids: List[str], start: date, end: date,
+                      today: Optional[date] = None) -> dict:
+    """Counts for one employee whose punches and leaves may be filed under several ids."""
+    today = today or datetime.utcnow().date()
+    merged = defaultdict(int)
+    rows = db.query(PresenceBitmap).filter(
+        PresenceBitmap.employee_id.in_(attendance_ids),
+        PresenceBitmap.year.between(start.year, end.year),
+    )
+    for row in rows:
+        merged[(row.kind, row.year)] |= int.from_bytes(row.bits, 'little')
+    return _counts(merged, start, end, today)
@@ -0,0 +1,230 @@
+"""Hour/day/week/month attendance aggregates per site, department and overall.
+
+Rollups are derived from daily_attendance rows, not raw punches. Whenever a
+daily row changes (a new punch, a late-synced punch, a rebuild) the old
+row's contribution is subtracted and the new one added, so a punch that
+arrives days late corrects every bucket it touches without rescanning.
+Increments are applied with an atomic upsert, so concurrent refreshes of
+different employees never lose each other's counts.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.attendance import AttendanceRollup, DailyAttendance
+from app.models.user import Employee
+
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+METRICS = ('days_present', 'days_late', 'minutes_late', 'worked_minutes', 'punches')
+
+
+def bucket_start(granularity: str, when) -> datetime:
+    if granularity == 'hour':
+        return when.replace(minute=0, second=0, microsecond=0)
+    day = when.date() if isinstance(when, datetime) else when
+    if granularity == 'week':
+        day -= timedelta(days=day.weekday())
+    elif granularity == 'month':
+        day = day.replace(day=1)
+    return datetime.combine(day, time.min)
+
+
+def bucket_end(granularity: str, start: datetime) -> datetime:
+    if granularity == 'hour':
+        return start + timedelta(hours=1)
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+def _contributions(day) -> Iterable[tuple]:
+    """``((granularity, bucket, dimension, value), metrics)`` pairs for one daily row (dict or ORM)."""
+    get = day.get if isinstance(day, dict) else lambda f: getattr(day, f)
+    metrics = (1, 1 if get('minutes_late') else 0, get('minutes_late') or 0,
+               get('worked_minutes') or 0, get('punch_count') or 0)
+    dims = (('site', get('first_location') or ''), ('department', get('department') or ''), ('all', ''))
+    first_in = get('first_in')
+    if first_in is not None and first_in.tzinfo is not None:
+        first_in = first_in.astimezone(timezone.utc).replace(tzinfo=None)
+    for granularity in GRANULARITIES:
+        if granularity == 'hour':
+            if first_in is None:
+                continue
+            bucket = bucket_start('hour', first_in)
+        else:
+            bucket = bucket_start(granularity, get('work_date'))
+        for dimension, value in dims:
+            yield (granularity, bucket, dimension, value), metrics
+
+
+def _accumulate(totals: dict, day, sign: int = 1):
+    for key, metrics in _contributions(day):
+        current = totals[key]
+        for i, m in enumerate(metrics):
+            current[i] += sign * m
+
+
+def _upsert(db: Session, deltas: Dict[tuple, list]):
+    rows = [
+        dict(zip(('granularity', 'bucket', 'dimension', 'value'), key), **dict(zip(METRICS, metrics)))
+        for key, metrics in deltas.items() if any(metrics)
+    ]
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(AttendanceRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['granularity', 'dimension', 'value', 'bucket'],
+        set_={m: getattr(AttendanceRollup, m) + getattr(stmt.excluded, m) for m in METRICS},
+    )
+    db.execute(stmt, rows)
+
+
+def apply_daily_changes(db: Session, old_rows: Iterable, new_rows: Iterable):
+    """Move rollups from the ``old_rows`` daily state to ``new_rows``. Does not commit."""
+    deltas = defaultdict(lambda: [0] * len(METRICS))
+    for row in old_rows:
+        _accumulate(deltas, row, -1)
+    for row in new_rows:
+        _accumulate(deltas, row, 1)
+    _upsert(db, deltas)
+
+
+def department_map(db: Session, employee_ids: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    """Department by attendance id; punches use either the numeric id or the employee code."""
+    query = db.query(Employee.id, Employee.employee_id, Employee.department)
+    if employee_ids is not None:
+        ids = set(employee_ids)
+        numeric = [int(i) for i in ids if i.isdigit()]
+        query = query.filter(Employee.id.in_(numeric) | Employee.employee_id.in_(ids))
+    departments = {}
+    for pk, code, department in query:
+        departments[str(pk)] = department
+        if code:
+            departments[code] = department
+    return departments
+
+
+def rebuild_rollups(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """Recompute every bucket overlapping ``[start, end)`` (everything by default) from daily_attendance.
+
+    Buckets are recomputed whole, so a week or month that straddles the
+    range is still correct. Returns the number of rollup rows written.
+    """
+    if start is None or end is None:
+        lo, hi = db.query(func.min(DailyAttendance.work_date), func.max(DailyAttendance.work_date)).one()
+        if lo is None:
+            db.execute(delete(AttendanceRollup))
+            db.commit()
+            return 0
+        start = start or lo
+        end = end or hi + timedelta(days=1)
+    first, last = datetime.combine(start, time.min), datetime.combine(end, time.min)
+    spans = {}
+    for g in ('day', 'week', 'month'):
+        spans[g] = (bucket_start(g, first), bucket_end(g, bucket_start(g, last - timedelta(days=1))))
+    spans['hour'] = spans['day']
+    read_lo = min(lo for lo, _ in spans.values())
+    read_hi = max(hi for _, hi in spans.values())
+
+    for g, (lo, hi) in spans.items():
+        db.execute(delete(AttendanceRollup).where(
+            AttendanceRollup.granularity == g, AttendanceRollup.bucket >= lo, AttendanceRollup.bucket < hi))
+
+    totals = defaultdict(lambda: [0] * len(METRICS))
+    daily = db.query(DailyAttendance).filter(
+        DailyAttendance.work_date >= read_lo.date(), DailyAttendance.work_date < read_hi.date())
+    for row in daily.yield_per(5000):
+        for key, metrics in _contributions(row):
+            lo, hi = spans[key[0]]
+            if lo <= key[1] < hi:
+                current = totals[key]
+                for i, m in enumerate(metrics):
+                    current[i] += m
+    _upsert(db, totals)
+    db.commit()
+    return len(totals)
+
+
+# -- queries -----------------------------------------------------------------
+
+def cover(start: date, end: date) -> List[tuple]:
+    """Fewest whole ``(granularity, bucket)`` pieces that tile ``[start, end)``: months, then weeks, then days."""
+    pieces = []
+    day = start
+    while day < end:
+        current = datetime.combine(day, time.min)
+        if day.day == 1 and bucket_end('month', current).date() <= end:
+            g = 'month'
+        elif day.weekday() == 0 and day + timedelta(days=7) <= end:
+            g = 'week'
+        else:
+            g = 'day'
+        pieces.append((g, current))
+        day = bucket_end(g, current).date()
+    return pieces
+
+
+def _filtered(db: Session, dimension: str, values: Optional[List[str]]):
+    query = db.query(AttendanceRollup).filter(AttendanceRollup.dimension == dimension)
+    if values:
+        query = query.filter(AttendanceRollup.value.in_(values))
+    return query
+
+
+def _as_dict(row) -> dict:
+    return {m: getattr(row, m) for m in METRICS}
+
+
+def get_series(db: Session, granularity: str, start: datetime, end: datetime,
+               dimension: str = 'all', values: Optional[List[str]] = None) -> List[dict]:
+    """Rollup rows of one granularity with ``start <= bucket < end``, oldest first."""
+    rows = _filtered(db, dimension, values).filter(
+        AttendanceRollup.granularity == granularity,
+        AttendanceRollup.bucket >= start,
+        AttendanceRollup.bucket < end,
+    ).order_by(AttendanceRollup.bucket, AttendanceRollup.value)
+    return [{'bucket': r.bucket, 'value': r.value, **_as_dict(r)} for r in rows]
+
+
+def get_totals(db: Session, start: date, end: date, dimension: str = 'all',
+               values: Optional[List[str]] = None) -> Dict[str, dict]:
+    """Totals per dimension value over ``[start, end)``, summed from the coarsest buckets that fit."""
+    pieces = cover(start, end)
+    by_granularity = defaultdict(list)
+    for g, bucket in pieces:
+        by_granularity[g].append(bucket)
+    totals = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+    for g, buckets in by_granularity.items():
+        rows = _filtered(db, dimension, values).filter(
+            AttendanceRollup.granularity == g, AttendanceRollup.bucket.in_(buckets))
+        for r in rows:
+            current = totals[r.value]
+            for m in METRICS:
+                current[m] += getattr(r, m)
+    if dimension in ('department', 'all'):
+        _add_attendance_rate(db, totals, start, end, dimension)
+    return dict(totals)
+
+
+def _add_attendance_rate(db: Session, totals: dict, start: date, end: date, dimension: str):
+    """days_present over scheduled employee-workdays; sites have no headcount, so they get none."""
+    scheduled = {int(d) for d in settings.WORK_WEEKDAYS.split(',') if d.strip()}
+    workdays = sum(1 for i in range((end - start).days) if (start + timedelta(days=i)).weekday() in scheduled)
+    if dimension == 'all':
+        headcount = {'': db.query(func.count(Employee.id)).scalar()}
+    else:
+        headcount = dict(db.query(Employee.department, func.count(Employee.id)).group_by(Employee.department))
+    for value, current in totals.items():
+        expected = headcount.get(value, 0) * workdays
+        current['attendance_rate'] = round(current['days_present'] / expected, 4) if expected else None
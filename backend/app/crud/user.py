@@ -1,7 +1,12 @@
+from typing import Dict, List, Tuple
+from sqlalchemy import insert, literal, select, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.models.user import User, Employee
 from app.schemas.user import UserCreate
-from app.core.security import get_password_hash, verify_password
+from app.core.database import run_write, run_write_async
+from app.core.hashing import check_password, check_password_async, hash_password, hash_password_async
+from app.core.security import publish_token_version
 
 def get_user_by_username(db: Session, username: str):
     return db.query(User).filter(User.username == username).first()
@@ -9,20 +14,8 @@ def get_user_by_username(db: Session, username: str):
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
-def create_user(db: Session, user: UserCreate):
-    # Check if username already exists
-    db_user = get_user_by_username(db, username=user.username)
-    if db_user:
-        raise ValueError("Username already registered")
-    
-    # Check if email already exists  
-    db_user_email = get_user_by_email(db, email=user.email)
-    if db_user_email:
-        raise ValueError("Email already registered")
-    
-    hashed_password = get_password_hash(user.password)
-    
-    # Create user
+def insert_user(db: Session, user: UserCreate, hashed_password: str) -> User:
+    """Insert the user and their employee record in one transaction; returns the user with ``employee`` loaded."""
     db_user = User(
         username=user.username,
         email=user.email,
@@ -30,31 +23,150 @@ def create_user(db: Session, user: UserCreate):
         role=user.role
     )
     db.add(db_user)
-    db.commit()  # Changed from flush to commit
-    db.refresh(db_user)
-    
-    # Generate employee_id
-    employee_id = f"EMP-{db_user.id:04d}"
-    
-    # Create employee record
-    db_employee = Employee(
+    db.flush()  # assigns db_user.id for the employee code
+
+    db_user.employee = Employee(
         user_id=db_user.id,
-        employee_id=employee_id,
+        employee_id=f"EMP-{db_user.id:04d}",
         first_name=user.first_name,
         last_name=user.last_name,
         email=user.email,
         department=user.department,
         position="Employee" if user.role == "employee" else "Manager"
     )
-    db.add(db_employee)
     db.commit()
-    
     return db_user
 
+def create_user(db: Session, user: UserCreate):
+    # Check if username already exists
+    db_user = get_user_by_username(db, username=user.username)
+    if db_user:
+        raise ValueError("Username already registered")
+    
+    # Check if email already exists  
+    db_user_email = get_user_by_email(db, email=user.email)
+    if db_user_email:
+        raise ValueError("Email already registered")
+    
+    hashed_password = hash_password(user.password)
+    return run_write(db, insert_user, user, hashed_password)
+
+def taken_identities(db: Session, usernames, emails) -> Tuple[set, set]:
+    """Which of ``usernames`` and ``emails`` (users' or employees') are already registered, in one query."""
+    stmt = union_all(
+        select(literal("username"), User.username).where(User.username.in_(usernames)),
+        select(literal("email"), User.email).where(User.email.in_(emails)),
+        select(literal("email"), Employee.email).where(Employee.email.in_(emails)),
+    )
+    taken = {"username": set(), "email": set()}
+    for kind, value in db.execute(stmt):
+        taken[kind].add(value)
+    return taken["username"], taken["email"]
+
+def insert_users_chunk(db: Session, rows: List[dict]) -> Dict[str, Tuple[int, str]]:
+    """Insert users and their employee records in one transaction; ``{username: (user id, employee code)}``.
+
+    Each row has the ``UserCreate`` fields with ``hashed_password`` instead of ``password``.
+    """
+    ids = dict(db.execute(
+        insert(User).returning(User.username, User.id),
+        [{"username": r["username"], "email": r["email"], "hashed_password": r["hashed_password"],
+          "role": r["role"]} for r in rows],
+    ).all())
+    codes = {r["username"]: f"EMP-{ids[r['username']]:04d}" for r in rows}
+    db.execute(insert(Employee), [
+        {
+            "user_id": ids[r["username"]],
+            "employee_id": codes[r["username"]],
+            "first_name": r["first_name"],
+            "last_name": r["last_name"],
+            "email": r["email"],
+            "department": r["department"],
+            "position": "Employee" if r["role"] == "employee" else "Manager",
+        }
+        for r in rows
+    ])
+    db.commit()
+    return {username: (ids[username], codes[username]) for username in ids}
+
+def get_token_version(db: Session, user_id: int):
+    return db.query(User.token_version).filter(User.id == user_id).scalar()
+
+def revoke_tokens(db: Session, user_id: int):
+    """Invalidate every access token issued to the user so far; returns the new version (None if no such user)."""
+    version = db.execute(
+        update(User).where(User.id == user_id)
+        .values(token_version=User.token_version + 1)
+        .returning(User.token_version)
+    ).scalar()
+    db.commit()
+    if version is not None:
+        publish_token_version(user_id, version)
+    return version
+
+def _store_rehash(db: Session, user_id: int, old_hash: str, new_hash: str):
+    # only if the password was not changed meanwhile
+    db.execute(
+        update(User).where(User.id == user_id, User.hashed_password == old_hash)
+        .values(hashed_password=new_hash)
+    )
+    db.commit()
+
 def authenticate_user(db: Session, username: str, password: str):
     user = get_user_by_username(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = check_password(password, user.hashed_password)
+    if not valid:
+        return False
+    if new_hash:
+        run_write(db, _store_rehash, user.id, user.hashed_password, new_hash)
+    return user
+
+
+# -- async -------------------------------------------------------------------
+# Password hashing is CPU-bound, so it runs on the hashing pool
+# (app.core.hashing) rather than on the event loop.
+
+async def get_user_by_username_async(db: AsyncSession, username: str):
+    return await db.scalar(select(User).where(User.username == username))
+
+
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    return await db.scalar(select(User).where(User.email == email))
+
+
+async def get_token_version_async(db: AsyncSession, user_id: int):
+    return await db.scalar(select(User.token_version).where(User.id == user_id))
+
+
+async def revoke_tokens_async(db: AsyncSession, user_id: int):
+    return await run_write_async(db, revoke_tokens, user_id)
+
+
+async def get_employee_by_user_id_async(db: AsyncSession, user_id: int):
+    return await db.scalar(select(Employee).where(Employee.user_id == user_id))
+
+
+async def create_user_async(db: AsyncSession, user: UserCreate):
+    if await get_user_by_username_async(db, user.username):
+        raise ValueError("Username already registered")
+    if await get_user_by_email_async(db, user.email):
+        raise ValueError("Email already registered")
+
+    hashed_password = await hash_password_async(user.password)
+    # UserResponse nests the employee; insert_user returns it loaded
+    return await run_write_async(db, insert_user, user, hashed_password)
+
+
+async def authenticate_user_async(db: AsyncSession, username: str, password: str):
+    user = await get_user_by_username_async(db, username)
+    if not user:
+        return False
+    valid, new_hash = await check_password_async(password, user.hashed_password)
+    if not valid:
         return False
-    return user
\ No newline at end of file
+    if new_hash:
+        await run_write_async(db, _store_rehash, user.id, user.hashed_password, new_hash)
+    await db.refresh(user, ["employee"])
+    return user
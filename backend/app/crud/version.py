@@ -0,0 +1,60 @@
+"""Data versions for conditional GET.
+
+``bump_version`` runs inside the writer's transaction, so the new version
+commits (and replicates) together with the rows it describes. Reading it on
+the session that serves a response therefore gives a version consistent
+with the data that session sees, replica lag included.
+
+High-volume tables are versioned by their largest id instead, so their
+writers never queue on one counter row.
+"""
+from typing import Dict, Iterable
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.attendance import Attendance
+from app.models.version import DataVersion
+
+_BUMP = text(
+    "INSERT INTO data_versions (name, version) VALUES (:name, 1) "
+    "ON CONFLICT (name) DO UPDATE SET version = data_versions.version + 1"
+)
+
+
+def bump_version(db: Session, name: str):
+    """Count a change to ``name``; takes effect when the caller commits."""
+    db.execute(_BUMP, {"name": name})
+
+
+def _versions_stmt(names):
+    return select(DataVersion.name, DataVersion.version).where(DataVersion.name.in_(names))
+
+
+def _versions(names, rows) -> Dict[str, int]:
+    versions = dict.fromkeys(names, 0)
+    versions.update(rows)
+    return versions
+
+
+# punches are only ever added (archiving moves rows without changing what the logs show)
+_LATEST_ATTENDANCE_ID = select(func.max(Attendance.id))
+
+
+def get_versions(db: Session, names: Iterable[str]) -> Dict[str, int]:
+    names = list(names)
+    return _versions(names, db.execute(_versions_stmt(names)).all())
+
+
+def latest_attendance_id(db: Session) -> int:
+    return db.scalar(_LATEST_ATTENDANCE_ID) or 0
+
+
+async def get_versions_async(db: AsyncSession, names: Iterable[str]) -> Dict[str, int]:
+    names = list(names)
+    return _versions(names, (await db.execute(_versions_stmt(names))).all())
+
+
+async def latest_attendance_id_async(db: AsyncSession) -> int:
+    return await db.scalar(_LATEST_ATTENDANCE_ID) or 0
@@ -1,42 +1,190 @@
-from fastapi import Depends, HTTPException, status
+"""Authentication dependencies.
+
+Access tokens carry the caller's user id, role, employee id/code and the
+user's ``token_version`` as signed claims, so most requests are served from
+the token alone: the only lookup is the current ``token_version`` of the
+user, kept in the shared state store for ``AUTH_USER_CACHE_SECONDS``.
+``revoke_tokens`` bumps the version, which retires every token issued
+before it; call it whenever a claim stops being true (role change,
+password reset, logout everywhere).
+
+Tokens issued before the claims existed (``sub`` only) are still accepted
+and resolved from the database until they expire.
+"""
+from dataclasses import dataclass
+from typing import Optional, Union
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.database import get_async_db, get_db
 from app.core.config import settings
+from app.core.security import cached_token_version, remember_token_version
+from app.crud.user import (
+    get_employee_by_user_id_async, get_token_version, get_token_version_async,
+    get_user_by_username_async,
+)
 from app.models.user import User, Employee  # Make sure this import is correct
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
-    credentials_exception = HTTPException(
+
+@dataclass(frozen=True)
+class TokenUser:
+    """The caller as described by the token's claims; has the ``id``, ``username``
+    and ``role`` routes read from ``User``."""
+    id: int
+    username: str
+    role: str
+    employee_id: Optional[int] = None  # employees.id
+    employee_code: Optional[str] = None  # employees.employee_id ("EMP-0001")
+
+
+@dataclass(frozen=True)
+class TokenEmployee:
+    """The fields of ``Employee`` that routes read from the current employee."""
+    id: int
+    user_id: int
+    employee_id: str
+
+
+def token_claims(user: User) -> dict:
+    """Claims for a new access token; ``user.employee`` must be loaded."""
+    employee = user.employee
+    return {
+        "sub": user.username,
+        "uid": user.id,
+        "role": user.role,
+        "eid": employee.id if employee else None,
+        "ecode": employee.employee_id if employee else None,
+        "ver": user.token_version or 0,
+    }
+
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+
+def _decode(token: str) -> dict:
     try:
         payload = jwt.decode(
-            credentials.credentials, 
-            settings.SECRET_KEY, 
+            token,
+            settings.SECRET_KEY,
             algorithms=[settings.ALGORITHM]
         )
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.username == username).first()
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+
+def _has_claims(payload: dict) -> bool:
+    return isinstance(payload.get("uid"), int) and isinstance(payload.get("ver"), int)
+
+
+def _verified(payload: dict, version: Optional[int]) -> TokenUser:
+    if version is None or version != payload["ver"]:
+        raise _credentials_exception()
+    return TokenUser(
+        id=payload["uid"],
+        username=payload["sub"],
+        role=payload.get("role") or "employee",
+        employee_id=payload.get("eid"),
+        employee_code=payload.get("ecode"),
+    )
+
+
+def _user_from_token(token: str, db: Session) -> Union[TokenUser, User]:
+    payload = _decode(token)
+    if not _has_claims(payload):
+        user = db.query(User).filter(User.username == payload["sub"]).first()
+        if user is None:
+            raise _credentials_exception()
+        return user
+    version = cached_token_version(payload["uid"])
+    if version is None:
+        version = get_token_version(db, payload["uid"])
+        remember_token_version(payload["uid"], version)
+    return _verified(payload, version)
+
+
+async def _user_from_token_async(token: str, db: AsyncSession) -> Union[TokenUser, User]:
+    payload = _decode(token)
+    if not _has_claims(payload):
+        user = await get_user_by_username_async(db, payload["sub"])
+        if user is None:
+            raise _credentials_exception()
+        return user
+    version = cached_token_version(payload["uid"])
+    if version is None:
+        version = await get_token_version_async(db, payload["uid"])
+        remember_token_version(payload["uid"], version)
+    return _verified(payload, version)
+
+
+def _token_employee(user: TokenUser) -> TokenEmployee:
+    if user.employee_id is None:
+        raise HTTPException(status_code=404, detail="Employee profile not found")
+    return TokenEmployee(id=user.employee_id, user_id=user.id, employee_id=user.employee_code)
+
+
+# -- dependencies ------------------------------------------------------------
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+):
+    return _user_from_token(credentials.credentials, db)
+
+def get_current_user_or_query_token(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    access_token: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+):
+    # EventSource cannot set headers, so streaming endpoints also accept ?access_token=
+    token = credentials.credentials if credentials else access_token
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    return _user_from_token(token, db)
+
+def get_current_user_record(db: Session = Depends(get_db), current_user=Depends(get_current_user)) -> User:
+    """The caller's ``users`` row, for routes that return or change it."""
+    if isinstance(current_user, User):
+        return current_user
+    user = db.query(User).filter(User.id == current_user.id).first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     return user
 
-def get_current_employee(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_current_employee(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    if isinstance(current_user, TokenUser):
+        return _token_employee(current_user)
     employee = db.query(Employee).filter(Employee.user_id == current_user.id).first()
     if not employee:
         raise HTTPException(status_code=404, detail="Employee profile not found")
-    return employee
\ No newline at end of file
+    return employee
+
+# Async variants for routes on the AsyncSession path
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await _user_from_token_async(credentials.credentials, db)
+
+async def get_current_employee_async(
+    db: AsyncSession = Depends(get_async_db),
+    current_user=Depends(get_current_user_async)
+):
+    if isinstance(current_user, TokenUser):
+        return _token_employee(current_user)
+    employee = await get_employee_by_user_id_async(db, current_user.id)
+    if not employee:
+        raise HTTPException(status_code=404, detail="Employee profile not found")
+    return employee
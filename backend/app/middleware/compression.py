@@ -0,0 +1,185 @@
+"""Response compression: brotli when the client accepts it and the ``brotli``
+package is installed, gzip otherwise.
+
+Text and JSON bodies of at least ``COMPRESSION_MIN_BYTES`` are compressed;
+streamed ones (NDJSON, the CSV of an export being generated) are compressed
+chunk by chunk whatever their size. Left alone:
+
+* the live feed (``text/event-stream``): a compressor holds back small
+  writes, and each event has to reach the client when it is sent;
+* downloads (``Content-Disposition: attachment``) and partial responses:
+  exports offer their own gzip format, and their byte ranges refer to the
+  stored file;
+* anything already encoded, and binary types such as Parquet.
+
+A strong ETag gets the encoding appended (``"tag-gzip"``), since each
+encoding is a different representation; ``app.core.conditional`` strips the
+suffix when it compares tags.
+"""
+import gzip
+import zlib
+from functools import lru_cache
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.core.config import settings
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/x-ndjson", "application/ndjson", "application/jsonl",
+    "application/javascript", "application/xml",
+)
+# compress bodies above this size on a worker thread instead of the event loop
+THREAD_BYTES = 256 * 1024
+
+
+@lru_cache(maxsize=1)
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def _negotiate(accept_encoding: str):
+    """``"br"``, ``"gzip"`` or None from an Accept-Encoding header (q-values honoured, ties go to br)."""
+    offered = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip()] = q
+    wildcard = offered.get("*", 0.0)
+    best, best_q = None, 0.0
+    for name in ("gzip", "br") if _brotli() is not None else ("gzip",):
+        q = offered.get(name, wildcard)
+        if q > 0 and q >= best_q:
+            best, best_q = name, q
+    return best
+
+
+def _compressible(status: int, headers: Headers) -> bool:
+    if status < 200 or status in (204, 206, 304):
+        return False
+    if "content-encoding" in headers or "content-range" in headers:
+        return False
+    if headers.get("content-disposition", "").lower().startswith("attachment"):
+        return False
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "text/event-stream":
+        return False
+    return content_type.startswith("text/") or content_type in COMPRESSIBLE_TYPES or content_type.endswith("+json")
+
+
+class _GzipStream:
+    def __init__(self):
+        self._z = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        return self._z.compress(data)
+
+    def finish(self) -> bytes:
+        return self._z.flush()
+
+
+class _BrotliStream:
+    def __init__(self):
+        self._c = _brotli().Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.process(data)
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+
+def _compress(encoding: str, body: bytes) -> bytes:
+    if encoding == "br":
+        return _brotli().compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def _mark_variant(headers: MutableHeaders, encoding: str):
+    vary = headers.get("vary")
+    headers["vary"] = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+    etag = headers.get("etag")
+    if etag and etag.startswith('"') and etag.endswith('"'):
+        headers["etag"] = f'{etag[:-1]}-{encoding}"'
+
+
+def _encoded_headers(start: dict, encoding: str, length=None) -> dict:
+    headers = MutableHeaders(raw=list(start.get("headers", [])))
+    headers["content-encoding"] = encoding
+    if length is None:
+        if "content-length" in headers:
+            del headers["content-length"]
+    else:
+        headers["content-length"] = str(length)
+    _mark_variant(headers, encoding)
+    return {**start, "headers": headers.raw}
+
+
+def _not_modified_headers(start: dict, encoding: str) -> dict:
+    # a 304 names the variant the client would have been sent
+    headers = MutableHeaders(raw=list(start.get("headers", [])))
+    if "etag" in headers and "content-encoding" not in headers:
+        _mark_variant(headers, encoding)
+    return {**start, "headers": headers.raw}
+
+
+class CompressionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or settings.COMPRESSION_MIN_BYTES <= 0:
+            return await self.app(scope, receive, send)
+        encoding = _negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None  # held back until the first body chunk shows whether to compress
+        stream = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, stream, passthrough
+            if passthrough or message["type"] not in ("http.response.start", "http.response.body"):
+                return await send(message)
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            body, more = message.get("body", b""), message.get("more_body", False)
+
+            if stream is not None:
+                data = stream.compress(body) + (b"" if more else stream.finish())
+                if data or not more:
+                    await send({"type": "http.response.body", "body": data, "more_body": more})
+                return
+
+            if not _compressible(start["status"], Headers(raw=start.get("headers", []))) or (
+                not more and len(body) < settings.COMPRESSION_MIN_BYTES
+            ):
+                passthrough = True
+                await send(_not_modified_headers(start, encoding) if start["status"] == 304 else start)
+                return await send(message)
+
+            if not more:
+                data = await run_in_threadpool(_compress, encoding, body) if len(body) > THREAD_BYTES \
+                    else _compress(encoding, body)
+                await send(_encoded_headers(start, encoding, len(data)))
+                return await send({"type": "http.response.body", "body": data})
+
+            stream = _BrotliStream() if encoding == "br" else _GzipStream()
+            await send(_encoded_headers(start, encoding))
+            data = stream.compress(body)
+            if data:
+                await send({"type": "http.response.body", "body": data, "more_body": True})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,32 @@
+"""Request latency and in-flight metrics, labelled by route template and status."""
+import time
+
+from app.core import metrics
+from app.middleware.routes import match_template
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        method = scope["method"]
+        route = match_template(scope)
+        status = 500  # if the app raises before responding
+        in_flight = metrics.REQUESTS_IN_FLIGHT.labels(method, route)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            metrics.REQUEST_LATENCY.labels(method, route, str(status)).observe(time.perf_counter() - started)
@@ -0,0 +1,81 @@
+"""Profile a single request on demand.
+
+An admin adds ``X-Profile: 1`` (or ``?_profile=1``) to any request; it is
+served as usual while ``RequestProfile`` samples its endpoint, and the
+response carries ``X-Profile-Id`` naming the saved flamegraph input
+(``GET /api/v1/admin/profiles/{id}``). The flag is ignored for everyone
+else.
+"""
+import logging
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.database import SessionLocal
+from app.middleware.routes import route_template
+from app.services import profiler
+
+logger = logging.getLogger(__name__)
+
+
+def _requested(scope) -> bool:
+    for name, value in scope.get("headers", ()):
+        if name == b"x-profile":
+            return value not in (b"", b"0")
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("_profile", ["0"])[0] not in ("", "0")
+
+
+def _bearer(scope):
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                return token
+    return None
+
+
+def _is_admin(token: str) -> bool:
+    from app.dependencies.auth import _user_from_token
+
+    db = SessionLocal()
+    try:
+        return _user_from_token(token, db).role == "admin"
+    except HTTPException:
+        return False
+    finally:
+        db.close()
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+        profiler.start_global_sampler()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        profiler.register_routes(scope.get("app"))
+        token = _bearer(scope) if _requested(scope) else None
+        if token is None or not await run_in_threadpool(_is_admin, token):
+            return await self.app(scope, receive, send)
+
+        # routing records the endpoint in the scope; the sampler picks it up from there
+        profile = profiler.RequestProfile(scope)
+        profile.start()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile.id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            route = route_template(scope) or "unmatched"
+            path = await run_in_threadpool(profile.finish, route)
+            if path is None:
+                logger.info("Profile %s of %s caught no samples", profile.id, route)
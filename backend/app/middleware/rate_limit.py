@@ -0,0 +1,256 @@
+"""Token-bucket rate limiting.
+
+Every request takes a token from two buckets:
+
+* its caller's bucket for the matching rule. The caller is the kiosk named
+  by ``RATE_LIMIT_KIOSK_HEADER``, else the user of a valid access token,
+  else the client IP. Endpoints listed in ``RATE_LIMITS`` have their own
+  rate and buckets; all other requests share ``RATE_LIMIT_DEFAULT``;
+* the client IP's bucket at ``RATE_LIMIT_PER_IP``, so rotating kiosk ids or
+  accounts from one address does not lift the limit.
+
+A bucket holds up to ``limit`` tokens and refills at ``limit`` per period:
+bursts up to the limit pass, sustained overuse gets a 429 with
+``Retry-After``. Responses carry ``RateLimit-Limit``, ``RateLimit-Remaining``
+and ``RateLimit-Reset`` (seconds until full) for the tighter of the two
+buckets.
+
+A bucket is one ``[tokens, updated]`` pair. In-process buckets are dropped
+once idle long enough to have refilled, since a new bucket starts full
+anyway, and the least recently used go past ``RATE_LIMIT_MAX_KEYS``. With
+``RATE_LIMIT_URL`` the pairs live in a kvstore shared by the workers,
+updated atomically and expiring after one period; those updates block, so
+they run in the threadpool. If that store fails, requests are let through.
+
+Behind a reverse proxy the client IP is the proxy's unless uvicorn runs
+with ``--proxy-headers``.
+"""
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from jose import JWTError, jwt
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.kvstore import create_store
+from app.core.metrics import RATE_LIMITED
+from app.middleware.routes import match_template
+
+logger = logging.getLogger(__name__)
+
+UNITS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+@dataclass(frozen=True)
+class Rate:
+    limit: int
+    period: float  # seconds
+
+    @property
+    def per_second(self) -> float:
+        return self.limit / self.period
+
+
+def parse_rate(text: str) -> Rate:
+    """``"60/minute"`` -> ``Rate(60, 60)``; units are second, minute, hour and day."""
+    count, _, unit = text.partition("/")
+    unit = unit.strip().lower()
+    unit = unit[:-1] if unit.endswith("s") else unit
+    try:
+        rate = Rate(int(count), UNITS[unit])
+    except (KeyError, ValueError):
+        raise ValueError(f"Bad rate {text!r}; expected e.g. '60/minute'")
+    if rate.limit < 1:
+        raise ValueError(f"Bad rate {text!r}; the limit must be at least 1")
+    return rate
+
+
+def _take(state, rate: Rate, now: float):
+    """``([tokens, updated], allowed)`` after refilling ``state`` (None: new bucket) and taking one token."""
+    if state is None:
+        tokens = float(rate.limit)
+    else:
+        tokens = min(float(rate.limit), state[0] + max(0.0, now - state[1]) * rate.per_second)
+    if tokens >= 1:
+        return [tokens - 1, now], True
+    return [tokens, now], False
+
+
+class LocalBuckets:
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._entries = OrderedDict()  # key -> (state, time the bucket is full again), least recent first
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: Rate):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            state, allowed = _take(entry[0] if entry else None, rate, now)
+            self._entries[key] = (state, now + (rate.limit - state[0]) / rate.per_second)
+            while self._entries:
+                full_at = next(iter(self._entries.values()))[1]
+                if full_at > now and len(self._entries) <= self.max_keys:
+                    break
+                self._entries.popitem(last=False)
+        return state, allowed
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedBuckets:
+    def __init__(self, store):
+        self._store = store
+
+    def take(self, key: str, rate: Rate):
+        result = []
+
+        def step(current):
+            state, allowed = _take(current, rate, time.time())
+            result.append((state, allowed))  # the store may retry; the last call is the one stored
+            return state
+
+        # a bucket left alone for one period is full, which is what a missing key means
+        self._store.update(key, step, ttl=rate.period)
+        return result[-1]
+
+
+@lru_cache(maxsize=4096)
+def _token_claims(token: str) -> Optional[tuple]:
+    """``(user, exp)`` of a valid token; cached, so the expiry is checked by the caller."""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    uid = payload.get("uid")
+    return (str(uid) if uid is not None else payload.get("sub")), payload.get("exp")
+
+
+def _token_user(token: str) -> Optional[str]:
+    claims = _token_claims(token)
+    if claims is None:
+        return None
+    user, expires = claims
+    if isinstance(expires, (int, float)) and expires <= time.time():
+        return None
+    return user
+
+
+def _headers(rate: Rate, state) -> list:
+    tokens = state[0]
+    return [
+        (b"ratelimit-limit", str(rate.limit).encode()),
+        (b"ratelimit-remaining", str(int(tokens)).encode()),
+        (b"ratelimit-reset", str(math.ceil((rate.limit - tokens) / rate.per_second)).encode()),
+    ]
+
+
+class RateLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.default = parse_rate(settings.RATE_LIMIT_DEFAULT)
+        self.per_ip = parse_rate(settings.RATE_LIMIT_PER_IP) if settings.RATE_LIMIT_PER_IP else None
+        self.rules = {}
+        for endpoint, rate in json.loads(settings.RATE_LIMITS or "{}").items():
+            method, _, path = endpoint.strip().partition(" ")
+            self.rules[f"{method.upper()} {path.strip()}"] = parse_rate(rate)
+        self.kiosk_header = settings.RATE_LIMIT_KIOSK_HEADER.lower().encode("latin-1")
+        self._buckets = None
+        self._setup_lock = threading.Lock()
+
+    def _bucket_store(self):
+        if self._buckets is None:
+            with self._setup_lock:
+                if self._buckets is None:
+                    self._buckets = SharedBuckets(create_store(settings.RATE_LIMIT_URL)) if settings.RATE_LIMIT_URL \
+                        else LocalBuckets(settings.RATE_LIMIT_MAX_KEYS)
+        return self._buckets
+
+    def _caller(self, scope, ip: str):
+        kiosk = authorization = None
+        for name, value in scope["headers"]:
+            if name == self.kiosk_header:
+                kiosk = value
+            elif name == b"authorization":
+                authorization = value
+        if kiosk:
+            return "kiosk", kiosk.decode("latin-1")[:64]
+        if authorization and authorization[:7].lower() == b"bearer ":
+            user = _token_user(authorization[7:].decode("latin-1"))
+            if user:
+                return "user", user
+        return "ip", ip
+
+    def _take_all(self, checks) -> list:
+        """``(scope, rate, state, allowed)`` per bucket taken from, up to the first that refuses."""
+        buckets = self._bucket_store()
+        taken = []
+        for bucket_scope, key, bucket_rate in checks:
+            state, allowed = buckets.take(key, bucket_rate)
+            taken.append((bucket_scope, bucket_rate, state, allowed))
+            if not allowed:
+                break
+        return taken
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.RATE_LIMIT_ENABLED or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+
+        rule = f'{scope["method"]} {match_template(scope)}'
+        rate = self.rules.get(rule)
+        if rate is None:
+            rule, rate = "default", self.default
+        ip = scope["client"][0] if scope.get("client") else "unknown"
+        caller, ident = self._caller(scope, ip)
+        checks = [(caller, f"ratelimit:{rule}:{caller}:{ident}", rate)]
+        if self.per_ip is not None:
+            checks.append(("ip", f"ratelimit:ip:{ip}", self.per_ip))
+
+        try:
+            if settings.RATE_LIMIT_URL:
+                taken = await run_in_threadpool(self._take_all, checks)
+            else:
+                taken = self._take_all(checks)
+        except Exception:
+            logger.exception("rate limiter store unavailable; request let through")
+            return await self.app(scope, receive, send)
+
+        tightest = None
+        for bucket_scope, bucket_rate, state, allowed in taken:
+            if not allowed:
+                RATE_LIMITED.labels(rule, bucket_scope).inc()
+                return await self._refuse(send, bucket_rate, state)
+            if tightest is None or state[0] / bucket_rate.limit < tightest[1][0] / tightest[0].limit:
+                tightest = (bucket_rate, state)
+
+        extra = _headers(*tightest)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), *extra]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+    async def _refuse(self, send, rate: Rate, state):
+        body = b'{"detail":"Too many requests"}'
+        retry_after = max(1, math.ceil((1 - state[0]) / rate.per_second))
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+                *_headers(rate, state),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,51 @@
+"""Route templates for per-route statistics.
+
+Keying statistics by the raw path would give every leave id its own series.
+Once routing has run, the request scope carries the matched endpoint, and
+the endpoint leads back to the path template it was registered under.
+"""
+from typing import Optional
+
+from starlette.routing import Match
+
+_templates = {}  # endpoint -> path template
+
+
+def route_template(scope) -> Optional[str]:
+    """``/api/v1/leaves/admin/{leave_id}/status`` for a routed request; None if nothing matched."""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return None
+    template = _templates.get(endpoint)
+    if template is None:
+        template = "unmatched"
+        app = scope.get("app")
+        for route in getattr(getattr(app, "router", None), "routes", ()):
+            if getattr(route, "endpoint", None) is endpoint:
+                template = route.path
+                break
+        _templates[endpoint] = template
+    return template
+
+
+def match_template(scope) -> str:
+    """Path template the request will be routed to, worked out before routing runs.
+
+    Requests that match nothing (scanners, typos) share the ``unmatched``
+    label so they cannot create unbounded label values. The result is kept in
+    the scope for the other middlewares.
+    """
+    template = scope.get("route_template")
+    if template is not None:
+        return template
+    partial = None
+    for route in getattr(getattr(scope.get("app"), "router", None), "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            template = route.path
+            break
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    template = template or partial or "unmatched"
+    scope["route_template"] = template
+    return template
@@ -0,0 +1,172 @@
+"""Per-request SQL statistics and N+1 detection.
+
+``SQLStatsMiddleware`` opens a ``RequestSQL`` record for each HTTP request;
+engine-wide ``before/after_cursor_execute`` listeners add every statement
+run while it is active. The record lives in a context variable, which the
+threadpool, the async session and the write queue all carry along, so sync
+routes, async routes and queued writes are all counted.
+
+Responses carry ``X-DB-Query-Count``, ``X-DB-Time-Ms`` and a
+``Server-Timing`` ``db`` entry. Totals per route template are kept for the
+metrics endpoint. When one request runs the same statement shape more than
+``SQL_N_PLUS_ONE_THRESHOLD`` times, a warning names the route and the
+application line that issued the query.
+"""
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from collections import Counter, defaultdict
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core import metrics
+from app.core.config import settings
+from app.middleware.routes import route_template
+
+logger = logging.getLogger(__name__)
+
+_current: contextvars.ContextVar = contextvars.ContextVar("request_sql", default=None)
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+# "IN (?, ?, ?)" and "VALUES (?, ?), (?, ?)" differ only in how many rows they bind
+_PARAM = r"(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)"
+_PLACEHOLDERS = re.compile(rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})*\s*\)")
+_ROWS = re.compile(r"(\(\?\.\.\.\))(?:\s*,\s*\(\?\.\.\.\))+")
+_SPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    shape = _PLACEHOLDERS.sub("(?...)", statement)
+    shape = _ROWS.sub(r"\1", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+
+def _call_site() -> str:
+    """Innermost application frame outside this module: the line that issued the query."""
+    for frame in reversed(traceback.extract_stack()):
+        path = os.path.abspath(frame.filename)
+        if path.startswith(_APP_DIR) and path != _THIS_FILE:
+            return f"{os.path.relpath(path, os.path.dirname(_APP_DIR))}:{frame.lineno} in {frame.name}"
+    return "unknown"
+
+
+class RequestSQL:
+    __slots__ = ("queries", "seconds", "shapes", "flagged", "_lock")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+        self.flagged = []  # (shape, call site) past the N+1 threshold
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, seconds: float) -> Optional[str]:
+        """Count one statement; returns its shape the first time it crosses the threshold."""
+        shape = statement_shape(statement)
+        with self._lock:
+            self.queries += 1
+            self.seconds += seconds
+            self.shapes[shape] += 1
+            repeated = self.shapes[shape] == settings.SQL_N_PLUS_ONE_THRESHOLD + 1
+        return shape if repeated else None
+
+
+class _RouteTotals:
+    __slots__ = ("requests", "queries", "seconds", "max_queries", "n_plus_one")
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.seconds = 0.0
+        self.max_queries = 0
+        self.n_plus_one = 0
+
+
+_totals = defaultdict(_RouteTotals)
+_totals_lock = threading.Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    started = conn.info.get("query_started")
+    elapsed = time.perf_counter() - started.pop() if started else 0.0
+    shape = stats.record(statement, elapsed)
+    if shape is not None:
+        # the stack is only available now; the warning goes out when the request ends
+        stats.flagged.append((shape, _call_site()))
+
+
+def install():
+    """Listen on every engine (sync, async and replica). Safe to call more than once."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def snapshot() -> dict:
+    """Totals per route template: requests, queries, DB seconds, worst request, N+1 hits."""
+    with _totals_lock:
+        return {route: {slot: getattr(t, slot) for slot in _RouteTotals.__slots__} for route, t in _totals.items()}
+
+
+def _finish(scope, stats: RequestSQL):
+    route = route_template(scope) or "unmatched"
+    with _totals_lock:
+        totals = _totals[route]
+        totals.requests += 1
+        totals.queries += stats.queries
+        totals.seconds += stats.seconds
+        totals.max_queries = max(totals.max_queries, stats.queries)
+        totals.n_plus_one += len(stats.flagged)
+    metrics.DB_QUERIES.labels(route).observe(stats.queries)
+    metrics.DB_TIME.labels(route).observe(stats.seconds)
+    if stats.flagged:
+        metrics.DB_N_PLUS_ONE.labels(route).inc()
+    for shape, site in stats.flagged:
+        logger.warning("N+1 on %s %s: %d runs of %s (from %s)", scope.get("method"), route,
+                       stats.shapes[shape], shape[:200], site)
+
+
+class SQLStatsMiddleware:
+    """Pure ASGI middleware, so streaming responses (SSE, exports) pass through untouched."""
+
+    def __init__(self, app):
+        self.app = app
+        install()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestSQL()
+        token = _current.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                millis = stats.seconds * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(stats.queries).encode()))
+                headers.append((b"x-db-time-ms", f"{millis:.1f}".encode()))
+                headers.append((b"server-timing", f"db;dur={millis:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            _finish(scope, stats)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Index, LargeBinary, UniqueConstraint
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -12,4 +12,101 @@ class Attendance(Base):
     confidence_score = Column(Float, nullable=True)
     location = Column(String, nullable=True)
     shift = Column(String, nullable=True)
+    direction = Column(String, nullable=True)  # in, out; None on rows from before check-out existed
+    # client-generated key so kiosks can safely replay buffered punches
+    idempotency_key = Column(String, unique=True, index=True, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Keyset pagination walks (created_at, id) newest-first, optionally
+    # narrowed to one employee, location or method.
+    __table_args__ = (
+        Index('ix_attendance_created_id', 'created_at', 'id'),
+        Index('ix_attendance_employee_created_id', 'employee_id', 'created_at', 'id'),
+        Index('ix_attendance_location_created_id', 'location', 'created_at', 'id'),
+        Index('ix_attendance_method_created_id', 'method', 'created_at', 'id'),
+    )
+
+
+class DailyAttendance(Base):
+    """Per-employee, per-day summary of punches, kept current as punches arrive."""
+    __tablename__ = 'daily_attendance'
+
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(String, nullable=False)
+    work_date = Column(Date, nullable=False)
+    first_in = Column(DateTime(timezone=True), nullable=True)  # None when only a check-out was recorded
+    last_out = Column(DateTime(timezone=True), nullable=True)
+    punch_count = Column(Integer, nullable=False, default=0)
+    missing_punches = Column(Integer, nullable=False, default=0)  # sessions lacking an in or out
+    minutes_late = Column(Integer, nullable=False, default=0)
+    worked_minutes = Column(Integer, nullable=False, default=0)
+    first_location = Column(String, nullable=True)  # site of the first check-in
+    department = Column(String, nullable=True)  # as of the last refresh; rollups group by it
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint('employee_id', 'work_date', name='uq_daily_attendance_employee_date'),
+        Index('ix_daily_attendance_date_employee', 'work_date', 'employee_id'),
+    )
+
+
+class AttendanceArchive(Base):
+    """One Parquet file of punches moved out of the attendance table."""
+    __tablename__ = 'attendance_archive'
+
+    id = Column(Integer, primary_key=True, index=True)
+    month = Column(Date, nullable=False, index=True)  # first day of the archived month
+    path = Column(String, nullable=False)  # relative to ATTENDANCE_ARCHIVE_DIR
+    row_count = Column(Integer, nullable=False)
+    max_created_at = Column(DateTime(timezone=True), nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ArchivedPunchKey(Base):
+    """Idempotency key of a punch moved to the cold tier, so replays of it are still recognised."""
+    __tablename__ = 'archived_punch_keys'
+
+    idempotency_key = Column(String, primary_key=True)
+    attendance_id = Column(Integer, nullable=False)
+    month = Column(Date, nullable=False)  # partition holding the punch
+
+
+class PresenceBitmap(Base):
+    """One bit per day of ``year`` (bit 0 is 1 January) for an employee and a kind of day."""
+    __tablename__ = 'presence_bitmaps'
+
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # present, late, leave
+    year = Column(Integer, nullable=False)
+    bits = Column(LargeBinary, nullable=False)  # 46 bytes, little-endian
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint('employee_id', 'kind', 'year', name='uq_presence_bitmaps_employee_kind_year'),
+    )
+
+
+class AttendanceRollup(Base):
+    """Daily attendance aggregated into hour/day/week/month buckets per site, department or overall.
+
+    ``hour`` buckets count arrivals by the hour of the first check-in; the
+    others group by work date (weeks start on Monday).
+    """
+    __tablename__ = 'attendance_rollups'
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String, nullable=False)  # hour, day, week, month
+    bucket = Column(DateTime, nullable=False)  # start of the bucket
+    dimension = Column(String, nullable=False)  # site, department, all
+    value = Column(String, nullable=False, default='')
+    days_present = Column(Integer, nullable=False, default=0)  # employee-days; arrivals for hour buckets
+    days_late = Column(Integer, nullable=False, default=0)
+    minutes_late = Column(Integer, nullable=False, default=0)
+    worked_minutes = Column(Integer, nullable=False, default=0)
+    punches = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint('granularity', 'dimension', 'value', 'bucket', name='uq_attendance_rollups_bucket'),
+        Index('ix_attendance_rollups_lookup', 'granularity', 'dimension', 'bucket'),
+    )
@@ -12,6 +12,8 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     role = Column(String, default="employee")  # admin, employee
     is_active = Column(Boolean, default=True)
+    # Access tokens carry the version they were issued at; bumping it revokes them
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationship with employee
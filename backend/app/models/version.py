@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, String
+from app.core.database import Base
+
+
+class DataVersion(Base):
+    """Change counter per data set, bumped in the same transaction as the write it counts."""
+    __tablename__ = "data_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
@@ -2,8 +2,8 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Any
 import os
-import joblib
-import numpy as np
+from app.core.metrics import time_inference
+from app.services.model_cache import load_joblib
 
 router = APIRouter()
 
@@ -29,21 +29,18 @@ ENC_PATH = os.path.join(MODEL_DIR, 'encoders.joblib')
 
 
 def _load_model_and_encoders():
-    if not os.path.exists(MODEL_PATH):
+    model = load_joblib(MODEL_PATH)
+    if model is None:
         return None, None
-    model = joblib.load(MODEL_PATH)
-    encoders = None
-    if os.path.exists(ENC_PATH):
-        try:
-            encoders = joblib.load(ENC_PATH)
-        except Exception:
-            encoders = None
+    try:
+        encoders = load_joblib(ENC_PATH)
+    except Exception:
+        encoders = None
     return model, encoders
 
 
-@router.on_event('startup')
-def load_model_on_startup():
-    # Attempt to load early so endpoint returns clear error if missing
+def warm_up():
+    # Called by the background warmup so the first request does not pay for loading
     model, enc = _load_model_and_encoders()
     if model is None:
         print('[absence_prediction] Model not found at', MODEL_PATH)
@@ -53,6 +50,8 @@ def load_model_on_startup():
 
 @router.post('/api/v1/predict_absence', response_model=AbsenceResponse)
 def predict_absence(payload: AbsenceRequest):
+    import numpy as np
+
     model, encoders = _load_model_and_encoders()
     if model is None:
         raise HTTPException(status_code=503, detail='Model not available. Please run training script to create model at backend/ml/absenteeism_model.pkl')
@@ -103,8 +102,9 @@ def predict_absence(payload: AbsenceRequest):
 
     # Predict probability and class
     try:
-        proba = float(model.predict_proba(X)[0][1]) if hasattr(model, 'predict_proba') else float(model.predict(X)[0])
-        pred = int(model.predict(X)[0])
+        with time_inference('absence'):
+            proba = float(model.predict_proba(X)[0][1]) if hasattr(model, 'predict_proba') else float(model.predict(X)[0])
+            pred = int(model.predict(X)[0])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'Model prediction failed: {e}')
 
@@ -1,22 +1,474 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+import asyncio
+import json
+import os
+from datetime import date, datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import List, Literal, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.schemas.attendance import AttendanceCreate, AttendanceResponse
-from app.crud.attendance import create_attendance, get_attendance_logs
+from app.core import conditional
+from app.core.config import settings
+from app.core.database import get_async_db, get_async_read_db, get_db, get_read_db
+from app.core.pagination import decode_cursor
+from app.dependencies.auth import get_current_employee, get_current_user, get_current_user_or_query_token
+from app.models.user import Employee, User
+from app.schemas.attendance import (
+    AttendanceCreate, AttendanceCheckOut, AttendanceResponse, AttendanceBulkItem, AttendanceBulkResponse,
+    DailyAttendanceResponse, PresenceCountResponse, RollupPoint, RollupTotal, TodayAttendanceResponse,
+    WorkSessionResponse
+)
+from app.crud.attendance import (
+    bulk_create_attendance, create_attendance_async, get_attendance_logs_async, get_attendance_page_async,
+    get_punch_events_since
+)
+from app.crud.daily_attendance import _naive_utc, get_daily_attendance, get_today_attendance, iter_work_sessions
+from app.crud.presence import presence_counts
+from app.crud.rollups import get_series, get_totals
+from app.crud.version import latest_attendance_id, latest_attendance_id_async
+from app.services import events, exports, punch_anomalies, punch_suppression
 
 router = APIRouter()
 
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+async def _record_punch(db: AsyncSession, data: dict, direction: str, response: Response):
+    # the suppression window lives in the shared state store; keep its calls off the event loop
+    original = await run_in_threadpool(punch_suppression.claim, data['employee_id'], direction)
+    if original is not None:
+        # repeat scan inside the suppression window: answer with the first punch, no write
+        response.headers['X-Duplicate-Of'] = str(original['id'])
+        return original
+    try:
+        att = await create_attendance_async(db, attendance_in={**data, 'direction': direction})
+    except Exception as e:
+        await run_in_threadpool(punch_suppression.release, data['employee_id'], direction)
+        raise HTTPException(status_code=500, detail=str(e))
+    await run_in_threadpool(punch_suppression.remember, att)
+    return att
+
 
 @router.post('/api/v1/attendance/check-in', response_model=AttendanceResponse)
-def check_in(att_in: AttendanceCreate, db: Session = Depends(get_db)):
+async def check_in(att_in: AttendanceCreate, response: Response, db: AsyncSession = Depends(get_async_db)):
+    return await _record_punch(db, att_in.dict(), 'in', response)
+
+
+@router.post('/api/v1/attendance/check-out', response_model=AttendanceResponse)
+async def check_out(att_in: AttendanceCheckOut, response: Response, db: AsyncSession = Depends(get_async_db)):
+    return await _record_punch(db, att_in.dict(exclude={'attendance_id'}), 'out', response)
+
+
+@router.get('/api/v1/attendance/suppression')
+def suppression_stats():
+    """How many repeat scans were answered from the suppression window instead of the database."""
+    return punch_suppression.suppression_stats()
+
+
+def _too_many():
+    return HTTPException(status_code=413, detail=f"Too many records; send at most {settings.ATTENDANCE_BULK_MAX_RECORDS} per request")
+
+
+async def _iter_ndjson(request: Request):
+    """Yield decoded objects from an NDJSON body as it streams in (None for unparseable lines)."""
+    buffer = b''
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+    if buffer.strip():
+        try:
+            yield json.loads(buffer)
+        except ValueError:
+            yield None
+
+
+async def _bulk_records(request: Request):
+    """Yield the records of a bulk sync in order; NDJSON is decoded as it arrives."""
+    content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    if content_type in NDJSON_TYPES:
+        count = 0
+        async for obj in _iter_ndjson(request):
+            count += 1
+            if count > settings.ATTENDANCE_BULK_MAX_RECORDS:
+                raise _too_many()
+            yield obj
+        return
+
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if isinstance(body, dict):
+        body = body.get('records')
+    if not isinstance(body, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of punches or {\"records\": [...]}")
+    if len(body) > settings.ATTENDANCE_BULK_MAX_RECORDS:
+        raise _too_many()
+    for obj in body:
+        yield obj
+
+
+def _validation_message(e: ValidationError) -> str:
+    return '; '.join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+
+
+def _sync_window_error(created_at: Optional[datetime], now: datetime) -> Optional[str]:
+    if created_at is None:
+        return None
+    created_at = _naive_utc(created_at)
+    if created_at > now + timedelta(seconds=settings.ATTENDANCE_SYNC_CLOCK_SKEW_SECONDS):
+        return "created_at: is in the future"
+    if created_at < now - timedelta(days=settings.ATTENDANCE_SYNC_HORIZON_DAYS):
+        return f"created_at: is older than the {settings.ATTENDANCE_SYNC_HORIZON_DAYS}-day sync horizon"
+    return None
+
+
+async def _store_bulk_chunk(db: Session, chunk: List[tuple], results: list):
+    """Store ``(index, record)`` pairs and fill in their results."""
     try:
-        att = create_attendance(db, attendance_in=att_in.dict())
-        return att
+        outcomes = await run_in_threadpool(
+            bulk_create_attendance, db, records=[record for _, record in chunk],
+            chunk_size=settings.ATTENDANCE_BULK_CHUNK_SIZE,
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    for (i, _), outcome in zip(chunk, outcomes):
+        results[i] = {'index': i, **outcome}
+
+
+@router.post('/api/v1/attendance/bulk', response_model=AttendanceBulkResponse)
+async def bulk_check_in(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Replay punches buffered by an offline kiosk (admin accounts only).
+
+    Accepts a JSON array (or ``{"records": [...]}``) or an NDJSON stream of
+    punches, each with a client-generated ``idempotency_key``. Keys that are
+    already stored are reported as ``duplicate`` with the original id, so a
+    sync can be retried safely after a dropped connection. NDJSON records are
+    stored in chunks as they arrive; if the stream then turns out to be over
+    the record limit, the chunks already stored stay and a retry reports them
+    as duplicates.
+
+    A ``created_at`` in the future or older than ``ATTENDANCE_SYNC_HORIZON_DAYS``
+    is reported as an error for that record.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    now = datetime.utcnow()
+    results, chunk = [], []
+    async for obj in _bulk_records(request):
+        i = len(results)
+        results.append(None)
+        if not isinstance(obj, dict):
+            results[i] = {'index': i, 'status': 'error', 'error': 'record is not a JSON object'}
+            continue
+        try:
+            item = AttendanceBulkItem(**obj)
+        except ValidationError as e:
+            results[i] = {'index': i, 'idempotency_key': obj.get('idempotency_key'), 'status': 'error', 'error': _validation_message(e)}
+            continue
+        error = _sync_window_error(item.created_at, now)
+        if error:
+            results[i] = {'index': i, 'idempotency_key': item.idempotency_key, 'status': 'error', 'error': error}
+            continue
+        chunk.append((i, item.dict()))
+        if len(chunk) >= settings.ATTENDANCE_BULK_CHUNK_SIZE:
+            await _store_bulk_chunk(db, chunk, results)
+            chunk = []
+    if chunk:
+        await _store_bulk_chunk(db, chunk, results)
+
+    counts = {'created': 0, 'duplicate': 0, 'error': 0}
+    for r in results:
+        counts[r['status']] += 1
+    return {
+        'received': len(results),
+        'created': counts['created'],
+        'duplicates': counts['duplicate'],
+        'errors': counts['error'],
+        'results': results,
+    }
 
 
 @router.get('/api/v1/attendance/logs', response_model=List[AttendanceResponse])
-def attendance_logs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return get_attendance_logs(db, skip=skip, limit=limit)
+async def attendance_logs(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    location: Optional[str] = None,
+    method: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Newest-first attendance logs.
+
+    Pages are keyset-based: pass the ``X-Next-Cursor`` header of one page as
+    ``cursor`` to get the next. ``skip`` without a cursor falls back to the
+    old offset paging for existing clients. Responses carry an ETag that
+    changes with each new punch; send it back as ``If-None-Match`` to get a
+    304 while nothing was punched.
+    """
+    etag = conditional.etag_for(request, await latest_attendance_id_async(db))
+    unchanged = conditional.not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    response.headers.update(conditional.headers(etag))
+
+    filters = dict(employee_id=employee_id, location=location, method=method, start=start, end=end)
+    if skip and not cursor:
+        return await get_attendance_logs_async(db, skip=skip, limit=limit, **filters)
+
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows, next_cursor = await get_attendance_page_async(db, limit=limit, after=after, **filters)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return rows
+
+
+@router.get('/api/v1/attendance/today', response_model=TodayAttendanceResponse)
+def today_attendance(current_employee: Employee = Depends(get_current_employee), db: Session = Depends(get_db)):
+    day = get_today_attendance(db, current_employee)
+    if day is None:
+        return {'attendance': None, 'checked_in': False, 'checked_out': False}
+    return {
+        'attendance': {
+            'id': day.id,
+            'check_in_time': day.first_in,
+            'check_out_time': day.last_out,
+            'status': 'late' if day.minutes_late else 'present',
+            'minutes_late': day.minutes_late,
+            'worked_minutes': day.worked_minutes,
+        },
+        'checked_in': True,
+        'checked_out': day.last_out is not None,
+    }
+
+
+@router.get('/api/v1/attendance/daily', response_model=List[DailyAttendanceResponse])
+def daily_attendance(
+    employee_id: Optional[List[str]] = Query(None),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    skip: int = 0,
+    limit: int = 1000,
+    db: Session = Depends(get_read_db),
+):
+    """Per-day summaries (first in, last out, lateness, worked minutes) for an inclusive date range."""
+    return get_daily_attendance(db, employee_ids=employee_id, start=start, end=end, skip=skip, limit=limit)
+
+
+@router.get('/api/v1/attendance/sessions', response_model=List[WorkSessionResponse])
+def work_sessions(
+    start: date,
+    end: date,
+    employee_id: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_read_db),
+):
+    """Check-in/check-out pairs with worked minutes for work dates in ``[start, end]``."""
+    return [s.as_dict() for s in iter_work_sessions(db, start=start, end=end + timedelta(days=1), employee_ids=employee_id)]
+
+
+@router.get('/api/v1/attendance/rollups', response_model=List[RollupPoint])
+def attendance_rollups(
+    start: datetime,
+    end: datetime,
+    granularity: Literal['hour', 'day', 'week', 'month'] = 'day',
+    dimension: Literal['site', 'department', 'all'] = 'all',
+    value: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_read_db),
+):
+    """Time series of arrivals, lateness and worked time, one point per bucket in ``[start, end)``.
+
+    ``hour`` buckets count arrivals by the hour of the first check-in.
+    """
+    return get_series(db, granularity, start, end, dimension=dimension, values=value)
+
+
+@router.get('/api/v1/attendance/rollups/totals', response_model=List[RollupTotal])
+def attendance_rollup_totals(
+    start: date,
+    end: date,
+    dimension: Literal['site', 'department', 'all'] = 'all',
+    value: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_read_db),
+):
+    """Totals for the inclusive date range, read from whole months, weeks and days where they fit."""
+    totals = get_totals(db, start, end + timedelta(days=1), dimension=dimension, values=value)
+    return [{'value': v, **t} for v, t in sorted(totals.items())]
+
+
+@router.get('/api/v1/attendance/alerts')
+def punch_alerts(
+    since_id: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user),
+):
+    """Possible buddy punching flagged by the live detector, oldest first; poll with the last id seen."""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return {
+        'alerts': punch_anomalies.detector.alerts(since_id=since_id, limit=limit),
+        'stats': punch_anomalies.detector.stats(),
+    }
+
+
+@router.get('/api/v1/attendance/presence', response_model=List[PresenceCountResponse])
+def presence(
+    days: int = Query(30, ge=1, le=366),
+    end: Optional[date] = None,
+    employee_id: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_read_db),
+):
+    """Days present, late and absent in the ``days`` days ending at ``end`` (today by default)."""
+    end = end or datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+    counts = presence_counts(db, start, end, employee_ids=employee_id)
+    return [{'employee_id': emp, 'start': start, 'end': end, **c} for emp, c in sorted(counts.items())]
+
+
+def _sse(event_id: int, event: str, data: dict) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.get('/api/v1/attendance/stream')
+async def attendance_stream(
+    request: Request,
+    last_event_id: Optional[int] = Query(None, description="Resume point when the Last-Event-ID header cannot be sent"),
+    current_user: User = Depends(get_current_user_or_query_token),
+    db: Session = Depends(get_db),
+):
+    """Server-Sent Events feed of punches as they are committed, for the admin dashboard.
+
+    Reconnecting clients send ``Last-Event-ID`` (browsers do this on their own)
+    and receive the punches they missed before live events resume. A client
+    that missed more than ``EVENT_BACKFILL_MAX`` punches gets a single
+    ``reset`` event instead and should reload ``/api/v1/attendance/logs``;
+    live events follow as usual.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    header = request.headers.get('last-event-id')
+    if header is not None:
+        try:
+            last_event_id = int(header)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    # subscribe before replaying so nothing committed in between is lost
+    subscriber = events.broker.subscribe()
+    missed = []
+    if last_event_id is not None:
+        missed, oldest = events.broker.replay(last_event_id)
+        if oldest is None or oldest > last_event_id + 1:
+            limit = settings.EVENT_BACKFILL_MAX
+            gap = await run_in_threadpool(get_punch_events_since, db, last_event_id, oldest, limit + 1)
+            if len(gap) > limit:
+                # too far behind to replay; its id resumes right before what follows
+                resume_id = oldest - 1 if oldest is not None else await run_in_threadpool(latest_attendance_id, db)
+                missed = [(resume_id, 'reset', {'last_id': resume_id})] + missed
+            else:
+                missed = [(e['id'], 'attendance', e) for e in gap] + missed
+    # the stream can stay open for hours; don't pin a pooled connection to it
+    db.close()
+
+    async def stream():
+        replayed = set()
+        try:
+            yield "retry: 3000\n\n"
+            for event_id, event, data in missed:
+                replayed.add(event_id)
+                yield _sse(event_id, event, data)
+            while True:
+                try:
+                    item = await asyncio.wait_for(subscriber.queue.get(), settings.EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is events.OVERFLOW:
+                    # too slow to keep up; the client reconnects and resumes from its last id
+                    break
+                event_id, event, data = item
+                if event_id in replayed or (last_event_id is not None and event_id <= last_event_id):
+                    continue
+                yield _sse(event_id, event, data)
+        finally:
+            events.broker.unsubscribe(subscriber)
+
+    return StreamingResponse(stream(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@router.get('/api/v1/attendance/export')
+def export_attendance(
+    request: Request,
+    format: str = Query('csv', pattern='^(csv|parquet)$'),
+    gzip: bool = False,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    employee_id: Optional[str] = None,
+    location: Optional[str] = None,
+    method: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """Stream punches for a range as CSV (optionally gzipped) or Parquet.
+
+    Rows are ordered by employee and time and include archived months. The
+    response carries an ETag that changes with the data; requests with
+    ``Range: bytes=N-`` (and a matching ``If-Range``) resume from byte N once
+    the export has been spooled, including after an interrupted download.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    fmt = 'csv.gz' if format == 'csv' and gzip else format
+    filters = dict(start=start, end=end, employee_id=employee_id, location=location, method=method)
+    version = exports.data_version(db)
+    key = exports.export_id(fmt, version, **filters)
+    filters['through_id'] = version[0]
+    media_type, extension = exports.FORMATS[fmt]
+    headers = {
+        'Content-Disposition': f'attachment; filename="attendance-{key[:12]}.{extension}"',
+        'ETag': f'"{key}"',
+    }
+
+    path = exports.completed_spool(key, fmt)
+    if path is None:
+        # first request for this export: stream it while spooling to disk
+        return StreamingResponse(exports.stream_export(fmt, key, filters), media_type=media_type, headers=headers)
+
+    size = os.path.getsize(path)
+    headers['Accept-Ranges'] = 'bytes'
+    if_range = request.headers.get('if-range')
+    try:
+        byte_range = exports.parse_range(request.headers.get('range'), size)
+    except ValueError:
+        return Response(status_code=416, headers={'Content-Range': f'bytes */{size}'})
+    if byte_range is None or (if_range and if_range != headers['ETag']):
+        headers['Content-Length'] = str(size)
+        return StreamingResponse(exports.read_file_range(path), media_type=media_type, headers=headers)
+
+    first, last = byte_range
+    headers['Content-Range'] = f'bytes {first}-{last}/{size}'
+    headers['Content-Length'] = str(last - first + 1)
+    return StreamingResponse(exports.read_file_range(path, first, last), status_code=206,
+                             media_type=media_type, headers=headers)
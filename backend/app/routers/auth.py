@@ -1,30 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.core.config import settings
+from app.core.hashing import HashingBusy
 from app.core.security import create_access_token
-from app.crud.user import authenticate_user, create_user, get_user_by_username
+from app.crud.user import authenticate_user_async, create_user_async, revoke_tokens_async
+from app.dependencies.auth import get_current_user_async, token_claims
 from app.schemas.user import UserCreate, UserResponse, Token
+from app.services import login_throttle
 
 router = APIRouter()
 
+
+def _hashing_busy():
+    return HTTPException(status_code=503, detail="Password hashing is busy, please retry", headers={"Retry-After": "1"})
+
+
 @router.post("/register", response_model=UserResponse)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     try:
         print("Received registration data:", user_data.dict())
-        # Validate password length for bcrypt (max 72 bytes)
-        pwd_bytes = (user_data.password or '').encode('utf-8')
-        if len(pwd_bytes) > 72:
-            raise HTTPException(status_code=400, detail="Password too long. Maximum 72 bytes allowed; please use a shorter password.")
-
         # Create user
-        user = create_user(db=db, user=user_data)
+        user = await create_user_async(db=db, user=user_data)
         return user
     except HTTPException:
         # re-raise HTTPExceptions (validation errors)
         raise
+    except HashingBusy:
+        raise _hashing_busy()
     except ValueError as e:
         print("Registration error:", str(e))
         raise HTTPException(status_code=400, detail=str(e))
@@ -35,21 +40,35 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    ip = request.client.host if request.client else "unknown"
+    wait = login_throttle.retry_after(form_data.username, ip)
+    if wait:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts, try again later",
+            headers={"Retry-After": str(wait)},
+        )
+    try:
+        user = await authenticate_user_async(db, form_data.username, form_data.password)
+    except HashingBusy:
+        raise _hashing_busy()
     if not user:
+        login_throttle.record_failure(form_data.username, ip)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    login_throttle.record_success(form_data.username)
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=token_claims(user), expires_delta=access_token_expires
     )
     
     # Build user response
@@ -66,4 +85,10 @@ def login(
         access_token=access_token,
         token_type="bearer",
         user=user_response
-    )
\ No newline at end of file
+    )
+
+@router.post("/logout")
+async def logout(current_user=Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    # Signs the user out everywhere: every token issued so far stops working
+    await revoke_tokens_async(db, current_user.id)
+    return {"status": "logged_out"}
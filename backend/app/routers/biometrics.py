@@ -1,12 +1,14 @@
 from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from typing import List
 import os
 import traceback
-from app.core.database import get_db
+from app.core import cache
+from app.core.config import settings
+from app.core.database import get_db, run_write
+from app.core.metrics import time_inference
 from sqlalchemy.orm import Session
 import importlib
-import numpy as np
-import cv2
 import json
 from app.models.face import FaceEmbedding
 from app.models.user import Employee
@@ -106,11 +108,20 @@ def get_biometrics_logs(lines: int = 200):
 
 
 def _bytes_to_cv2_image(data: bytes):
+    # numpy / OpenCV load on first use (or during warmup), not when the app starts
+    import cv2
+    import numpy as np
+
     npimg = np.frombuffer(data, np.uint8)
     img = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
     return img
 
 
+def _store_embeddings(db: Session, employee_id: int, embeddings: list):
+    db.add_all(FaceEmbedding(employee_id=employee_id, embedding=json.dumps(e)) for e in embeddings)
+    db.commit()
+
+
 @router.post("/api/v1/biometrics/face/enroll")
 async def enroll_face(employee_id: str = Form(...), files: List[UploadFile] = File(...), db: Session = Depends(get_db)):
     """Accepts either numeric employee DB id or employee code (employee.employee_id like EMP-0001)."""
@@ -152,11 +163,13 @@ async def enroll_face(employee_id: str = Form(...), files: List[UploadFile] = Fi
 
             # extract ArcFace embedding
             try:
-                rep = DeepFace.represent(img_path=img, model_name="ArcFace", detector_backend="retinaface", enforce_detection=True)
+                with time_inference('face_embedding'):
+                    rep = DeepFace.represent(img_path=img, model_name="ArcFace", detector_backend="retinaface", enforce_detection=True)
             except Exception as e:
                 # fallback to mtcnn with less strict detection
                 try:
-                    rep = DeepFace.represent(img_path=img, model_name="ArcFace", detector_backend="mtcnn", enforce_detection=False)
+                    with time_inference('face_embedding'):
+                        rep = DeepFace.represent(img_path=img, model_name="ArcFace", detector_backend="mtcnn", enforce_detection=False)
                 except Exception as e2:
                     rep = None
                     info.update({"stored": False, "reason": f"representation_error: {str(e2)}"})
@@ -172,10 +185,6 @@ async def enroll_face(employee_id: str = Form(...), files: List[UploadFile] = Fi
             embedding = rep[0]["embedding"]
             embeddings.append(embedding)
 
-            # store in DB
-            fe = FaceEmbedding(employee_id=emp.id, embedding=json.dumps(embedding))
-            db.add(fe)
-
             info.update({"stored": True, "embedding_len": len(embedding)})
             diagnostics.append(info)
         except Exception as ex:
@@ -183,11 +192,14 @@ async def enroll_face(employee_id: str = Form(...), files: List[UploadFile] = Fi
             diagnostics.append(info)
             _write_log(f"enroll exception file={info.get('filename')} error={str(ex)}\n" + traceback.format_exc())
 
-    try:
-        db.commit()
-    except Exception as e:
-        _write_log('db.commit failed: ' + str(e) + '\n' + traceback.format_exc())
-        raise
+    if embeddings:
+        # stored together through the write queue, like every other write
+        try:
+            await run_in_threadpool(run_write, db, _store_embeddings, emp.id, embeddings)
+        except Exception as e:
+            _write_log('db.commit failed: ' + str(e) + '\n' + traceback.format_exc())
+            raise
+        cache.invalidate("faces")
 
     stored_count = len(embeddings)
     # log diagnostics server-side for easier debugging
@@ -204,6 +216,8 @@ async def enroll_face(employee_id: str = Form(...), files: List[UploadFile] = Fi
 
 
 def _cosine_similarity(a, b):
+    import numpy as np
+
     a = np.array(a, dtype=np.float32)
     b = np.array(b, dtype=np.float32)
     if np.linalg.norm(a) == 0 or np.linalg.norm(b) == 0:
@@ -211,6 +225,16 @@ def _cosine_similarity(a, b):
     return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
 
 
+def _face_gallery(db: Session):
+    gallery = []
+    for r in db.query(FaceEmbedding).all():
+        try:
+            gallery.append((r.employee_id, json.loads(r.embedding)))
+        except Exception:
+            continue
+    return gallery
+
+
 @router.post("/api/v1/biometrics/face/verify")
 async def verify_face(file: UploadFile = File(...), db: Session = Depends(get_db)):
     data = await file.read()
@@ -225,10 +249,12 @@ async def verify_face(file: UploadFile = File(...), db: Session = Depends(get_db
         raise HTTPException(status_code=503, detail=f"DeepFace not available: {e}")
 
     try:
-        rep = DeepFace.represent(img_path=img, model_name="ArcFace", detector_backend="retinaface", enforce_detection=True)
+        with time_inference('face_embedding'):
+            rep = DeepFace.represent(img_path=img, model_name="ArcFace", detector_backend="retinaface", enforce_detection=True)
     except Exception:
         try:
-            rep = DeepFace.represent(img_path=img, model_name="ArcFace", detector_backend="mtcnn", enforce_detection=False)
+            with time_inference('face_embedding'):
+                rep = DeepFace.represent(img_path=img, model_name="ArcFace", detector_backend="mtcnn", enforce_detection=False)
         except Exception:
             # log representation failure
             _write_log('verify: representation failure for uploaded image\n' + traceback.format_exc())
@@ -239,25 +265,21 @@ async def verify_face(file: UploadFile = File(...), db: Session = Depends(get_db
 
     embedding = rep[0]["embedding"]
 
-    # compare against DB
-    rows = db.query(FaceEmbedding).all()
-    best = None
+    # compare against the enrolled embeddings (parsed once per enrollment, not per scan)
+    # async variant: a miss (or waiting on another request's miss) must not block the event loop
+    gallery = await cache.get_or_compute_async("biometrics.face_gallery", lambda: run_in_threadpool(_face_gallery, db),
+                                               ttl=3600, namespaces=("faces",))
     best_score = -1.0
     best_employee = None
 
-    for r in rows:
-        try:
-            stored = json.loads(r.embedding)
-        except Exception:
-            continue
+    for employee_id, stored in gallery:
         score = _cosine_similarity(embedding, stored)
         if score > best_score:
             best_score = score
-            best = r
-            best_employee = r.employee_id
+            best_employee = employee_id
 
     # ArcFace recommended threshold: cosine_similarity > 0.40
-    threshold = 0.40
+    threshold = settings.FACE_MATCH_THRESHOLD
     if best_score >= threshold:
         return {"match": True, "employee_id": best_employee, "score": best_score}
     else:
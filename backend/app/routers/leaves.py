@@ -1,23 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 import logging
 logging.basicConfig(level=logging.INFO)
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
 from typing import List
-from app.core.database import get_db
-from app.dependencies.auth import get_current_user, get_current_employee
+from app.core import cache, conditional
+from app.core.serialization import ORJSONResponse
+from app.core.database import get_async_db, get_async_read_db
+from app.dependencies.auth import get_current_user_async, get_current_employee_async
 from app.models.user import User, Employee  # Changed import here
 from app.crud.leave import (
-    create_leave_request, get_leave_requests_by_employee, get_all_leave_requests,
-    get_pending_leave_requests, update_leave_request_status, get_leave_balance,
-    get_blackout_periods, get_leave_request_by_id, get_all_leave_requests_enriched
+    create_leave_request_async, get_leave_requests_by_employee_async, update_leave_request_status_async,
+    get_leave_balance_async, get_blackout_periods_async, get_leave_request_by_id_async,
+    get_all_leave_requests_enriched_async, create_blackout_period_async, delete_blackout_period_async
 )
 from app.schemas.leave import (
     LeaveRequestCreate, LeaveRequestResponse, LeaveRequestUpdate,
-    LeaveBalanceResponse, BlackoutPeriodResponse
+    LeaveBalanceResponse, BlackoutPeriodCreate, BlackoutPeriodResponse
 )
-from app.crud.leave import get_admin_dashboard
+from app.crud.leave import get_admin_dashboard_async
+from app.crud.version import get_versions_async
 from typing import Dict, Any
 
 router = APIRouter()
@@ -25,111 +27,169 @@ logger = logging.getLogger(__name__)
 
 # Employee endpoints
 @router.post("/employee/apply", response_model=LeaveRequestResponse)
-def apply_for_leave(
+async def apply_for_leave(
     leave_request: LeaveRequestCreate,
-    current_employee: Employee = Depends(get_current_employee),
-    db: Session = Depends(get_db)
+    current_employee: Employee = Depends(get_current_employee_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    return create_leave_request(db=db, leave_request=leave_request, employee_id=current_employee.id)
+    return await create_leave_request_async(db=db, leave_request=leave_request, employee_id=current_employee.id)
 
 @router.get("/employee/my-leaves", response_model=List[LeaveRequestResponse])
-def get_my_leaves(
+async def get_my_leaves(
     skip: int = 0,
     limit: int = 100,
-    current_employee: Employee = Depends(get_current_employee),
-    db: Session = Depends(get_db)
+    current_employee: Employee = Depends(get_current_employee_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    leaves = get_leave_requests_by_employee(db, current_employee.id, skip=skip, limit=limit)
-    return leaves
+    leaves = await get_leave_requests_by_employee_async(db, current_employee.id, skip=skip, limit=limit)
+    # rows come straight from SQL; response_model only documents the shape
+    return ORJSONResponse(leaves)
 
 @router.get("/employee/balance", response_model=LeaveBalanceResponse)
-def get_my_leave_balance(
-    current_employee: Employee = Depends(get_current_employee),
-    db: Session = Depends(get_db)
+async def get_my_leave_balance(
+    current_employee: Employee = Depends(get_current_employee_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    return get_leave_balance(db, current_employee.id)
+    return await get_leave_balance_async(db, current_employee.id)
 
 # Admin endpoints
 @router.get("/admin/all")
-def get_all_leaves(
+async def get_all_leaves(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    etag = conditional.etag_for(request, await get_versions_async(db, ["leaves"]))
+    unchanged = conditional.not_modified(request, etag)
+    if unchanged:
+        return unchanged
     
     # Ensure enriched representation is returned (employee info populated)
     try:
-        result = get_all_leave_requests_enriched(db, skip=skip, limit=limit)
+        result = await get_all_leave_requests_enriched_async(db, skip=skip, limit=limit)
         try:
-            logger.info(f"get_all_leaves: returning {len(result)} records; first employee: {result[0].get('employee') if result else None}")
+            logger.info(f"get_all_leaves: returning {len(result)} records; first employee: {result[0].employee if result else None}")
         except Exception:
             logger.exception("get_all_leaves: error logging result")
-        # Return explicit JSONResponse with jsonable_encoder to ensure
-        # datetimes/dates are JSON-serializable and avoid 500 errors.
-        return JSONResponse(content=jsonable_encoder(result))
+        # orjson encodes the row dataclasses and their dates in one pass
+        return ORJSONResponse(result, headers=conditional.headers(etag))
     except Exception as e:
         logger.exception("Failed to list all leave requests")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/admin/pending")
-def get_pending_leaves(
+async def get_pending_leaves(
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
     # Return enriched pending leaves
     try:
-        all_enriched = get_all_leave_requests_enriched(db, skip=skip, limit=limit)
-        pending = [r for r in all_enriched if r.get("status") == "pending"]
+        all_enriched = await get_all_leave_requests_enriched_async(db, skip=skip, limit=limit)
+        pending = [r for r in all_enriched if r.status == "pending"]
         try:
             logger.info(f"get_pending_leaves: total_enriched={len(all_enriched)}, pending={len(pending)}")
         except Exception:
             logger.exception("get_pending_leaves: error logging result")
-        return JSONResponse(content=jsonable_encoder(pending))
+        return ORJSONResponse(pending)
     except Exception as e:
         logger.exception("Failed to list pending leave requests")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/admin/{leave_id}/status", response_model=LeaveRequestResponse)
-def update_leave_status(
+async def update_leave_status(
     leave_id: int,
     leave_update: LeaveRequestUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    leave_request = get_leave_request_by_id(db, leave_id)
+    leave_request = await get_leave_request_by_id_async(db, leave_id)
     if not leave_request:
         raise HTTPException(status_code=404, detail="Leave request not found")
     
-    return update_leave_request_status(db, leave_id, leave_update, current_user.id)
+    return await update_leave_request_status_async(db, leave_id, leave_update, current_user.id)
 
 @router.get("/admin/blackout-periods", response_model=List[BlackoutPeriodResponse])
-def get_blackout_periods(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def list_blackout_periods(
+    request: Request,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    return get_blackout_periods(db)
+
+    versions = await get_versions_async(db, ["blackouts"])
+    etag = conditional.etag_for(request, versions)
+    unchanged = conditional.not_modified(request, etag)
+    if unchanged:
+        return unchanged
+
+    periods = await cache.get_or_compute_async(
+        "leaves.blackout_periods", lambda: get_blackout_periods_async(db),
+        ttl=3600, vary=(current_user.role, *versions.values()),
+    )
+    return ORJSONResponse(periods, headers=conditional.headers(etag))
+
+
+@router.post("/admin/blackout-periods", response_model=BlackoutPeriodResponse)
+async def create_blackout_period_route(
+    blackout: BlackoutPeriodCreate,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if blackout.end_date < blackout.start_date:
+        raise HTTPException(status_code=400, detail="end_date is before start_date")
+
+    return await create_blackout_period_async(db, blackout)
+
+
+@router.delete("/admin/blackout-periods/{period_id}")
+async def delete_blackout_period_route(
+    period_id: int,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    if not await delete_blackout_period_async(db, period_id):
+        raise HTTPException(status_code=404, detail="Blackout period not found")
+    return {"status": "deleted", "id": period_id}
 
 
 @router.get("/admin/dashboard")
-def get_admin_dashboard_route(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_admin_dashboard_route(
+    request: Request,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not enough permissions")
 
-    return get_admin_dashboard(db)
\ No newline at end of file
+    # the counts also move with the date (onLeaveToday, upcoming expirations)
+    versions = await get_versions_async(db, ["leaves", "blackouts"])
+    today = datetime.utcnow().date()
+    etag = conditional.etag_for(request, versions, today)
+    unchanged = conditional.not_modified(request, etag)
+    if unchanged:
+        return unchanged
+
+    dashboard = await cache.get_or_compute_async(
+        "leaves.dashboard", lambda: get_admin_dashboard_async(db),
+        ttl=300, vary=(current_user.role, today, *versions.values()),
+    )
+    return ORJSONResponse(dashboard, headers=conditional.headers(etag))
\ No newline at end of file
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Response
+
+from app.core import metrics
+from app.core.database import on_engine
+
+router = APIRouter()
+
+
+@router.on_event('startup')
+def instrument_pools():
+    on_engine(metrics.instrument_pool)
+
+
+@router.on_event('shutdown')
+def release_worker_metrics():
+    metrics.mark_process_dead()
+
+
+@router.get('/metrics', include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus text exposition; merges all workers when METRICS_MULTIPROC_DIR is set."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
@@ -1,13 +1,21 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 import os
-import joblib
-import pandas as pd
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from app.core import cache, conditional
+from app.core.database import get_read_db
+from app.core.metrics import time_inference
+from app.crud.presence import presence_counts
+from app.crud.version import get_versions
+from app.services.model_cache import load_joblib
 
 router = APIRouter()
 
 MODEL_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'ml', 'risk_productivity_model.pkl'))
 DATA_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'prescriptive_office_dataset.csv'))
 ASSIGN_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tomorrow_assignments.csv'))
+REFRESH_SECONDS = 300
 
 FEATURES = [
     "department","role","contract_type","days_since_hired","max_weekly_hours",
@@ -19,16 +27,59 @@ FEATURES = [
 
 
 def _load_model():
-    if not os.path.exists(MODEL_PATH):
-        return None
     try:
-        return joblib.load(MODEL_PATH)
+        return load_joblib(MODEL_PATH)
     except Exception:
         return None
 
 
+def warm_up():
+    _load_model()
+
+
+def _apply_live_presence(df, db: Session):
+    # Replace the dataset's 30-day attendance counts with live ones wherever bitmaps exist
+    today = datetime.utcnow().date()
+    counts = presence_counts(db, today - timedelta(days=29), today, employee_ids=df['employee_id'].astype(str))
+    if not counts:
+        return df
+    ids = df['employee_id'].astype(str)
+    live = ids.isin(list(counts))
+    for kind, column in (('present', 'days_present_last_30'), ('absent', 'days_absent_last_30'),
+                         ('late', 'days_late_last_30')):
+        df.loc[live, column] = ids[live].map(lambda emp: counts[emp][kind])
+    return df
+
+
+def _mtime(path):
+    try:
+        return int(os.path.getmtime(path))
+    except OSError:
+        return 0
+
+
 @router.get('/api/v1/prescriptive/recommendations')
-def get_recommendations():
+def get_recommendations(request: Request, response: Response, db: Session = Depends(get_read_db)):
+    # Live presence includes leave days; new punches (and the date) are picked
+    # up once per REFRESH_SECONDS window rather than on every scan. Retraining
+    # or replacing the data files starts a new version too.
+    inputs = (
+        get_versions(db, ['leaves'])['leaves'], int(time.time() // REFRESH_SECONDS),
+        _mtime(MODEL_PATH), _mtime(DATA_PATH), _mtime(ASSIGN_PATH),
+    )
+    etag = conditional.etag_for(request, *inputs)
+    unchanged = conditional.not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    response.headers.update(conditional.headers(etag))
+    return cache.get_or_compute(
+        'prescriptive.recommendations', lambda: _recommendations(db), ttl=REFRESH_SECONDS, vary=inputs,
+    )
+
+
+def _recommendations(db: Session):
+    import pandas as pd
+
     model = _load_model()
     if model is None:
         raise HTTPException(status_code=503, detail='Prescriptive model not available. Run training script backend/train_risk_productivity.py')
@@ -36,10 +87,11 @@ def get_recommendations():
     if not os.path.exists(DATA_PATH):
         raise HTTPException(status_code=500, detail='Prescriptive dataset missing on server')
 
-    df = pd.read_csv(DATA_PATH)
+    df = _apply_live_presence(pd.read_csv(DATA_PATH), db)
     X = df[FEATURES]
     try:
-        probas = model.predict_proba(X)[:,1]
+        with time_inference('prescriptive_risk'):
+            probas = model.predict_proba(X)[:,1]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'Model prediction failed: {e}')
 
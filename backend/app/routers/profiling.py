@@ -0,0 +1,52 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse
+
+from app.dependencies.auth import get_current_user
+from app.models.user import User
+from app.services import profiler
+
+router = APIRouter()
+
+
+@router.get('/api/v1/admin/profiles')
+def list_profiles(current_user: User = Depends(get_current_user)):
+    """Saved single-request profiles, newest first, plus the state of the global sampler."""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    sampler = profiler.global_sampler
+    return {
+        'profiles': profiler.list_profiles(),
+        'global': sampler.summary() if sampler else None,
+    }
+
+
+@router.get('/api/v1/admin/profiles/report')
+def profile_report(
+    route: Optional[str] = None,
+    top: int = 0,
+    reset: bool = False,
+    current_user: User = Depends(get_current_user),
+):
+    """Hot stacks per route from the global sampler, as collapsed stacks rooted at the route template."""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    sampler = profiler.global_sampler
+    if sampler is None:
+        raise HTTPException(status_code=404, detail="Global sampling is off (PROFILE_GLOBAL_HZ=0)")
+    body = "\n".join(sampler.report(route=route, top=top)) + "\n"
+    if reset:
+        sampler.reset()
+    return PlainTextResponse(body, headers={'Content-Disposition': 'attachment; filename="routes.collapsed"'})
+
+
+@router.get('/api/v1/admin/profiles/{profile_id}')
+def download_profile(profile_id: str, current_user: User = Depends(get_current_user)):
+    """One request's profile in collapsed-stack format (flamegraph.pl, speedscope, inferno)."""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    path = profiler.profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type='text/plain', filename=f"{profile_id}.collapsed")
@@ -1,11 +1,38 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.dependencies.auth import get_current_user
+from app.core.config import settings
+from app.core.database import get_db, run_write
+from app.crud.user import revoke_tokens
+from app.dependencies.auth import get_current_user, get_current_user_record
 from app.models.user import User
+from app.schemas.user import UserImportResponse
+from app.services.user_import import ImportFileError, import_users, read_csv
 
 router = APIRouter()
 
 @router.get("/me")
-def get_current_user_info(current_user: User = Depends(get_current_user)):
-    return current_user
\ No newline at end of file
+def get_current_user_info(current_user: User = Depends(get_current_user_record)):
+    return current_user
+
+@router.post("/{user_id}/revoke-tokens")
+def revoke_user_tokens(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if run_write(db, revoke_tokens, user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"status": "revoked", "id": user_id}
+
+@router.post("/import", response_model=UserImportResponse)
+def import_users_csv(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Create users and employee records from an uploaded CSV (see ``app.services.user_import``)."""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    try:
+        rows = read_csv(file.file.read(), settings.USER_IMPORT_MAX_ROWS)
+    except ImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return import_users(db, rows)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional
-from datetime import datetime
+from typing import Optional, List, Literal
+from datetime import date, datetime
 
 
 class AttendanceCreate(BaseModel):
@@ -9,6 +9,18 @@ class AttendanceCreate(BaseModel):
     confidence_score: Optional[float] = None
     location: Optional[str] = None
     shift: Optional[str] = None
+    idempotency_key: Optional[str] = None
+
+
+class AttendanceCheckOut(BaseModel):
+    employee_id: str
+    method: str = 'manual'
+    confidence_score: Optional[float] = None
+    location: Optional[str] = None
+    shift: Optional[str] = None
+    idempotency_key: Optional[str] = None
+    # sent by the web app; sessions are paired from the punch stream instead
+    attendance_id: Optional[int] = None
 
 
 class AttendanceResponse(BaseModel):
@@ -18,7 +30,100 @@ class AttendanceResponse(BaseModel):
     confidence_score: Optional[float]
     location: Optional[str]
     shift: Optional[str]
+    direction: Optional[str] = None
     created_at: datetime
 
     class Config:
         orm_mode = True
+
+
+class AttendanceBulkItem(AttendanceCreate):
+    # Buffered punches carry their own key and the time they were scanned
+    idempotency_key: str
+    created_at: Optional[datetime] = None
+    direction: Optional[Literal['in', 'out']] = None
+
+
+class AttendanceBulkResult(BaseModel):
+    index: int
+    idempotency_key: Optional[str] = None
+    status: str  # created, duplicate, error
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class AttendanceBulkResponse(BaseModel):
+    received: int
+    created: int
+    duplicates: int
+    errors: int
+    results: List[AttendanceBulkResult]
+
+
+class DailyAttendanceResponse(BaseModel):
+    id: int
+    employee_id: str
+    work_date: date
+    first_in: Optional[datetime] = None
+    last_out: Optional[datetime] = None
+    punch_count: int
+    missing_punches: int = 0
+    minutes_late: int
+    worked_minutes: int
+
+    class Config:
+        from_attributes = True
+
+
+class TodayAttendance(BaseModel):
+    id: int
+    check_in_time: Optional[datetime] = None
+    check_out_time: Optional[datetime] = None
+    status: Optional[str] = None
+    minutes_late: int = 0
+    worked_minutes: int = 0
+
+
+class TodayAttendanceResponse(BaseModel):
+    attendance: Optional[TodayAttendance] = None
+    checked_in: bool = False
+    checked_out: bool = False
+
+
+class WorkSessionResponse(BaseModel):
+    employee_id: str
+    work_date: date
+    check_in: Optional[datetime] = None
+    check_out: Optional[datetime] = None
+    status: str  # complete, missing_in, missing_out
+    punches: int
+    worked_minutes: int
+
+
+class PresenceCountResponse(BaseModel):
+    employee_id: str
+    start: date
+    end: date
+    present: int
+    late: int
+    absent: int
+
+
+class RollupPoint(BaseModel):
+    bucket: datetime
+    value: str
+    days_present: int
+    days_late: int
+    minutes_late: int
+    worked_minutes: int
+    punches: int
+
+
+class RollupTotal(BaseModel):
+    value: str
+    days_present: int
+    days_late: int
+    minutes_late: int
+    worked_minutes: int
+    punches: int
+    attendance_rate: Optional[float] = None
@@ -29,6 +29,14 @@ class LeaveRequestUpdate(BaseModel):
     status: LeaveStatus
     remarks: Optional[str] = None
 
+class LeaveEmployeeResponse(BaseModel):
+    name: Optional[str] = None
+    department: Optional[str] = None
+    employee_id: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
 class LeaveRequestResponse(LeaveRequestBase):
     id: int
     employee_id: int
@@ -38,7 +46,7 @@ class LeaveRequestResponse(LeaveRequestBase):
     approved_by: Optional[int] = None
     approved_at: Optional[datetime] = None
     remarks: Optional[str] = None
-    employee: Optional[dict] = None
+    employee: Optional[LeaveEmployeeResponse] = None
 
     class Config:
         from_attributes = True
@@ -63,6 +71,9 @@ class BlackoutPeriodBase(BaseModel):
     reason: str
     restriction_level: str
 
+class BlackoutPeriodCreate(BlackoutPeriodBase):
+    restriction_level: str = "restricted"
+
 class BlackoutPeriodResponse(BlackoutPeriodBase):
     id: int
     created_at: datetime
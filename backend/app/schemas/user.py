@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -41,4 +41,19 @@ class UserResponse(UserBase):
 class Token(BaseModel):
     access_token: str
     token_type: str
-    user: UserResponse
\ No newline at end of file
+    user: UserResponse
+
+class UserImportResult(BaseModel):
+    line: int  # line in the CSV file, header = 1
+    username: Optional[str] = None
+    status: str  # created, duplicate, error
+    id: Optional[int] = None
+    employee_id: Optional[str] = None
+    error: Optional[str] = None
+
+class UserImportResponse(BaseModel):
+    received: int
+    created: int
+    duplicates: int
+    errors: int
+    results: List[UserImportResult]
@@ -0,0 +1,384 @@
+"""Parquet cold tier for attendance punches.
+
+Only recent months live in the ``attendance`` table. Closed months are moved
+into compressed Parquet files laid out as hive partitions::
+
+    ATTENDANCE_ARCHIVE_DIR/month=2026-01/part-0000.parquet
+
+Each file is sorted by (employee_id, created_at, id), so readers get partition
+pruning on the month and row-group statistics pruning on the employee. Every
+file is recorded in ``attendance_archive``; when that table is empty nothing
+here touches pyarrow, so deployments without archived data do not need it.
+The idempotency keys of archived punches move to ``archived_punch_keys``, so
+a kiosk replaying an old punch is still answered with the original.
+"""
+import heapq
+import os
+from array import array
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, Iterator, List, Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.attendance import ArchivedPunchKey, Attendance, AttendanceArchive
+
+COLUMNS = ('id', 'employee_id', 'method', 'confidence_score', 'location', 'shift',
+           'direction', 'idempotency_key', 'created_at')
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute  # noqa: F401
+        import pyarrow.dataset  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise RuntimeError("pyarrow is required for the attendance cold tier; pip install pyarrow")
+    return pyarrow
+
+
+def _schema(pa):
+    return pa.schema([
+        ('id', pa.int64()),
+        ('employee_id', pa.string()),
+        ('method', pa.string()),
+        ('confidence_score', pa.float64()),
+        ('location', pa.string()),
+        ('shift', pa.string()),
+        ('direction', pa.string()),
+        ('idempotency_key', pa.string()),
+        ('created_at', pa.timestamp('us')),
+    ])
+
+
+def archive_root() -> str:
+    return os.path.abspath(settings.ATTENDANCE_ARCHIVE_DIR)
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _previous_month(month: date) -> date:
+    return date(month.year - (month.month == 1), (month.month - 2) % 12 + 1, 1)
+
+
+def _month_range(month: date):
+    return datetime.combine(month, time.min), datetime.combine(_next_month(month), time.min)
+
+
+def _naive(ts: datetime) -> datetime:
+    if ts is not None and ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+_HORIZON = select(func.max(AttendanceArchive.max_created_at))
+
+
+def cold_horizon(db: Session) -> Optional[datetime]:
+    """Newest punch time held in Parquet, or None when nothing has been archived."""
+    return _naive(db.scalar(_HORIZON))
+
+
+async def cold_horizon_async(db: AsyncSession) -> Optional[datetime]:
+    return _naive(await db.scalar(_HORIZON))
+
+
+# -- archiving ---------------------------------------------------------------
+
+def _id_runs(ids: array):
+    """Collapse sorted ids into (first, last) runs of consecutive integers."""
+    first = last = None
+    for i in ids:
+        if last is not None and i == last + 1:
+            last = i
+            continue
+        if first is not None:
+            yield first, last
+        first = last = i
+    if first is not None:
+        yield first, last
+
+
+def _tmp_path(final_path: str) -> str:
+    # leading underscore keeps dataset discovery away from a half-written or uncommitted file
+    directory, name = os.path.split(final_path)
+    return os.path.join(directory, f"_{name}.tmp")
+
+
+def _recover_month(db: Session, month: date, directory: str):
+    """Finish what an interrupted ``archive_month`` left in ``directory``.
+
+    A part whose manifest row committed but whose rename did not happen is
+    moved into place. Any other file belongs to a run that never committed,
+    so its rows are still in the hot table, and is removed before readers
+    count them twice.
+    """
+    committed = set()
+    for (path,) in db.query(AttendanceArchive.path).filter(AttendanceArchive.month == month):
+        final_path = os.path.join(archive_root(), path)
+        committed.add(final_path)
+        if not os.path.exists(final_path) and os.path.exists(_tmp_path(final_path)):
+            os.replace(_tmp_path(final_path), final_path)
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if (name.endswith('.parquet') or name.endswith('.tmp')) and path not in committed:
+            os.remove(path)
+
+
+def _archive_keys(db: Session, month: date, keys: list):
+    """Keep the idempotency keys of archived punches where the dedupe lookups can see them."""
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        # punches stored twice before keys were kept here would collide; one entry per key is enough
+        known = set(db.scalars(select(ArchivedPunchKey.idempotency_key).where(
+            ArchivedPunchKey.idempotency_key.in_([k for k, _ in chunk]))))
+        rows, seen = [], set()
+        for key, attendance_id in chunk:
+            if key not in known and key not in seen:
+                seen.add(key)
+                rows.append({'idempotency_key': key, 'attendance_id': attendance_id, 'month': month})
+        if rows:
+            db.execute(insert(ArchivedPunchKey), rows)
+
+
+def archive_month(db: Session, month: date) -> int:
+    """Move one month of punches into a new Parquet part file; returns rows moved.
+
+    The part is written under a temporary name first. Deleting the rows,
+    keeping their idempotency keys and adding the manifest row then commit
+    together, and only after that is the file renamed into place, so a crash
+    at any point leaves each punch either hot or archived, never both; the
+    next run completes or discards the leftover file. Only rows that were
+    actually written are deleted, so punches that arrive for the month while
+    it is being archived stay in the hot table (and are picked up by the next
+    run as another part file).
+    """
+    pa = _pyarrow()
+    month = month_start(month)
+    lo, hi = _month_range(month)
+    size = settings.ATTENDANCE_ARCHIVE_ROW_GROUP_SIZE
+    schema = _schema(pa)
+
+    directory = os.path.join(archive_root(), f"month={month:%Y-%m}")
+    os.makedirs(directory, exist_ok=True)
+    _recover_month(db, month, directory)
+    part = db.query(func.count(AttendanceArchive.id)).filter(AttendanceArchive.month == month).scalar()
+    final_path = os.path.join(directory, f"part-{part:04d}.parquet")
+    tmp_path = _tmp_path(final_path)
+
+    rows = db.execute(
+        select(*[getattr(Attendance, c) for c in COLUMNS])
+        .where(Attendance.created_at >= lo, Attendance.created_at < hi)
+        .order_by(Attendance.employee_id, Attendance.created_at, Attendance.id)
+        .execution_options(yield_per=size)
+    )
+
+    ids = array('q')
+    keys = []
+    newest = None
+    writer = None
+    try:
+        for batch in rows.partitions(size):
+            columns = {c: [] for c in COLUMNS}
+            for row in batch:
+                for c, value in zip(COLUMNS, row):
+                    columns[c].append(value)
+            columns['created_at'] = [_naive(ts) for ts in columns['created_at']]
+            ids.extend(columns['id'])
+            keys.extend((k, i) for k, i in zip(columns['idempotency_key'], columns['id']) if k is not None)
+            batch_newest = max(columns['created_at'])
+            newest = batch_newest if newest is None else max(newest, batch_newest)
+            if writer is None:
+                writer = pa.parquet.ParquetWriter(tmp_path, schema, compression='zstd')
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema), row_group_size=size)
+    finally:
+        if writer is not None:
+            writer.close()
+    if not ids:
+        return 0
+
+    try:
+        ids = array('q', sorted(ids))
+        for first, last in _id_runs(ids):
+            db.query(Attendance).filter(
+                Attendance.id >= first, Attendance.id <= last,
+                Attendance.created_at >= lo, Attendance.created_at < hi,
+            ).delete(synchronize_session=False)
+        _archive_keys(db, month, keys)
+        db.add(AttendanceArchive(
+            month=month,
+            path=os.path.relpath(final_path, archive_root()),
+            row_count=len(ids),
+            max_created_at=newest,
+        ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, final_path)
+    return len(ids)
+
+
+def archive_closed_months(db: Session, today: Optional[date] = None) -> dict:
+    """Archive every month older than the last ``ATTENDANCE_HOT_MONTHS`` months.
+
+    Returns ``{month: rows_moved}`` for the months that had punches.
+    """
+    cutoff = month_start(today or datetime.utcnow().date())
+    for _ in range(settings.ATTENDANCE_HOT_MONTHS - 1):
+        cutoff = _previous_month(cutoff)
+    oldest = db.query(func.min(Attendance.created_at)).filter(
+        Attendance.created_at < datetime.combine(cutoff, time.min)
+    ).scalar()
+    moved = {}
+    if oldest is None:
+        return moved
+    month = month_start(_naive(oldest).date())
+    while month < cutoff:
+        count = archive_month(db, month)
+        if count:
+            moved[month] = count
+        month = _next_month(month)
+    return moved
+
+
+# -- reading -----------------------------------------------------------------
+
+def _dataset(pa):
+    partitioning = pa.dataset.partitioning(pa.schema([('month', pa.string())]), flavor='hive')
+    # explicit schema: a month directory may hold no committed part yet
+    schema = _schema(pa).append(pa.field('month', pa.string()))
+    return pa.dataset.dataset(archive_root(), schema=schema, format='parquet', partitioning=partitioning)
+
+
+def _filter(pa, employee_ids=None, location=None, method=None,
+            start: Optional[datetime] = None, end: Optional[datetime] = None):
+    field = pa.dataset.field
+    expr = None
+
+    def both(a, b):
+        return b if a is None else a & b
+
+    if employee_ids:
+        expr = both(expr, field('employee_id').isin(list(employee_ids)))
+    if location is not None:
+        expr = both(expr, field('location') == location)
+    if method is not None:
+        expr = both(expr, field('method') == method)
+    if start is not None:
+        expr = both(expr, field('created_at') >= pa.scalar(_naive(start), pa.timestamp('us')))
+        expr = both(expr, field('month') >= f"{start:%Y-%m}")
+    if end is not None:
+        expr = both(expr, field('created_at') < pa.scalar(_naive(end), pa.timestamp('us')))
+        expr = both(expr, field('month') <= f"{end:%Y-%m}")
+    return expr
+
+
+def _has_files() -> bool:
+    return os.path.isdir(archive_root())
+
+
+def cold_logs_page(limit: int, after=None, employee_id=None, location=None, method=None,
+                   start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Attendance]:
+    """Newest-first punches from the cold tier, strictly before the ``after`` keyset.
+
+    Batches are folded into a running top-``limit`` selection, so memory is
+    bounded by the page size and the scanner batch size, not the archive.
+    """
+    if not _has_files():
+        return []
+    pa = _pyarrow()
+    pc = pa.compute
+    if after is not None:
+        # nothing newer than the cursor can be on this page; lets month pruning kick in
+        after_ts, after_id = _naive(after[0]), after[1]
+        bound = after_ts + timedelta(microseconds=1)
+        end = bound if end is None else min(_naive(end), bound)
+    expr = _filter(pa, [employee_id] if employee_id is not None else None, location, method, start, end)
+    if after is not None:
+        ts = pa.scalar(after_ts, pa.timestamp('us'))
+        keyset = (pa.dataset.field('created_at') < ts) | (
+            (pa.dataset.field('created_at') == ts) & (pa.dataset.field('id') < after_id))
+        expr = keyset if expr is None else expr & keyset
+
+    sort_keys = [('created_at', 'descending'), ('id', 'descending')]
+    best = None
+    for batch in _dataset(pa).to_batches(columns=list(COLUMNS), filter=expr):
+        if batch.num_rows == 0:
+            continue
+        table = pa.Table.from_batches([batch])
+        best = table if best is None else pa.concat_tables([best, table])
+        if best.num_rows > limit:
+            best = best.take(pc.select_k_unstable(best, k=limit, sort_keys=sort_keys))
+    if best is None:
+        return []
+    best = best.sort_by(sort_keys).slice(0, limit)
+    return [Attendance(**row) for row in best.to_pylist()]
+
+
+def cold_punch(month: date, attendance_id: int) -> Optional[Attendance]:
+    """One archived punch by id, read from its month's partition."""
+    if not _has_files():
+        return None
+    pa = _pyarrow()
+    field = pa.dataset.field
+    expr = (field('month') == f"{month:%Y-%m}") & (field('id') == attendance_id)
+    rows = _dataset(pa).to_table(columns=list(COLUMNS), filter=expr).to_pylist()
+    return Attendance(**rows[0]) if rows else None
+
+
+def iter_cold_punches(employee_ids=None, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      columns: Iterable[str] = ('employee_id', 'created_at', 'direction'),
+                      location=None, method=None) -> Iterator[tuple]:
+    """Archived punches as tuples of ``columns``, ordered by (employee_id, created_at, id).
+
+    Each part file is already in that order; parts are merged lazily, batch
+    by batch, so a year of history streams without being loaded at once.
+    """
+    if not _has_files():
+        return iter(())
+    pa = _pyarrow()
+    columns = list(columns)
+    wanted = columns + [c for c in ('employee_id', 'created_at', 'id') if c not in columns]
+    expr = _filter(pa, employee_ids, location, method, start=start, end=end)
+    order = [wanted.index(c) for c in ('employee_id', 'created_at', 'id')]
+
+    dataset = _dataset(pa)
+
+    def rows(fragment):
+        for batch in fragment.to_batches(schema=dataset.schema, columns=wanted, filter=expr):
+            data = batch.to_pydict()
+            for values in zip(*(data[c] for c in wanted)):
+                yield values
+
+    streams = [rows(fragment) for fragment in dataset.get_fragments(filter=expr)]
+    merged = heapq.merge(*streams, key=lambda r: tuple(r[i] for i in order))
+    width = len(columns)
+    return (r[:width] for r in merged)
+
+
+def merge_punch_streams(hot: Iterable[tuple], cold: Iterable[tuple]) -> Iterator[tuple]:
+    """Merge hot and cold ``(employee_id, created_at, ...)`` streams, both in that order."""
+    return heapq.merge(hot, cold, key=lambda r: (r[0], r[1]))
+
+
+def archived_months(db: Session) -> List[date]:
+    return [m for (m,) in db.query(AttendanceArchive.month).distinct().order_by(AttendanceArchive.month)]
+
+
+def in_cold_range(db: Session, start: Optional[datetime]) -> bool:
+    """True when a read starting at ``start`` may need archived punches."""
+    horizon = cold_horizon(db)
+    return horizon is not None and (start is None or _naive(start) <= horizon)
+
+
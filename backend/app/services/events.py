@@ -0,0 +1,102 @@
+"""In-process pub/sub for live attendance events.
+
+Writers call ``broker.publish`` from any thread once a punch has committed.
+Each subscriber (an open SSE connection) gets its own bounded asyncio queue.
+A subscriber that falls behind is disconnected instead of buffering without
+limit; it reconnects with ``Last-Event-ID`` and replays what it missed from
+the broker's recent history (or the database, for older gaps).
+
+Event ids are attendance row ids. The broker only sees punches committed by
+this process, so with several workers each dashboard sees the punches its
+own worker handled.
+"""
+import asyncio
+import threading
+from collections import deque
+from typing import List
+
+from app.core.config import settings
+
+OVERFLOW = object()
+
+
+class Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def _push(self, item):
+        # runs on the subscriber's event loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+
+
+class EventBroker:
+    def __init__(self, history: int = 1000, queue_size: int = 256):
+        self.queue_size = queue_size
+        self._history = deque(maxlen=history)  # (id, event, data)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    def publish(self, event_id: int, event: str, data: dict):
+        item = (event_id, event, data)
+        with self._lock:
+            self._history.append(item)
+            self.published += 1
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub._push, item)
+            except RuntimeError:
+                # the subscriber's loop has shut down
+                self.unsubscribe(sub)
+
+    def subscribe(self) -> Subscriber:
+        sub = Subscriber(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        with self._lock:
+            self._subscribers.discard(sub)
+            if sub.overflowed:
+                self.dropped_subscribers += 1
+
+    def replay(self, last_event_id: int):
+        """Events after ``last_event_id`` still in history, plus the oldest id history holds.
+
+        When that oldest id is above ``last_event_id + 1`` some events may have
+        aged out; the caller fills the gap from the database.
+        """
+        with self._lock:
+            items = list(self._history)
+        missed = [item for item in items if item[0] > last_event_id]
+        return missed, (items[0][0] if items else None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'history': len(self._history),
+                'dropped_subscribers': self.dropped_subscribers,
+            }
+
+
+broker = EventBroker(settings.EVENT_HISTORY_SIZE, settings.EVENT_QUEUE_SIZE)
+
+
+def publish_attendance(records: List[dict]):
+    for record in records:
+        broker.publish(record['id'], 'attendance', record)
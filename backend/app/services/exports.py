@@ -0,0 +1,292 @@
+"""Streaming attendance exports (CSV, gzipped CSV, Parquet).
+
+Rows come from a server-side cursor over the hot table merged with archived
+months, in (employee_id, created_at) order, and are encoded batch by batch,
+so memory stays flat however long the range is.
+
+While a response streams, its bytes are also written to a spool file, and
+retries and ``Range`` requests are served from that file once it is
+complete. If the client drops halfway through a year of punches, the rest of
+the export is still written to the spool in the background, so the client can
+resume at the byte it stopped at and get identical bytes.
+
+An export is identified by its format, its filters and ``data_version``.
+Punches are only ever inserted or archived, and an export reads no row newer
+than the version it was keyed with, so a spool never goes stale: new
+check-ins or an archive run change the key instead.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Iterator, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.core.database import ReadSessionLocal
+from app.crud.version import latest_attendance_id
+from app.models.attendance import Attendance, AttendanceArchive
+from app.services.cold_storage import _naive, _pyarrow, in_cold_range, iter_cold_punches, merge_punch_streams
+
+# employee_id and created_at first: merge_punch_streams orders on them
+EXPORT_COLUMNS = ('employee_id', 'created_at', 'id', 'direction', 'method', 'location', 'shift', 'confidence_score')
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'csv.gz': ('application/gzip', 'csv.gz'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def data_version(db) -> Tuple[int, int]:
+    """``(newest punch id, archived part count)``; changes whenever the rows an export could read change."""
+    parts = db.execute(select(func.count(AttendanceArchive.id))).scalar() or 0
+    return latest_attendance_id(db), parts
+
+
+def iter_export_rows(db, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     employee_id=None, location=None, method=None, through_id: Optional[int] = None,
+                     batch_size: int = 5000) -> Iterator[tuple]:
+    query = select(*[getattr(Attendance, c) for c in EXPORT_COLUMNS])
+    if through_id is not None:
+        query = query.where(Attendance.id <= through_id)
+    if employee_id is not None:
+        query = query.where(Attendance.employee_id == employee_id)
+    if location is not None:
+        query = query.where(Attendance.location == location)
+    if method is not None:
+        query = query.where(Attendance.method == method)
+    if start is not None:
+        query = query.where(Attendance.created_at >= start)
+    if end is not None:
+        query = query.where(Attendance.created_at < end)
+    query = query.order_by(Attendance.employee_id, Attendance.created_at, Attendance.id)
+    result = db.execute(query.execution_options(stream_results=True, yield_per=batch_size))
+    hot = ((r[0], _naive(r[1])) + tuple(r[2:]) for r in result)
+    if not in_cold_range(db, start):
+        return hot
+    cold = iter_cold_punches([employee_id] if employee_id is not None else None, start=start, end=end,
+                             columns=EXPORT_COLUMNS, location=location, method=method)
+    return merge_punch_streams(hot, cold)
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def csv_chunks(rows, batch_size: int) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in _batches(rows, batch_size):
+        writer.writerows((r[0], r[1].isoformat()) + r[2:] for r in batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file object that hands ParquetWriter output back in pieces."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def parquet_chunks(rows, batch_size: int) -> Iterator[bytes]:
+    pa = _pyarrow()
+    schema = pa.schema([
+        ('employee_id', pa.string()),
+        ('created_at', pa.timestamp('us')),
+        ('id', pa.int64()),
+        ('direction', pa.string()),
+        ('method', pa.string()),
+        ('location', pa.string()),
+        ('shift', pa.string()),
+        ('confidence_score', pa.float64()),
+    ])
+    sink = _Sink()
+    writer = pa.parquet.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for batch in _batches(rows, batch_size):
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays([pa.array(c, type=f.type) for c, f in zip(columns, schema)],
+                                                    schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_id(fmt: str, version: Tuple[int, int], **filters) -> str:
+    """Identifier for an export of the data at ``version``; doubles as its ETag and spool name."""
+    normalized = {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in filters.items() if v is not None}
+    raw = json.dumps([fmt, version, normalized], sort_keys=True).encode()
+    return hashlib.sha1(raw).hexdigest()
+
+
+def spool_path(export_key: str, fmt: str) -> str:
+    return os.path.join(os.path.abspath(settings.EXPORT_SPOOL_DIR), f"{export_key}.{FORMATS[fmt][1]}")
+
+
+def completed_spool(export_key: str, fmt: str) -> Optional[str]:
+    """Path of a finished, still-fresh spool file for this export, if any."""
+    path = spool_path(export_key, fmt)
+    try:
+        age = time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
+    if age > settings.EXPORT_SPOOL_TTL_SECONDS:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+    return path
+
+
+_finisher = None
+_finisher_lock = threading.Lock()
+
+
+def _finish_pool() -> ThreadPoolExecutor:
+    global _finisher
+    if _finisher is None:
+        with _finisher_lock:
+            if _finisher is None:
+                _finisher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="export-spool")
+    return _finisher
+
+
+def _finish_spool(chunks, spool, db, tmp_path: str, final_path: str):
+    """Write the rest of an interrupted export to its spool so the client can resume it."""
+    complete = False
+    try:
+        for chunk in chunks:
+            spool.write(chunk)
+        complete = True
+    finally:
+        spool.close()
+        db.close()
+        if complete:
+            os.replace(tmp_path, final_path)
+        else:
+            os.remove(tmp_path)
+
+
+def stream_export(fmt: str, export_key: str, filters: dict) -> Iterator[bytes]:
+    """Encode the export while teeing it to the spool file.
+
+    Opens its own session so the cursor outlives the request's dependencies.
+    The spool file only becomes visible (by rename) once the last byte is
+    written; when the client goes away first, the remaining chunks are
+    written on a background thread instead of being thrown away.
+    """
+    final_path = spool_path(export_key, fmt)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    tmp_path = f"{final_path}.{os.getpid()}.{id(filters)}.part"
+    db = ReadSessionLocal()
+    spool = open(tmp_path, 'wb')
+    complete = handed_off = False
+    try:
+        rows = iter_export_rows(db, batch_size=settings.EXPORT_BATCH_SIZE, **filters)
+        if fmt == 'parquet':
+            chunks = parquet_chunks(rows, settings.EXPORT_BATCH_SIZE)
+        else:
+            chunks = csv_chunks(rows, settings.EXPORT_BATCH_SIZE)
+            if fmt == 'csv.gz':
+                chunks = gzip_chunks(chunks)
+        for chunk in chunks:
+            spool.write(chunk)
+            try:
+                yield chunk
+            except GeneratorExit:
+                # client disconnected: finish the spool so a Range retry can pick up where it stopped
+                _finish_pool().submit(_finish_spool, chunks, spool, db, tmp_path, final_path)
+                handed_off = True
+                raise
+        complete = True
+    finally:
+        if not handed_off:
+            spool.close()
+            db.close()
+            if complete:
+                os.replace(tmp_path, final_path)
+            else:
+                os.remove(tmp_path)
+
+
+def read_file_range(path: str, start: int = 0, end: Optional[int] = None, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+    """Yield bytes ``start..end`` (inclusive) of a spooled export."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            data = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not data:
+                break
+            if remaining is not None:
+                remaining -= len(data)
+            yield data
+
+
+def parse_range(header: Optional[str], size: int):
+    """Parse a single ``bytes=`` range against ``size``; None if absent/unsupported, ValueError if unsatisfiable."""
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    first, _, last = header[len('bytes='):].strip().partition('-')
+    if first == '':
+        if not last:
+            return None
+        length = int(last)
+        if length <= 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, min(end, size - 1)
@@ -0,0 +1,65 @@
+"""Failed-login throttling, per account and per client IP.
+
+Failures are counted in the shared store. Each new failure restarts the
+``LOGIN_FAILURE_WINDOW_SECONDS`` window. Once an account or an IP reaches
+its limit, logins from it are refused with a 429 before any password is
+hashed, so guessing costs the attacker a request and costs us no CPU.
+A successful login clears the account's count. The IP's count is kept,
+because one address may be guessing several accounts.
+"""
+import logging
+from functools import wraps
+from typing import Optional
+
+from app.core.config import settings
+from app.core.kvstore import get_store
+from app.core.metrics import LOGIN_THROTTLED
+
+logger = logging.getLogger(__name__)
+
+
+def _best_effort(fn):
+    # without the shared store logins go unthrottled rather than failing
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            logger.exception("login throttle store unavailable")
+            return None
+    return wrapper
+
+
+def _account_key(username: str) -> str:
+    return f"login-fail:user:{username.strip().lower()}"
+
+
+def _ip_key(ip: str) -> str:
+    return f"login-fail:ip:{ip}"
+
+
+@_best_effort
+def retry_after(username: str, ip: str) -> Optional[int]:
+    """Seconds to wait before trying again, or None when the login may proceed."""
+    store = get_store()
+    for scope, key, limit in (
+        ("account", _account_key(username), settings.LOGIN_MAX_FAILURES_PER_ACCOUNT),
+        ("ip", _ip_key(ip), settings.LOGIN_MAX_FAILURES_PER_IP),
+    ):
+        if limit > 0 and (store.get(key) or 0) >= limit:
+            LOGIN_THROTTLED.labels(scope).inc()
+            return settings.LOGIN_FAILURE_WINDOW_SECONDS
+    return None
+
+
+@_best_effort
+def record_failure(username: str, ip: str):
+    store = get_store()
+    window = settings.LOGIN_FAILURE_WINDOW_SECONDS
+    store.incr(_account_key(username), ttl=window)
+    store.incr(_ip_key(ip), ttl=window)
+
+
+@_best_effort
+def record_success(username: str):
+    get_store().delete(_account_key(username))
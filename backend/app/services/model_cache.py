@@ -0,0 +1,37 @@
+"""Trained models loaded from disk once per process.
+
+The prediction routes used to ``joblib.load`` their model on every request.
+Loaded models are kept here and reloaded only when the file's mtime
+changes, so retraining still takes effect without a restart.
+"""
+import os
+import threading
+from typing import Any, Optional
+
+from app.core.metrics import record_cache
+
+_models = {}  # path -> (mtime, model)
+_lock = threading.Lock()
+
+
+def load_joblib(path: str) -> Optional[Any]:
+    """The object stored at ``path``, or None when the file does not exist. Load errors propagate."""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _models.get(path)
+    if cached is not None and cached[0] == mtime:
+        record_cache("model", True)
+        return cached[1]
+    with _lock:
+        cached = _models.get(path)
+        if cached is not None and cached[0] == mtime:
+            record_cache("model", True)
+            return cached[1]
+        record_cache("model", False)
+        import joblib  # pulls in numpy; only once a model is needed
+
+        model = joblib.load(path)
+        _models[path] = (mtime, model)
+        return model
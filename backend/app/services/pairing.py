@@ -0,0 +1,156 @@
+"""Turn a time-ordered stream of punches into check-in/check-out sessions.
+
+The pairer keeps one open session per employee and decides everything from
+the punch it is looking at, so a whole range of punches (all employees mixed,
+ordered by time, or grouped by employee and then time) is paired in a single
+pass without per-employee queries.
+
+Rules:
+  * a punch within ``duplicate_window`` of the employee's previous punch in the
+    same direction is a duplicate scan and is only counted;
+  * a punch without a direction (older rows) is an ``out`` if the employee has
+    an open session, otherwise an ``in``;
+  * an ``in`` while a session is open closes that session as ``missing_out``;
+  * an ``out`` with no open session (or one older than ``max_session``) becomes
+    a ``missing_in`` session;
+  * sessions may cross midnight (overnight shifts) and belong to the day of
+    their check-in.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+IN = 'in'
+OUT = 'out'
+
+COMPLETE = 'complete'
+MISSING_OUT = 'missing_out'
+MISSING_IN = 'missing_in'
+
+
+class WorkSession:
+    __slots__ = ('employee_id', 'check_in', 'check_out', 'status', 'punches', 'location')
+
+    def __init__(self, employee_id, check_in=None, check_out=None, status=COMPLETE, punches=1, location=None):
+        self.employee_id = employee_id
+        self.check_in = check_in
+        self.check_out = check_out
+        self.status = status
+        self.punches = punches
+        self.location = location  # site of the check-in (of the check-out for missing_in)
+
+    @property
+    def work_date(self):
+        return (self.check_in or self.check_out).date()
+
+    @property
+    def minutes(self) -> int:
+        if self.status != COMPLETE:
+            return 0
+        return int((self.check_out - self.check_in).total_seconds() // 60)
+
+    def as_dict(self) -> dict:
+        return {
+            'employee_id': self.employee_id,
+            'work_date': self.work_date,
+            'check_in': self.check_in,
+            'check_out': self.check_out,
+            'status': self.status,
+            'punches': self.punches,
+            'worked_minutes': self.minutes,
+        }
+
+    def __repr__(self):
+        return f"WorkSession({self.employee_id!r}, {self.check_in}, {self.check_out}, {self.status!r})"
+
+
+class PunchPairer:
+    """Incremental pairing state; feed punches in time order per employee."""
+
+    def __init__(self, max_session: timedelta = timedelta(hours=16),
+                 duplicate_window: timedelta = timedelta(minutes=2)):
+        self.max_session = max_session
+        self.duplicate_window = duplicate_window
+        self.duplicates = 0
+        # employee_id -> open WorkSession
+        self._open: Dict[str, WorkSession] = {}
+        # employee_id -> (time, direction) of the last accepted punch
+        self._last: Dict[str, Tuple[datetime, str]] = {}
+
+    def feed(self, employee_id: str, ts: datetime, direction: Optional[str] = None,
+             location: Optional[str] = None) -> List[WorkSession]:
+        """Consume one punch; returns the sessions it closed (usually zero or one)."""
+        open_session = self._open.get(employee_id)
+        last = self._last.get(employee_id)
+        if last is not None and ts - last[0] <= self.duplicate_window and direction in (None, last[1]):
+            self.duplicates += 1
+            if open_session is not None and last[1] == IN:
+                open_session.punches += 1
+            return []
+
+        if open_session is not None and ts - open_session.check_in > self.max_session:
+            # nobody works this long: the employee forgot to check out
+            open_session.status = MISSING_OUT
+            del self._open[employee_id]
+            closed = [open_session]
+            open_session = None
+        else:
+            closed = []
+
+        if direction is None:
+            direction = OUT if open_session is not None else IN
+        self._last[employee_id] = (ts, direction)
+
+        if direction == IN:
+            if open_session is not None:
+                open_session.status = MISSING_OUT
+                closed.append(open_session)
+            self._open[employee_id] = WorkSession(employee_id, check_in=ts, status=MISSING_OUT, location=location)
+        elif open_session is not None:
+            del self._open[employee_id]
+            open_session.check_out = ts
+            open_session.status = COMPLETE
+            open_session.punches += 1
+            closed.append(open_session)
+        else:
+            closed.append(WorkSession(employee_id, check_out=ts, status=MISSING_IN, location=location))
+        return closed
+
+    def expire(self, now: datetime) -> List[WorkSession]:
+        """Close sessions that can no longer receive a check-out; bounds memory on long streams."""
+        stale = [emp for emp, s in self._open.items() if now - s.check_in > self.max_session]
+        closed = [self._open.pop(emp) for emp in stale]
+        for emp in stale:
+            self._last.pop(emp, None)
+        return closed
+
+    def flush(self) -> List[WorkSession]:
+        """Close every open session (status ``missing_out``) at the end of a stream."""
+        closed = list(self._open.values())
+        self._open.clear()
+        self._last.clear()
+        return closed
+
+
+def pair_punches(punches: Iterable[tuple], expire_every: int = 100000, **options) -> Iterator[WorkSession]:
+    """Pair ``(employee_id, ts, direction[, location])`` punches ordered by time.
+
+    Sessions are yielded as soon as they close, so callers can aggregate
+    while streaming rows from the database.
+    """
+    pairer = PunchPairer(**options)
+    feed = pairer.feed
+    count = 0
+    for punch in punches:
+        yield from feed(*punch)
+        count += 1
+        if count % expire_every == 0:
+            yield from pairer.expire(punch[1])
+    yield from pairer.flush()
+
+
+def worked_minutes_by_day(sessions: Iterable[WorkSession]) -> Dict[Tuple[str, object], int]:
+    totals: Dict[Tuple[str, object], int] = {}
+    for s in sessions:
+        key = (s.employee_id, s.work_date)
+        totals[key] = totals.get(key, 0) + s.minutes
+    return totals
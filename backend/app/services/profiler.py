@@ -0,0 +1,218 @@
+"""Statistical sampling profiler for live requests.
+
+A sampler thread wakes every few milliseconds, reads the stack of every
+thread with ``sys._current_frames()`` and keeps the stacks that are inside a
+route's endpoint function, cut at that function. That picks out the worker
+thread running a sync route, or the event loop while an async route is
+actually executing. Nothing is traced, so profiled code runs at normal
+speed. Dependencies (auth, sessions) run outside the endpoint and are not
+sampled.
+
+Two modes:
+
+* one request: ``RequestProfile`` samples only the threads running that
+  request's endpoint, and the result is saved under ``PROFILE_DIR`` as
+  collapsed stacks (``a;b;c 12`` per line). flamegraph.pl, speedscope and
+  inferno all read that format.
+* global: when ``PROFILE_GLOBAL_HZ`` is above zero, one low-rate sampler runs
+  all the time and counts stacks per route template, for
+  ``report()``.
+"""
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+
+_SAFE_NAME = re.compile(r"[^A-Za-z0-9_.-]+")
+
+# endpoint code object -> route template, filled in from the app on first request
+_endpoint_routes: Dict[object, str] = {}
+
+
+def register_routes(app):
+    """Map every endpoint function of ``app`` to its path template (once)."""
+    if _endpoint_routes:
+        return
+    for route in getattr(getattr(app, "router", None), "routes", ()):
+        code = getattr(getattr(route, "endpoint", None), "__code__", None)
+        if code is not None:
+            _endpoint_routes.setdefault(code, route.path)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def _stack_from(frame, stop_codes) -> Optional[tuple]:
+    """Collapsed stack (root first) from the outermost frame whose code is in ``stop_codes``; None if absent."""
+    names = []
+    root_code = None
+    while frame is not None:
+        names.append(_frame_name(frame))
+        if frame.f_code in stop_codes:
+            root_code = frame.f_code
+            cut = len(names)
+        frame = frame.f_back
+    if root_code is None:
+        return None
+    return root_code, ";".join(reversed(names[:cut]))
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, interval: float, name: str):
+        super().__init__(name=name, daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def sample(self, frames):
+        raise NotImplementedError
+
+    def run(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            frames = sys._current_frames()
+            frames.pop(own, None)
+            self.sample(frames)
+
+    def stop(self):
+        self.stopped.set()
+
+
+class RequestProfile(_Sampler):
+    """Samples the threads running the endpoint of one request until ``finish()``."""
+
+    def __init__(self, scope: dict):
+        super().__init__(settings.PROFILE_INTERVAL_MS / 1000, name="request-profiler")
+        self.id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.scope = scope
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def sample(self, frames):
+        code = getattr(self.scope.get("endpoint"), "__code__", None)
+        if code is None:
+            return
+        self.samples += 1
+        for frame in frames.values():
+            found = _stack_from(frame, (code,))
+            if found is not None:
+                self.stacks[found[1]] += 1
+
+    def finish(self, route: str) -> Optional[str]:
+        """Stop sampling and save the collapsed stacks; returns the path, or None without samples."""
+        self.stop()
+        self.join(timeout=1)
+        self.seconds = time.perf_counter() - self.started
+        if not self.stacks:
+            return None
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        path = os.path.join(settings.PROFILE_DIR, f"{self.id}.collapsed")
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(f"# route {route}; {self.seconds * 1000:.1f} ms; {sum(self.stacks.values())} samples "
+                     f"every {settings.PROFILE_INTERVAL_MS} ms\n")
+            for stack, count in self.stacks.most_common():
+                fh.write(f"{stack} {count}\n")
+        _prune(settings.PROFILE_DIR, settings.PROFILE_KEEP)
+        return path
+
+
+class GlobalSampler(_Sampler):
+    """Low-rate sampler that counts stacks under whichever route's endpoint they are in."""
+
+    def __init__(self, hz: float, max_stacks: int):
+        super().__init__(1 / hz, name="global-profiler")
+        self.max_stacks = max_stacks
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.routes = defaultdict(Counter)
+            self.samples = 0
+            self.since = datetime.utcnow()
+
+    def sample(self, frames):
+        if not _endpoint_routes:
+            return
+        codes = _endpoint_routes.keys()
+        with self._lock:
+            self.samples += 1
+            for frame in frames.values():
+                found = _stack_from(frame, codes)
+                if found is None:
+                    continue
+                stacks = self.routes[_endpoint_routes[found[0]]]
+                if found[1] in stacks or len(stacks) < self.max_stacks:
+                    stacks[found[1]] += 1
+                else:
+                    stacks["(other stacks)"] += 1
+
+    def report(self, route: Optional[str] = None, top: int = 0) -> List[str]:
+        """Collapsed stacks prefixed with their route, hottest first."""
+        with self._lock:
+            lines = [f"# {self.samples} sampler ticks since {self.since:%Y-%m-%dT%H:%M:%SZ}"]
+            for name, stacks in sorted(self.routes.items()):
+                if route and name != route:
+                    continue
+                for stack, count in (stacks.most_common(top) if top else stacks.most_common()):
+                    lines.append(f"{name};{stack} {count}")
+        return lines
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "since": self.since,
+                "ticks": self.samples,
+                "routes": {name: sum(stacks.values()) for name, stacks in self.routes.items()},
+            }
+
+
+def _prune(directory: str, keep: int):
+    files = sorted(f for f in os.listdir(directory) if f.endswith(".collapsed"))
+    for name in files[:-keep] if keep else ():
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def list_profiles() -> List[dict]:
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(settings.PROFILE_DIR), reverse=True):
+        if name.endswith(".collapsed"):
+            path = os.path.join(settings.PROFILE_DIR, name)
+            with open(path, encoding="utf-8") as fh:
+                header = fh.readline().lstrip("# ").strip()
+            profiles.append({"id": name[:-len(".collapsed")], "summary": header, "bytes": os.path.getsize(path)})
+    return profiles
+
+
+def profile_path(profile_id: str) -> Optional[str]:
+    """Path of a saved profile, or None for unknown ids (and anything that is not a plain name)."""
+    if _SAFE_NAME.search(profile_id) or profile_id.startswith("."):
+        return None
+    path = os.path.join(settings.PROFILE_DIR, profile_id + ".collapsed")
+    return path if os.path.isfile(path) else None
+
+
+global_sampler: Optional[GlobalSampler] = None
+
+
+def start_global_sampler():
+    global global_sampler
+    if settings.PROFILE_GLOBAL_HZ > 0 and global_sampler is None:
+        global_sampler = GlobalSampler(settings.PROFILE_GLOBAL_HZ, settings.PROFILE_MAX_STACKS)
+        global_sampler.start()
+    return global_sampler
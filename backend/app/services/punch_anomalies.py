@@ -0,0 +1,185 @@
+"""Streaming buddy-punching detector.
+
+Every committed punch is fed through ``detector.observe``. For each employee
+the detector keeps the punches of the last ``ANOMALY_WINDOW_MINUTES`` (at
+most ``MAX_RECENT``) and a few counts of the sites they usually punch at, and
+compares the new punch against that state only:
+
+* ``impossible_travel``: the same employee at two sites further apart than
+  ``ANOMALY_MAX_SPEED_KMH`` allows for the time between the punches. Sites
+  without coordinates in ``SITE_COORDINATES`` are treated as unreachable
+  within ``ANOMALY_MIN_TRAVEL_MINUTES``.
+* ``weak_face_unusual_site``: a face match scoring just above the match
+  threshold at a site the employee has rarely or never used.
+
+Employee state is an LRU capped at ``ANOMALY_MAX_EMPLOYEES`` and alerts a
+ring of ``ANOMALY_MAX_ALERTS``, so memory stays bounded however many punches
+flow through. State is per process; after a restart it rebuilds from new
+punches.
+"""
+import json
+import logging
+import math
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_RECENT = 16
+MAX_SITES = 8
+MIN_HISTORY = 5  # punches seen before a site can count as unusual
+
+IMPOSSIBLE_TRAVEL = 'impossible_travel'
+WEAK_FACE_UNUSUAL_SITE = 'weak_face_unusual_site'
+
+
+def haversine_km(a, b) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+
+def _site_coordinates() -> Dict[str, tuple]:
+    try:
+        raw = json.loads(settings.SITE_COORDINATES or '{}')
+        return {site: (float(lat), float(lon)) for site, (lat, lon) in raw.items()}
+    except (ValueError, TypeError):
+        logger.warning("Ignoring malformed SITE_COORDINATES")
+        return {}
+
+
+class _EmployeeState:
+    __slots__ = ('recent', 'sites', 'seen')
+
+    def __init__(self):
+        self.recent = deque(maxlen=MAX_RECENT)  # (created_at, location, punch id)
+        self.sites = {}  # location -> count, at most MAX_SITES entries
+        self.seen = 0
+
+    def usual(self, location) -> bool:
+        return self.seen < MIN_HISTORY or self.sites.get(location, 0) * 5 >= self.seen
+
+    def remember(self, ts, location, punch_id):
+        self.recent.append((ts, location, punch_id))
+        self.seen += 1
+        if location in self.sites or len(self.sites) < MAX_SITES:
+            self.sites[location] = self.sites.get(location, 0) + 1
+        else:
+            # forget the rarest site to make room
+            rarest = min(self.sites, key=self.sites.get)
+            del self.sites[rarest]
+            self.sites[location] = 1
+
+
+class PunchAnomalyDetector:
+    def __init__(self, window: timedelta, max_speed_kmh: float, min_travel: timedelta,
+                 coordinates: Dict[str, tuple], face_threshold: float, face_margin: float,
+                 max_employees: int = 50000, max_alerts: int = 1000):
+        self.window = window
+        self.max_speed_kmh = max_speed_kmh
+        self.min_travel = min_travel
+        self.coordinates = coordinates
+        self.face_threshold = face_threshold
+        self.face_margin = face_margin
+        self.max_employees = max_employees
+        self._employees: OrderedDict = OrderedDict()
+        self._alerts = deque(maxlen=max_alerts)
+        self._next_alert = 1
+        self._lock = threading.Lock()
+        self.observed = 0
+
+    def _state(self, employee_id) -> _EmployeeState:
+        state = self._employees.get(employee_id)
+        if state is None:
+            state = self._employees[employee_id] = _EmployeeState()
+            if len(self._employees) > self.max_employees:
+                self._employees.popitem(last=False)
+        else:
+            self._employees.move_to_end(employee_id)
+        return state
+
+    def _unreachable(self, ts, location, other_ts, other_location) -> Optional[dict]:
+        if not location or not other_location or location == other_location:
+            return None
+        gap = abs((ts - other_ts).total_seconds())
+        a, b = self.coordinates.get(location), self.coordinates.get(other_location)
+        if a is not None and b is not None:
+            distance = haversine_km(a, b)
+            if distance * 3600 > self.max_speed_kmh * gap:
+                return {'distance_km': round(distance, 2), 'seconds_apart': int(gap)}
+            return None
+        if gap < self.min_travel.total_seconds():
+            return {'distance_km': None, 'seconds_apart': int(gap)}
+        return None
+
+    def _alert(self, kind: str, punch: dict, **details) -> dict:
+        alert = {
+            'id': self._next_alert,
+            'kind': kind,
+            'employee_id': punch['employee_id'],
+            'attendance_id': punch.get('id'),
+            'location': punch.get('location'),
+            'created_at': punch['created_at'],
+            'detected_at': datetime.utcnow(),
+            **details,
+        }
+        self._next_alert += 1
+        self._alerts.append(alert)
+        return alert
+
+    def observe(self, punch: dict) -> List[dict]:
+        """Feed one committed punch (``employee_id``, ``created_at``, ``location``, ...); returns new alerts."""
+        ts, location = punch['created_at'], punch.get('location')
+        raised = []
+        with self._lock:
+            self.observed += 1
+            state = self._state(punch['employee_id'])
+            while state.recent and ts - state.recent[0][0] > self.window:
+                state.recent.popleft()
+            # compared against every punch still in the window, so late-synced punches are checked too
+            for other_ts, other_location, other_id in state.recent:
+                if abs(ts - other_ts) > self.window:
+                    continue
+                conflict = self._unreachable(ts, location, other_ts, other_location)
+                if conflict:
+                    raised.append(self._alert(IMPOSSIBLE_TRAVEL, punch, other_attendance_id=other_id,
+                                              other_location=other_location, **conflict))
+                    break
+            score = punch.get('confidence_score')
+            if (punch.get('method') == 'face' and score is not None
+                    and self.face_threshold <= score < self.face_threshold + self.face_margin
+                    and not state.usual(location)):
+                raised.append(self._alert(WEAK_FACE_UNUSUAL_SITE, punch, confidence_score=score))
+            state.remember(ts, location, punch.get('id'))
+        return raised
+
+    def alerts(self, since_id: int = 0, limit: int = 100) -> List[dict]:
+        with self._lock:
+            return [a for a in self._alerts if a['id'] > since_id][:limit]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'observed': self.observed, 'tracked_employees': len(self._employees),
+                    'alerts_held': len(self._alerts), 'alerts_raised': self._next_alert - 1}
+
+
+detector = PunchAnomalyDetector(
+    window=timedelta(minutes=settings.ANOMALY_WINDOW_MINUTES),
+    max_speed_kmh=settings.ANOMALY_MAX_SPEED_KMH,
+    min_travel=timedelta(minutes=settings.ANOMALY_MIN_TRAVEL_MINUTES),
+    coordinates=_site_coordinates(),
+    face_threshold=settings.FACE_MATCH_THRESHOLD,
+    face_margin=settings.ANOMALY_FACE_MARGIN,
+    max_employees=settings.ANOMALY_MAX_EMPLOYEES,
+    max_alerts=settings.ANOMALY_MAX_ALERTS,
+)
+
+
+def observe_punches(punches: List[dict]):
+    for punch in sorted(punches, key=lambda p: p['created_at']):
+        for alert in detector.observe(punch):
+            logger.warning("Punch anomaly %s for employee %s", alert['kind'], alert['employee_id'])
@@ -0,0 +1,119 @@
+"""Drop repeat scans before they reach the database.
+
+The first punch of an employee in a given direction is remembered in the
+shared store for ``PUNCH_SUPPRESSION_WINDOW_SECONDS``. A second scan inside
+the window gets that punch back instead of writing a new row. The slot is
+claimed before the insert, so two kiosks scanning the same person at once
+still produce one row.
+"""
+import logging
+import threading
+import time
+from functools import wraps
+from typing import Optional
+
+from app.core.config import settings
+from app.core.kvstore import get_store
+
+PENDING = {'pending': True}
+STATS_KEY = 'punch-suppression:count'
+
+_local_counts = {'suppressed': 0}
+_counts_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+
+
+def _best_effort(fn):
+    # the shared store is an optimisation; if it is unavailable punches are simply written
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            logger.exception("punch suppression store unavailable")
+            return None
+    return wrapper
+
+
+def _key(employee_id: str, direction: str) -> str:
+    return f"punch-suppression:{direction}:{employee_id}"
+
+
+def _count(direction: str):
+    store = get_store()
+    store.incr(STATS_KEY)
+    store.incr(f"{STATS_KEY}:{direction}")
+    with _counts_lock:
+        _local_counts['suppressed'] += 1
+
+
+@_best_effort
+def claim(employee_id: str, direction: str, wait: float = 1.0) -> Optional[dict]:
+    """Claim the employee's window; returns the original punch if this scan is a duplicate.
+
+    A None return means the caller owns the window and must either
+    ``remember`` the punch it writes or ``release`` the claim.
+    """
+    window = settings.PUNCH_SUPPRESSION_WINDOW_SECONDS
+    if window <= 0:
+        return None
+    store = get_store()
+    key = _key(employee_id, direction)
+    existing = store.add(key, PENDING, ttl=window)
+    deadline = time.monotonic() + wait
+    while existing == PENDING and time.monotonic() < deadline:
+        # the first scan is still being written; its record is moments away
+        time.sleep(0.02)
+        existing = store.get(key)
+        if existing is None:
+            existing = store.add(key, PENDING, ttl=window)
+    if existing is None or existing == PENDING:
+        return None
+    _count(direction)
+    return existing
+
+
+@_best_effort
+def remember(att):
+    window = settings.PUNCH_SUPPRESSION_WINDOW_SECONDS
+    if window <= 0:
+        return
+    record = {
+        'id': att.id,
+        'employee_id': att.employee_id,
+        'method': att.method,
+        'confidence_score': att.confidence_score,
+        'location': att.location,
+        'shift': att.shift,
+        'direction': att.direction,
+        'created_at': att.created_at.isoformat(),
+    }
+    get_store().set(_key(att.employee_id, att.direction), record, ttl=window)
+
+
+@_best_effort
+def release(employee_id: str, direction: str):
+    if settings.PUNCH_SUPPRESSION_WINDOW_SECONDS > 0:
+        get_store().delete(_key(employee_id, direction))
+
+
+@_best_effort
+def _shared_counts() -> dict:
+    store = get_store()
+    return {
+        'suppressed_total': store.get(STATS_KEY, 0),
+        'suppressed_check_in': store.get(f"{STATS_KEY}:in", 0),
+        'suppressed_check_out': store.get(f"{STATS_KEY}:out", 0),
+    }
+
+
+def suppression_stats() -> dict:
+    # without the shared store only this worker's count is known; the shared ones read as zero
+    shared = _shared_counts() or {'suppressed_total': 0, 'suppressed_check_in': 0, 'suppressed_check_out': 0}
+    with _counts_lock:
+        local = _local_counts['suppressed']
+    return {
+        'window_seconds': settings.PUNCH_SUPPRESSION_WINDOW_SECONDS,
+        **shared,
+        'suppressed_this_worker': local,
+    }
@@ -0,0 +1,54 @@
+"""Background warmup of heavy modules and models.
+
+numpy, pandas, OpenCV and the trained models are imported on first use, so
+the app starts without them. When ``WARMUP_ON_STARTUP`` is set, a daemon
+thread loads them right after startup instead, while the worker is already
+answering requests. If a request needs a module before the thread reaches
+it, Python's import lock makes the request wait for that one import, not
+for the rest of the warmup. A failed step is logged and skipped; the route
+that needs it reports the error as before.
+"""
+import importlib
+import logging
+import threading
+import time
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MODULES = ("numpy", "pandas", "joblib", "cv2")
+WARMERS = ("app.routers.absence_prediction", "app.routers.prescriptive")
+
+_thread = None
+
+
+def _warm():
+    started = time.perf_counter()
+    for name in MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.info("Warmup: %s not available (%s)", name, e)
+    for name in WARMERS:
+        try:
+            importlib.import_module(name).warm_up()
+        except Exception:
+            logger.exception("Warmup of %s failed", name)
+    if settings.WARMUP_DEEPFACE:
+        try:
+            from app.routers.biometrics import _get_deepface_class
+
+            _get_deepface_class().build_model("ArcFace")
+        except Exception:
+            logger.exception("DeepFace warmup failed")
+    logger.info("Warmup finished in %.2fs", time.perf_counter() - started)
+
+
+def start_warmup():
+    """Start the warmup thread once per process (no-op when WARMUP_ON_STARTUP is off)."""
+    global _thread
+    if settings.WARMUP_ON_STARTUP and _thread is None:
+        _thread = threading.Thread(target=_warm, name="warmup", daemon=True)
+        _thread.start()
+    return _thread
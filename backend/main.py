@@ -1,25 +1,44 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.core.database import engine, Base
+from app.core.database import sync_schema
 from app.core.config import settings
+from app.core.serialization import ORJSONResponse
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.profiling import ProfilingMiddleware
+from app.middleware.rate_limit import RateLimitMiddleware
+from app.middleware.sql_stats import SQLStatsMiddleware
 from app.routers import auth, leaves, users
 from app.routers import biometrics
 from app.routers import attendance
 from app.routers import absence_prediction
 from app.routers import prescriptive
+from app.routers import profiling
+from app.routers import metrics
+from app.services.warmup import start_warmup
 import app.models.face  # ensure model is imported so table is created
 import app.models.attendance  # ensure attendance table is created
-
-# Create tables
-Base.metadata.create_all(bind=engine)
+import app.models.version  # data_versions (ETags)
 
 app = FastAPI(
     title="Biometric Attendance System",
     description="Employee Management System with Face Recognition and Fingerprint",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
+
+@app.on_event("startup")
+def prepare():
+    # Create tables (and add columns/indexes missing from older databases) when
+    # the server starts rather than whenever main is imported
+    sync_schema()
+    start_warmup()
+
+# innermost, so 429s still pass through CORS (and are timed by the metrics)
+app.add_middleware(RateLimitMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -36,6 +55,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(SQLStatsMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)  # outermost, so its timings cover the others
+
 # Include routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["authentication"])
 app.include_router(users.router, prefix="/api/v1/users", tags=["users"])
@@ -44,6 +68,8 @@ app.include_router(biometrics.router, tags=["biometrics"])
 app.include_router(attendance.router, tags=["attendance"])
 app.include_router(absence_prediction.router, tags=["absence_prediction"])
 app.include_router(prescriptive.router, tags=["prescriptive"])
+app.include_router(profiling.router, tags=["profiling"])
+app.include_router(metrics.router, tags=["metrics"])
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,46 @@
+"""Move closed months of attendance punches into the Parquet cold tier.
+
+Usage (from the backend directory):
+    python scripts/archive_attendance.py              # every month older than ATTENDANCE_HOT_MONTHS
+    python scripts/archive_attendance.py --month 2026-01
+
+Safe to re-run: punches that arrive later for an archived month are written
+as another part file on the next run, and a run that was interrupted is
+completed (or its leftover file discarded) before a month is archived again.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.database import SessionLocal, sync_schema
+import app.models.attendance  # noqa: F401  (register tables)
+from app.services.cold_storage import archive_closed_months, archive_month, archive_root
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--month', type=lambda v: datetime.strptime(v, '%Y-%m').date(), default=None,
+                        help='archive a single month (YYYY-MM)')
+    args = parser.parse_args()
+
+    sync_schema()
+    db = SessionLocal()
+    try:
+        if args.month:
+            moved = {args.month: archive_month(db, args.month)}
+        else:
+            moved = archive_closed_months(db)
+    finally:
+        db.close()
+
+    if not any(moved.values()):
+        print("nothing to archive")
+    for month, count in sorted(moved.items()):
+        print(f"{month:%Y-%m}: {count} punches -> {archive_root()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Benchmark the admin leave listing: dict rows and jsonable_encoder vs row projections and orjson.
+
+Usage (from the backend directory):
+    python scripts/bench_leave_serialization.py [--leaves 10000] [--employees 500] [--rounds 5]
+
+Fills a fresh SQLite file with employees and leave requests, then times the
+whole listing (query plus encoding to response bytes) both ways:
+
+* ``dicts``: the previous path, one Employee and one User lookup per leave,
+  a 13-key dict per row, ``jsonable_encoder`` over the list and
+  ``JSONResponse``'s ``json.dumps``;
+* ``rows``: ``get_all_leave_requests_enriched`` as the API runs it, one
+  joined query into ``LeaveRow`` dataclasses written by ``ORJSONResponse``.
+
+Both bodies are decoded and compared before timing.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import create_db_engine, sync_schema
+from app.core.serialization import ORJSONResponse
+import app.models.attendance  # noqa: F401  (register tables)
+import app.models.version  # noqa: F401
+from app.crud.leave import get_all_leave_requests_enriched
+from app.models.leave import LeaveRequest
+from app.models.user import Employee, User
+
+
+def populate(db, leaves: int, employees: int, seed: int = 7):
+    rng = random.Random(seed)
+    users = [User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="x", role="employee")
+             for i in range(employees)]
+    db.add_all(users)
+    db.flush()
+    staff = [
+        Employee(user_id=u.id, employee_id=f"EMP-{i:05d}", email=u.email,
+                 department=rng.choice(["Ops", "HR", "IT", "Sales"]),
+                 first_name=f"First{i}", last_name=f"Last{i}" if i % 4 else "")  # some fall back to the username
+        for i, u in enumerate(users)
+    ]
+    db.add_all(staff)
+    db.flush()
+    start = date(2026, 1, 1)
+    rows = []
+    for i in range(leaves):
+        begin = start + timedelta(days=rng.randint(0, 364))
+        days = rng.randint(1, 5)
+        status = rng.choice(["pending", "approved", "declined"])
+        rows.append(dict(
+            employee_id=rng.choice(staff).id, leave_type=rng.choice(["vacation", "sick", "personal"]),
+            start_date=begin, end_date=begin + timedelta(days=days - 1), reason=f"reason {i}",
+            status=status, duration=days, submitted_at=datetime(2025, 12, 1) + timedelta(minutes=i),
+            approved_by=users[0].id if status != "pending" else None,
+            approved_at=datetime(2026, 1, 2, 9, 30) if status != "pending" else None,
+            remarks=None,
+        ))
+    db.bulk_insert_mappings(LeaveRequest, rows)
+    db.commit()
+
+
+def listing_dicts(db, limit: int) -> bytes:
+    leaves = db.query(LeaveRequest).order_by(LeaveRequest.submitted_at.desc()).limit(limit).all()
+    enriched = []
+    for leave in leaves:
+        emp = db.query(Employee).filter(Employee.id == leave.employee_id).first()
+        user = db.query(User).filter(User.id == emp.user_id).first() if emp else None
+        name = None
+        if user:
+            name = user.username if not (emp.first_name and emp.last_name) else f"{emp.first_name} {emp.last_name}"
+        enriched.append({
+            "id": leave.id,
+            "employee_id": leave.employee_id,
+            "employee": {"name": name, "department": emp.department if emp else None,
+                         "employee_id": emp.employee_id if emp else None},
+            "leave_type": leave.leave_type,
+            "start_date": leave.start_date,
+            "end_date": leave.end_date,
+            "reason": leave.reason,
+            "status": leave.status,
+            "duration": leave.duration,
+            "submitted_at": leave.submitted_at,
+            "approved_by": leave.approved_by,
+            "approved_at": leave.approved_at,
+            "remarks": leave.remarks,
+        })
+    return JSONResponse(content=jsonable_encoder(enriched)).body
+
+
+def listing_rows(db, limit: int) -> bytes:
+    return ORJSONResponse(get_all_leave_requests_enriched(db, limit=limit)).body
+
+
+def timed(fn, Session, limit: int, rounds: int) -> list:
+    times = []
+    for _ in range(rounds):
+        db = Session()
+        try:
+            started = time.perf_counter()
+            fn(db, limit)
+            times.append(time.perf_counter() - started)
+        finally:
+            db.close()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--leaves', type=int, default=10_000)
+    parser.add_argument('--employees', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'leaves.db')}", profile='default')
+        sync_schema(bind=engine)
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        db = Session()
+        populate(db, args.leaves, args.employees)
+        old, new = listing_dicts(db, args.leaves), listing_rows(db, args.leaves)
+        db.close()
+        if json.loads(old) != json.loads(new):
+            sys.exit("the two listings differ")
+        print(f"{args.leaves} leaves, {len(new) / 1024:.0f} KiB of JSON "
+              f"(was {len(old) / 1024:.0f} KiB), median of {args.rounds} rounds:")
+        results = {}
+        for name, fn in (('dicts', listing_dicts), ('rows', listing_rows)):
+            results[name] = statistics.median(timed(fn, Session, args.leaves, args.rounds))
+            print(f"  {name:<6} {results[name] * 1000:9.1f} ms")
+        print(f"  speed-up {results['dicts'] / results['rows']:.1f}x")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
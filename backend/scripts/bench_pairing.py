@@ -0,0 +1,85 @@
+"""Benchmark the punch pairing engine over synthetic punches.
+
+Usage (from the backend directory):
+    python scripts/bench_pairing.py [--punches 10000000] [--employees 20000]
+
+Punches are generated one day at a time, in time order across all
+employees, with a mix of day and overnight shifts, forgotten check-ins and
+check-outs, and double scans. Only the pairing pass is timed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.pairing import COMPLETE, PunchPairer
+
+
+def synthetic_days(employees: int, seed: int = 7):
+    """Yield one time-ordered list of ``(employee_id, ts, direction)`` per day, forever."""
+    rng = random.Random(seed)
+    ids = [f"EMP-{i:05d}" for i in range(employees)]
+    night = set(rng.sample(ids, employees // 10))
+    day = datetime(2026, 1, 1)
+    carry = []  # overnight check-outs that land on the next day
+    while True:
+        punches, carry = carry, []
+        for emp in ids:
+            r = rng.random()
+            if r < 0.05:
+                continue  # absent
+            if emp in night:
+                start = day + timedelta(hours=21, minutes=rng.randint(0, 120))
+            else:
+                start = day + timedelta(hours=7, minutes=rng.randint(0, 180))
+            end = start + timedelta(hours=8, minutes=rng.randint(0, 120))
+            if r > 0.02:  # 2% forget to check in
+                punches.append((emp, start, 'in'))
+                if r > 0.97:  # 3% scan twice
+                    punches.append((emp, start + timedelta(seconds=rng.randint(1, 30)), 'in'))
+            if r < 0.98 or r > 0.99:  # 1% forget to check out
+                (carry if end.date() != day.date() else punches).append((emp, end, 'out'))
+        punches.sort(key=lambda p: p[1])
+        yield punches
+        day += timedelta(days=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--punches', type=int, default=10_000_000)
+    parser.add_argument('--employees', type=int, default=20_000)
+    args = parser.parse_args()
+
+    pairer = PunchPairer()
+    feed = pairer.feed
+    fed = sessions = complete = worked = 0
+    elapsed = 0.0
+    for punches in synthetic_days(args.employees):
+        punches = punches[:args.punches - fed]
+        t0 = time.perf_counter()
+        for emp, ts, direction in punches:
+            for s in feed(emp, ts, direction):
+                sessions += 1
+                if s.status == COMPLETE:
+                    complete += 1
+                    worked += s.minutes
+        closed = pairer.expire(punches[-1][1]) if punches else []
+        elapsed += time.perf_counter() - t0
+        sessions += len(closed)
+        fed += len(punches)
+        if fed >= args.punches:
+            break
+    sessions += len(pairer.flush())
+
+    print(f"punches:    {fed:,}")
+    print(f"sessions:   {sessions:,} ({complete:,} complete, {pairer.duplicates:,} duplicate scans)")
+    print(f"worked:     {worked / 60:,.0f} hours")
+    print(f"elapsed:    {elapsed:.2f}s ({fed / elapsed:,.0f} punches/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark concurrent check-ins against SQLite with and without the production profile.
+
+Usage (from the backend directory):
+    python scripts/bench_sqlite_checkin.py [--threads 16] [--checkins 200]
+
+Each profile gets a fresh database file. ``default`` is plain pysqlite with
+every thread writing through its own session; ``production`` applies the
+WAL/pragma profile and sends writes through the single-writer queue, as the
+API does. Both run the real create_attendance path, rollups included.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import WriteQueue, create_db_engine, sync_schema
+import app.models.attendance  # noqa: F401  (register tables)
+import app.models.leave  # noqa: F401
+import app.models.user  # noqa: F401
+from app.crud.attendance import create_attendance
+
+
+def run(profile: str, threads: int, checkins: int, directory: str) -> dict:
+    path = os.path.join(directory, f"{profile}.db")
+    engine = create_db_engine(f"sqlite:///{path}", profile=profile, pool_size=threads, max_overflow=0)
+    sync_schema(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    queue = WriteQueue(engine) if profile == 'production' else None
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker(n):
+        db = Session()
+        try:
+            for i in range(checkins):
+                data = {'employee_id': str(n * 1000 + i % 50), 'method': 'face', 'direction': 'in'}
+                started = time.perf_counter()
+                try:
+                    if queue is not None:
+                        queue.run(create_attendance, attendance_in=data)
+                    else:
+                        create_attendance(db, attendance_in=data)
+                except OperationalError as e:
+                    db.rollback()
+                    with lock:
+                        errors.append(str(e.orig))
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+        finally:
+            db.close()
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+    latencies.sort()
+    return {
+        'profile': profile,
+        'ok': len(latencies),
+        'errors': len(errors),
+        'per_sec': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else 0.0,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--checkins', type=int, default=200, help='check-ins per thread')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in ('default', 'production'):
+            r = run(profile, args.threads, args.checkins, directory)
+            print(f"{r['profile']:>10}: {r['ok']} ok, {r['errors']} errors, {r['per_sec']:.0f} check-ins/s, "
+                  f"p50 {r['p50_ms']:.1f} ms, p99 {r['p99_ms']:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
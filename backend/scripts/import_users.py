@@ -0,0 +1,67 @@
+"""Create users and employee records from a CSV file.
+
+Usage (from the backend directory):
+    python scripts/import_users.py users.csv [--chunk-size 500] [--processes 0] [--errors errors.csv]
+
+Same rules as POST /api/v1/users/import (see app/services/user_import.py).
+Rows that were not created are listed with their line number and reason,
+on stdout or in the ``--errors`` CSV.
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.config import settings
+from app.core.database import SessionLocal, sync_schema
+import app.models.attendance  # noqa: F401  (register tables)
+import app.models.leave  # noqa: F401
+import app.models.user  # noqa: F401
+from app.services.user_import import ImportFileError, import_users, read_csv
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--chunk-size', type=int, default=settings.USER_IMPORT_CHUNK_SIZE)
+    parser.add_argument('--processes', type=int, default=settings.USER_IMPORT_HASH_PROCESSES,
+                        help='hashing processes (0: one per CPU)')
+    parser.add_argument('--max-rows', type=int, default=1_000_000)
+    parser.add_argument('--errors', help='write rows that were not created to this CSV')
+    args = parser.parse_args()
+
+    with open(args.path, 'rb') as f:
+        data = f.read()
+    try:
+        rows = read_csv(data, args.max_rows)
+    except ImportFileError as e:
+        sys.exit(f"{args.path}: {e}")
+
+    sync_schema()
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        report = import_users(db, rows, chunk_size=args.chunk_size, processes=args.processes)
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - started
+
+    failed = [r for r in report['results'] if r['status'] != 'created']
+    if args.errors:
+        with open(args.errors, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['line', 'username', 'status', 'error'], extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(failed)
+    else:
+        for r in failed:
+            print(f"line {r['line']}: {r['username'] or '-'}: {r['status']}: {r['error']}")
+    print(f"{report['received']} rows in {elapsed:.1f}s: {report['created']} created, "
+          f"{report['duplicates']} duplicates, {report['errors']} errors")
+    sys.exit(1 if report['errors'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""Rebuild the daily_attendance rollup from raw punches.
+
+Usage (from the backend directory):
+    python scripts/rebuild_daily_attendance.py [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+
+``--end`` is exclusive. Without arguments the whole history is rebuilt.
+"""
+import argparse
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.database import SessionLocal, sync_schema
+import app.models.attendance  # noqa: F401  (register tables)
+from app.crud.daily_attendance import rebuild_daily_attendance
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--start', type=date.fromisoformat, default=None)
+    parser.add_argument('--end', type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    sync_schema()
+    db = SessionLocal()
+    try:
+        written = rebuild_daily_attendance(db, start=args.start, end=args.end)
+    finally:
+        db.close()
+    print(f"daily_attendance rebuilt: {written} rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Copy the primary SQLite database to the stand-in read replica.
+
+Usage (from the backend directory):
+    python scripts/sync_sqlite_replica.py [--every SECONDS]
+
+Both ``DATABASE_URL`` and ``DATABASE_REPLICA_URL`` must be SQLite URLs. The
+copy uses SQLite's online backup, so the API can keep writing to the primary
+while it runs. With ``--every`` the copy repeats, which gives the replica a
+replication lag of about that many seconds, much like a real one.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy.engine import make_url
+
+from app.core.config import settings
+
+
+def sqlite_path(url: str) -> str:
+    parsed = make_url(url)
+    if parsed.get_backend_name() != 'sqlite' or not parsed.database:
+        raise SystemExit(f"not a SQLite file URL: {url!r}")
+    return parsed.database
+
+
+def copy_database(source: str, target: str):
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst, pages=4096)
+    finally:
+        dst.close()
+        src.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--every', type=float, default=None, help='repeat the copy every N seconds')
+    args = parser.parse_args()
+
+    if not settings.DATABASE_REPLICA_URL:
+        raise SystemExit("DATABASE_REPLICA_URL is not set")
+    source, target = sqlite_path(settings.DATABASE_URL), sqlite_path(settings.DATABASE_REPLICA_URL)
+    while True:
+        started = time.perf_counter()
+        copy_database(source, target)
+        print(f"copied {source} -> {target} in {time.perf_counter() - started:.2f}s")
+        if args.every is None:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == '__main__':
+    main()
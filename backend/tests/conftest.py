@@ -0,0 +1,18 @@
+"""Test setup: the app reads its settings at import, so point them at a scratch directory first.
+
+Run from the backend directory with ``python -m pytest tests``.
+"""
+import os
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
+
+_scratch = tempfile.mkdtemp(prefix='attendance-tests-')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_scratch, 'attendance.db')}")
+os.environ.setdefault('SHARED_STATE_URL', 'memory://')
+os.environ.setdefault('ATTENDANCE_ARCHIVE_DIR', os.path.join(_scratch, 'archive'))
+os.environ.setdefault('EXPORT_SPOOL_DIR', os.path.join(_scratch, 'exports'))
+os.environ.setdefault('PROFILE_DIR', os.path.join(_scratch, 'profiles'))
@@ -0,0 +1,90 @@
+import base64
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+import app.models.attendance, app.models.face, app.models.leave, app.models.user, app.models.version  # noqa: F401,E401
+from app.core import database
+from app.core.pagination import decode_cursor, encode_cursor
+from app.crud.attendance import get_attendance_logs, get_attendance_page
+
+
+@pytest.mark.parametrize('created_at', [
+    datetime(2026, 10, 1, 8, 0, 5),
+    datetime(2026, 10, 1, 8, 0, 5, 250000),
+    datetime(2026, 10, 1, 8, 0, 5, 1),
+])
+def test_cursor_round_trip(created_at):
+    token = encode_cursor(created_at, 42)
+    assert '=' not in token
+    assert decode_cursor(token) == (created_at, 42)
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('token', [
+    '',
+    'not a cursor',
+    _b64(b'{"created_at": "2026-10-01T08:00:05", "id": 1}'),
+    _b64(b'["2026-10-01T08:00:05"]'),
+    _b64(b'["yesterday", 1]'),
+    _b64(b'["2026-10-01T08:00:05", "one"]'),
+])
+def test_malformed_cursor_is_rejected(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
+
+
+@pytest.fixture
+def db():
+    database.sync_schema()
+    session = database.SessionLocal()
+    session.execute(text("DELETE FROM attendance"))
+    session.commit()
+    yield session
+    session.execute(text("DELETE FROM attendance"))
+    session.commit()
+    session.close()
+
+
+def _insert(db, rows):
+    db.execute(text("INSERT INTO attendance (employee_id, method, created_at) VALUES (:e, 'face', :t)"),
+               [{'e': e, 't': t} for e, t in rows])
+    db.commit()
+
+
+def _walk(db, limit, **filters):
+    seen, after = [], None
+    for _ in range(200):  # a cursor that repeats rows would otherwise page forever
+        rows, cursor = get_attendance_page(db, limit=limit, after=after, **filters)
+        seen += [row.id for row in rows]
+        if cursor is None:
+            return seen
+        after = decode_cursor(cursor)
+    pytest.fail(f"paging did not finish; first ids seen: {seen[:20]}")
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 5, 7])
+def test_keyset_pages_match_offset_order_across_whole_seconds(db, limit):
+    # Rows from the old server default are stored as "YYYY-MM-DD HH:MM:SS",
+    # newer rows with microseconds, so a cursor landing on a whole second has
+    # to compare against the form its row was stored in (regression: pages
+    # repeated or skipped rows sharing that second).
+    legacy = [(str(i % 2), '2026-10-01 08:00:%02d' % (i // 6)) for i in range(24)]
+    current = [(str(i % 2), '2026-10-01 08:00:%02d.000000' % (i // 4)) for i in range(16)]
+    fractional = [('1', '2026-10-01 08:00:02.500000'), ('0', '2026-10-01 08:00:03.000001')]
+    _insert(db, legacy + current + fractional)
+
+    expected = [row.id for row in get_attendance_logs(db, limit=1000)]
+    assert len(expected) == 42
+    assert _walk(db, limit) == expected
+
+
+def test_filtered_keyset_pages_match_offset_order(db):
+    _insert(db, [(str(i % 3), '2026-10-01 08:00:%02d' % (i // 5)) for i in range(20)]
+            + [(str(i % 3), '2026-10-01 08:00:%02d.000000' % (i // 5)) for i in range(20)])
+    expected = [row.id for row in get_attendance_logs(db, limit=1000, employee_id='1')]
+    assert _walk(db, 3, employee_id='1') == expected
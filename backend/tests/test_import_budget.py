@@ -0,0 +1,66 @@
+"""``import main`` stays fast and leaves the heavy modules for first use.
+
+Each measurement imports the API in a fresh interpreter under
+``python -X importtime``, so it needs the full requirements installed. The
+budget is the best of ``IMPORT_BUDGET_RUNS`` cold imports against
+``IMPORT_BUDGET_MS``; raise it on slow CI machines rather than skipping.
+"""
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 2500))
+RUNS = int(os.environ.get('IMPORT_BUDGET_RUNS', 3))
+
+# meant to load on first use or in the background warmup
+FORBIDDEN = ('numpy', 'pandas', 'cv2', 'joblib', 'sklearn', 'xgboost', 'pyarrow', 'deepface', 'tensorflow',
+             'ortools', 'pgmpy')
+
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def measure():
+    """``(cumulative microseconds of main, {module: cumulative us}, top-level rows)`` for one cold import."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=BACKEND, capture_output=True, text=True,
+    )
+    assert result.returncode == 0, f"import main failed:\n{result.stderr[-2000:]}"
+    modules, top = {}, []
+    for line in result.stderr.splitlines():
+        m = LINE.match(line)
+        if not m:
+            continue
+        cumulative, depth, name = int(m.group(2)), len(m.group(3)) // 2, m.group(4)
+        modules[name] = cumulative
+        if depth == 1:
+            top.append((cumulative, name))
+    return modules.get('main', 0), modules, top
+
+
+def _slowest(top) -> str:
+    return '\n'.join(f"  {cumulative / 1000:8.1f} ms  {name}" for cumulative, name in sorted(top, reverse=True)[:10])
+
+
+@pytest.fixture(scope='module')
+def fastest_import():
+    return min((measure() for _ in range(max(RUNS, 1))), key=lambda r: r[0])
+
+
+def test_main_does_not_import_heavy_modules(fastest_import):
+    _, modules, top = fastest_import
+    loaded = sorted({name.split('.')[0] for name in modules} & set(FORBIDDEN))
+    assert not loaded, f"import main loads {', '.join(loaded)}; slowest top-level imports:\n{_slowest(top)}"
+
+
+def test_main_imports_within_budget(fastest_import):
+    total, _, top = fastest_import
+    assert total / 1000 <= BUDGET_MS, (
+        f"import main took {total / 1000:.0f} ms (budget {BUDGET_MS:.0f} ms); "
+        f"slowest top-level imports:\n{_slowest(top)}"
+    )
@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.pairing import COMPLETE, IN, MISSING_IN, MISSING_OUT, OUT, PunchPairer
+
+
+def at(hhmm: str, day: int = 1) -> datetime:
+    hours, minutes = map(int, hhmm.split(':'))
+    return datetime(2026, 1, day, hours, minutes)
+
+
+# (punches as (time, direction), closed sessions as (status, check_in, check_out, punches), duplicates)
+CASES = {
+    'in then out': (
+        [(at('09:00'), IN), (at('17:00'), OUT)],
+        [(COMPLETE, at('09:00'), at('17:00'), 2)],
+        0,
+    ),
+    # duplicate window vs direction=None
+    'repeat in inside the window is a duplicate': (
+        [(at('09:00'), IN), (at('09:01'), IN), (at('17:00'), OUT)],
+        [(COMPLETE, at('09:00'), at('17:00'), 3)],
+        1,
+    ),
+    'the window is inclusive': (
+        [(at('09:00'), IN), (at('09:02'), IN), (at('17:00'), OUT)],
+        [(COMPLETE, at('09:00'), at('17:00'), 3)],
+        1,
+    ),
+    'undirected punch inside the window is a duplicate': (
+        [(at('09:00'), IN), (at('09:01'), None), (at('17:00'), OUT)],
+        [(COMPLETE, at('09:00'), at('17:00'), 3)],
+        1,
+    ),
+    'repeat out inside the window is counted but not added': (
+        [(at('09:00'), IN), (at('17:00'), OUT), (at('17:01'), OUT)],
+        [(COMPLETE, at('09:00'), at('17:00'), 2)],
+        1,
+    ),
+    'opposite direction inside the window is a real punch': (
+        [(at('09:00'), IN), (at('09:01'), OUT)],
+        [(COMPLETE, at('09:00'), at('09:01'), 2)],
+        0,
+    ),
+    'repeat in after the window opens a new session': (
+        [(at('09:00'), IN), (at('09:03'), IN)],
+        [(MISSING_OUT, at('09:00'), None, 1), (MISSING_OUT, at('09:03'), None, 1)],
+        0,
+    ),
+    'undirected punches alternate in and out': (
+        [(at('09:00'), None), (at('12:00'), None), (at('13:00'), None), (at('17:00'), None)],
+        [(COMPLETE, at('09:00'), at('12:00'), 2), (COMPLETE, at('13:00'), at('17:00'), 2)],
+        0,
+    ),
+    # max_session expiry
+    'check-out past max_session is a missing in': (
+        [(at('06:00'), IN), (at('23:00'), OUT)],
+        [(MISSING_OUT, at('06:00'), None, 1), (MISSING_IN, None, at('23:00'), 1)],
+        0,
+    ),
+    'undirected punch past max_session starts a new session': (
+        [(at('06:00'), IN), (at('23:00'), None)],
+        [(MISSING_OUT, at('06:00'), None, 1), (MISSING_OUT, at('23:00'), None, 1)],
+        0,
+    ),
+    'check-out exactly at max_session completes': (
+        [(at('06:00'), IN), (at('22:00'), OUT)],
+        [(COMPLETE, at('06:00'), at('22:00'), 2)],
+        0,
+    ),
+    # overnight sessions
+    'overnight shift': (
+        [(at('22:00'), IN), (at('06:00', day=2), OUT)],
+        [(COMPLETE, at('22:00'), at('06:00', day=2), 2)],
+        0,
+    ),
+    'undirected overnight check-out': (
+        [(at('22:00'), IN), (at('06:00', day=2), None)],
+        [(COMPLETE, at('22:00'), at('06:00', day=2), 2)],
+        0,
+    ),
+    # missing_in / missing_out
+    'check-out without check-in': (
+        [(at('17:00'), OUT)],
+        [(MISSING_IN, None, at('17:00'), 1)],
+        0,
+    ),
+    'check-in while a session is open': (
+        [(at('09:00'), IN), (at('13:00'), IN), (at('17:00'), OUT)],
+        [(MISSING_OUT, at('09:00'), None, 1), (COMPLETE, at('13:00'), at('17:00'), 2)],
+        0,
+    ),
+    'check-in never closed': (
+        [(at('09:00'), IN)],
+        [(MISSING_OUT, at('09:00'), None, 1)],
+        0,
+    ),
+}
+
+
+@pytest.mark.parametrize('punches, expected, duplicates', CASES.values(), ids=CASES.keys())
+def test_feed(punches, expected, duplicates):
+    pairer = PunchPairer(max_session=timedelta(hours=16), duplicate_window=timedelta(minutes=2))
+    closed = []
+    for ts, direction in punches:
+        closed += pairer.feed('e1', ts, direction)
+    closed += pairer.flush()
+    assert [(s.status, s.check_in, s.check_out, s.punches) for s in closed] == expected
+    assert pairer.duplicates == duplicates
+
+
+def test_overnight_session_belongs_to_check_in_day():
+    pairer = PunchPairer()
+    pairer.feed('e1', at('22:00'), IN)
+    [session] = pairer.feed('e1', at('06:30', day=2), OUT)
+    assert session.work_date == at('22:00').date()
+    assert session.minutes == 510
+
+
+def test_incomplete_sessions_count_no_minutes():
+    pairer = PunchPairer()
+    missing_in = pairer.feed('e1', at('17:00'), OUT)[0]
+    pairer.feed('e1', at('18:00'), IN)
+    missing_out = pairer.flush()[0]
+    assert (missing_in.work_date, missing_in.minutes) == (at('17:00').date(), 0)
+    assert (missing_out.work_date, missing_out.minutes) == (at('18:00').date(), 0)
+
+
+def test_employees_are_paired_independently():
+    pairer = PunchPairer()
+    assert pairer.feed('a', at('09:00'), IN) == []
+    assert pairer.feed('b', at('09:01'), IN) == []  # not a duplicate of a's punch
+    [b] = pairer.feed('b', at('17:00'), OUT)
+    [a] = pairer.feed('a', at('18:00'), OUT)
+    assert (a.employee_id, a.minutes, b.employee_id, b.minutes) == ('a', 540, 'b', 479)
+    assert pairer.duplicates == 0
+
+
+def test_expire_closes_sessions_past_max_session():
+    pairer = PunchPairer(max_session=timedelta(hours=16))
+    pairer.feed('a', at('06:00'), IN)
+    pairer.feed('b', at('12:00'), IN)
+    [stale] = pairer.expire(at('23:00'))
+    assert (stale.employee_id, stale.status) == ('a', MISSING_OUT)
+    assert [s.employee_id for s in pairer.flush()] == ['b']